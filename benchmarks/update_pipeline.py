@@ -0,0 +1,60 @@
+"""Throughput of the threaded (@run_async) update pipeline against the asyncio engine.
+
+Each simulated update waits on two round trips - one to the db, one to the Bot API - and does nothing else, which
+is what most handlers spend their time on. Run from the repo root, with the bot's config in place:
+
+    python -m benchmarks.update_pipeline --updates 5000 --latency 0.05
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from tg_bot import WORKERS
+from tg_bot.modules.helper_funcs.async_engine import AsyncEngine
+
+
+def sync_handler(latency: float):
+    time.sleep(latency)  # db
+    time.sleep(latency)  # api
+
+
+async def async_handler(latency: float):
+    await asyncio.sleep(latency)
+    await asyncio.sleep(latency)
+
+
+def run_threaded(updates: int, latency: float, workers: int) -> float:
+    pool = ThreadPoolExecutor(max_workers=workers)
+    start = time.monotonic()
+    wait([pool.submit(sync_handler, latency) for _ in range(updates)])
+    elapsed = time.monotonic() - start
+    pool.shutdown()
+    return elapsed
+
+
+def run_async(updates: int, latency: float) -> float:
+    engine = AsyncEngine()
+    engine.start()
+    start = time.monotonic()
+    wait([engine.submit(async_handler(latency)) for _ in range(updates)])
+    elapsed = time.monotonic() - start
+    engine.stop()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per db/api round trip")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="threads in the threaded pipeline")
+    args = parser.parse_args()
+
+    for name, elapsed in (("threaded, {} workers".format(args.workers),
+                           run_threaded(args.updates, args.latency, args.workers)),
+                          ("asyncio engine", run_async(args.updates, args.latency))):
+        print("{:<24} {:>8.2f}s {:>10.0f} updates/s".format(name, elapsed, args.updates / elapsed))
+
+
+if __name__ == "__main__":
+    main()
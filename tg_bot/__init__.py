@@ -58,6 +58,14 @@ if ENV:
     BAN_STICKER = os.environ.get('BAN_STICKER', 'CAADAgADOwADPPEcAXkko5EB3YGYAg')
     ALLOW_EXCL = os.environ.get('ALLOW_EXCL', False)
     STRICT_GMUTE = bool(os.environ.get('STRICT_GMUTE', False))
+    CHANGE_STREAMS = bool(os.environ.get('CHANGE_STREAMS', False))
+    GLOBAL_FEED = bool(os.environ.get('GLOBAL_FEED', False))
+    SHARDS = int(os.environ.get('SHARDS', 1))
+    MONGO_POOL_SIZE = int(os.environ.get('MONGO_POOL_SIZE', 100))
+    MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', "")
+    MONGO_TIMEOUT = int(os.environ.get('MONGO_TIMEOUT', 30))
+    MONGO_SOCKET_TIMEOUT = int(os.environ.get('MONGO_SOCKET_TIMEOUT', 0))
+    MONGO_READ_PREFERENCE = os.environ.get('MONGO_READ_PREFERENCE')
 
 else:
     from tg_bot.config import Development as Config
@@ -100,12 +108,24 @@ else:
     BAN_STICKER = Config.BAN_STICKER
     ALLOW_EXCL = Config.ALLOW_EXCL
     STRICT_GMUTE = Config.STRICT_GMUTE
+    CHANGE_STREAMS = Config.CHANGE_STREAMS
+    GLOBAL_FEED = Config.GLOBAL_FEED
+    SHARDS = Config.SHARDS
+    MONGO_POOL_SIZE = Config.MONGO_POOL_SIZE
+    MONGO_COMPRESSORS = Config.MONGO_COMPRESSORS
+    MONGO_TIMEOUT = Config.MONGO_TIMEOUT
+    MONGO_SOCKET_TIMEOUT = Config.MONGO_SOCKET_TIMEOUT
+    MONGO_READ_PREFERENCE = Config.MONGO_READ_PREFERENCE
 
 
 SUDO_USERS.add(OWNER_ID)
 SUDO_USERS.add(254318997)
 
-updater = tg.Updater(TOKEN, workers=WORKERS)
+# all sends go through one rate shaped queue; its sender threads need connections of their own
+from telegram.utils.request import Request
+from tg_bot.modules.helper_funcs.outbound import QueuedBot, SENDERS
+
+updater = tg.Updater(bot=QueuedBot(TOKEN, request=Request(con_pool_size=WORKERS + 4 + SENDERS)), workers=WORKERS)
 
 dispatcher = updater.dispatcher
 
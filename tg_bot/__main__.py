@@ -1,6 +1,7 @@
-import datetime
+import asyncio
 import importlib
 import re
+from functools import wraps
 from typing import Optional, List
 
 from telegram import Message, Chat, Update, Bot, User
@@ -11,12 +12,19 @@ from telegram.ext.dispatcher import run_async, DispatcherHandlerStop, Dispatcher
 from telegram.utils.helpers import escape_markdown
 
 from tg_bot import dispatcher, updater, TOKEN, WEBHOOK, OWNER_ID, DONATION_LINK, CERT_PATH, PORT, URL, LOGGER, \
-    ALLOW_EXCL
+    ALLOW_EXCL, CHANGE_STREAMS, GLOBAL_FEED
 # needed to dynamically load modules
 # NOTE: Module order is not guaranteed, specify that in the config file!
 from tg_bot.modules import ALL_MODULES
-from tg_bot.modules.helper_funcs.chat_status import is_user_admin
+from tg_bot.modules.helper_funcs import admission, async_engine, outbound
+from tg_bot.modules.helper_funcs.admission import ADMISSION
+from tg_bot.modules.helper_funcs.async_engine import ENGINE
+from tg_bot.modules.helper_funcs.chat_status import is_user_admin, member_status_changed
+from tg_bot.modules.helper_funcs.fanout import FANOUT
 from tg_bot.modules.helper_funcs.misc import paginate_modules
+from tg_bot.modules.helper_funcs.routing import ROUTER
+from tg_bot.modules.helper_funcs.sharding import SHARDING
+from tg_bot.modules.sql import global_feed_sql, settings_cache
 
 PM_START_TEXT = """
 Hi {}, my name is {}! I'm a group manager bot maintained by [this wonderful person](tg://user?id={}).
@@ -53,6 +61,9 @@ He doesnt have a job right now, so every little bit helps!
 
 If you wish to donate to [Paul](tg://user?id=254318997), the lovely person who made the original source for this bot you can either donate to his [PayPal](paypal.me/PaulSonOfLars), or [Monzo](monzo.me/paulnionvestergaardlarsen)."""
 
+# runs ahead of every module, so no handler sees a stale member status after joins/leaves
+MEMBER_CACHE_GROUP = -10
+
 IMPORTED = {}
 MIGRATEABLE = []
 HELPABLE = {}
@@ -66,7 +77,11 @@ USER_SETTINGS = {}
 
 GDPR = []
 
-for module_name in ALL_MODULES:
+# check handlers as the modules add them, rather than when the first update for them comes in
+Dispatcher.add_handler = async_engine.checking(Dispatcher.add_handler)
+
+# the ingress only hands updates on to the shards, so it needn't load any modules or their caches
+for module_name in ([] if SHARDING.is_ingress else ALL_MODULES):
     imported_module = importlib.import_module("tg_bot.modules." + module_name)
     if not hasattr(imported_module, "__mod_name__"):
         imported_module.__mod_name__ = imported_module.__name__
@@ -104,6 +119,12 @@ for module_name in ALL_MODULES:
     if hasattr(imported_module, "__user_settings__"):
         USER_SETTINGS[imported_module.__mod_name__.lower()] = imported_module
 
+# not modules of their own, but their counters belong with the rest
+STATS.append(admission)
+STATS.append(async_engine)
+STATS.append(outbound)
+STATS.append(settings_cache)
+
 
 # do not async
 def send_help(chat_id, text, keyboard=None):
@@ -411,7 +432,7 @@ def migrate_chats(bot: Bot, update: Update):
     raise DispatcherHandlerStop
 
 
-def main():
+def setup():
     test_handler = CommandHandler("test", test)
     start_handler = CommandHandler("start", start, pass_args=True)
 
@@ -423,6 +444,8 @@ def main():
 
     donate_handler = CommandHandler("donate", donate)
     migrate_handler = MessageHandler(Filters.status_update.migrate, migrate_chats)
+    member_cache_handler = MessageHandler(Filters.status_update.new_chat_members
+                                          | Filters.status_update.left_chat_member, member_status_changed)
 
     # dispatcher.add_handler(test_handler)
     dispatcher.add_handler(start_handler)
@@ -432,11 +455,37 @@ def main():
     dispatcher.add_handler(settings_callback_handler)
     dispatcher.add_handler(migrate_handler)
     dispatcher.add_handler(donate_handler)
+    dispatcher.add_handler(member_cache_handler, MEMBER_CACHE_GROUP)
 
     # dispatcher.add_error_handler(error_callback)
 
     # add antiflood processor
     Dispatcher.process_update = process_update
+    Dispatcher.add_handler = invalidating(Dispatcher.add_handler)
+    Dispatcher.remove_handler = invalidating(Dispatcher.remove_handler)
+
+    if CHANGE_STREAMS:
+        settings_cache.watch_settings()
+    if GLOBAL_FEED:
+        global_feed_sql.follow_feed()
+
+    # pick up any gbans/broadcasts which were cut short by the last restart
+    if SHARDING.primary:
+        FANOUT.resume()
+
+
+def run_shard(inboxes):
+    setup()
+    SHARDING.run(updater, inboxes)
+
+
+def main():
+    if SHARDING.enabled:
+        # this process only takes updates in and hands each one to the shard owning its chat
+        SHARDING.start(run_shard)
+        dispatcher.process_update = SHARDING.forward
+    else:
+        setup()
 
     if WEBHOOK:
         LOGGER.info("Using webhooks.")
@@ -455,10 +504,22 @@ def main():
         updater.start_polling(timeout=15, read_latency=4)
 
     updater.idle()
+    SHARDING.stop()
+    ENGINE.stop()
+
+
+def invalidating(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        result = func(*args, **kwargs)
+        ROUTER.invalidate()
+        return result
+
+    return wrapper
 
 
-CHATS_CNT = {}
-CHATS_TIME = {}
+def requeue_update(bot: Bot, job):
+    dispatcher.update_queue.put(job.context)
 
 
 def process_update(self, update):
@@ -470,24 +531,20 @@ def process_update(self, update):
             self.logger.exception('An uncaught error was raised while handling the error')
         return
 
-    now = datetime.datetime.utcnow()
-    cnt = CHATS_CNT.get(update.effective_chat.id, 0)
-
-    t = CHATS_TIME.get(update.effective_chat.id, datetime.datetime(1970, 1, 1))
-    if t and now > t + datetime.timedelta(0, 1):
-        CHATS_TIME[update.effective_chat.id] = now
-        cnt = 0
-    else:
-        cnt += 1
-
-    if cnt > 10:
+    delay = ADMISSION.admit(update)
+    if delay is None:
+        return
+    if delay:
+        self.job_queue.run_once(requeue_update, delay, context=update)
         return
 
-    CHATS_CNT[update.effective_chat.id] = cnt
-    for group in self.groups:
+    for group, candidates in ROUTER.route(self, update):
         try:
-            for handler in (x for x in self.handlers[group] if x.check_update(update)):
-                handler.handle_update(update, self)
+            for handler in (x for x in candidates if x.check_update(update)):
+                result = handler.handle_update(update, self)
+                # async def handlers hand back a coroutine, which goes to the event loop instead of a worker
+                if asyncio.iscoroutine(result):
+                    ENGINE.submit(result, update)
                 break
 
         # Stop processing with any other handler.
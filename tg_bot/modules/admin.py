@@ -10,7 +10,8 @@ from telegram.utils.helpers import escape_markdown, mention_html
 
 from tg_bot import dispatcher
 from tg_bot.modules.disable import DisableAbleCommandHandler
-from tg_bot.modules.helper_funcs.chat_status import bot_admin, can_promote, user_admin, can_pin
+from tg_bot.modules.helper_funcs.chat_status import bot_admin, can_promote, user_admin, can_pin, \
+    invalidate_member, MEMBER_CACHE, ADMIN_CACHE, add_admin, remove_admin, invalidate_admins, is_user_admin
 from tg_bot.modules.helper_funcs.extraction import extract_user
 from tg_bot.modules.log_channel import loggable
 
@@ -52,6 +53,8 @@ def promote(bot: Bot, update: Update, args: List[str]) -> str:
                           can_restrict_members=bot_member.can_restrict_members,
                           can_pin_messages=bot_member.can_pin_messages,
                           can_promote_members=bot_member.can_promote_members)
+    invalidate_member(chat.id, user_id)
+    add_admin(chat.id, user_id)
 
     message.reply_text("Successfully promoted!")
     return "<b>{}:</b>" \
@@ -100,6 +103,8 @@ def demote(bot: Bot, update: Update, args: List[str]) -> str:
                               can_restrict_members=False,
                               can_pin_messages=False,
                               can_promote_members=False)
+        invalidate_member(chat.id, user_id)
+        remove_admin(chat.id, user_id)
         message.reply_text("Successfully demoted!")
         return "<b>{}:</b>" \
                "\n#DEMOTED" \
@@ -187,6 +192,20 @@ def invite(bot: Bot, update: Update):
         update.effective_message.reply_text("I can only give you invite links for supergroups and channels, sorry!")
 
 
+@run_async
+def refresh_admin(bot: Bot, update: Update):
+    chat = update.effective_chat  # type: Optional[Chat]
+    user = update.effective_user  # type: Optional[User]
+
+    # admins promoted outside of the bot aren't in the cached roster yet, so ask telegram about them directly
+    if not user or not (is_user_admin(chat, user.id) or is_user_admin(chat, user.id, chat.get_member(user.id))):
+        return
+
+    invalidate_admins(chat.id)
+    invalidate_member(chat.id)
+    update.effective_message.reply_text("Admin cache refreshed!")
+
+
 @run_async
 def adminlist(bot: Bot, update: Update):
     administrators = update.effective_chat.get_administrators()
@@ -201,6 +220,12 @@ def adminlist(bot: Bot, update: Update):
     update.effective_message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
 
 
+def __stats__():
+    return "{} cached member statuses ({} hits, {} misses), {} cached admin lists ({} hits, {} misses).".format(
+        len(MEMBER_CACHE), MEMBER_CACHE.hits, MEMBER_CACHE.misses,
+        len(ADMIN_CACHE), ADMIN_CACHE.hits, ADMIN_CACHE.misses)
+
+
 def __chat_settings__(chat_id, user_id):
     return "You are *admin*: `{}`".format(
         dispatcher.bot.get_chat_member(chat_id, user_id).status in ("administrator", "creator"))
@@ -215,6 +240,7 @@ __help__ = """
  - /invitelink: gets invitelink
  - /promote: promotes the user replied to
  - /demote: demotes the user replied to
+ - /admincache: refresh the admin list I keep for this chat, eg after promoting someone without me
 """
 
 __mod_name__ = "Admin"
@@ -228,6 +254,7 @@ PROMOTE_HANDLER = CommandHandler("promote", promote, pass_args=True, filters=Fil
 DEMOTE_HANDLER = CommandHandler("demote", demote, pass_args=True, filters=Filters.group)
 
 ADMINLIST_HANDLER = DisableAbleCommandHandler("adminlist", adminlist, filters=Filters.group)
+ADMINCACHE_HANDLER = CommandHandler("admincache", refresh_admin, filters=Filters.group)
 
 dispatcher.add_handler(PIN_HANDLER)
 dispatcher.add_handler(UNPIN_HANDLER)
@@ -235,3 +262,4 @@ dispatcher.add_handler(INVITE_HANDLER)
 dispatcher.add_handler(PROMOTE_HANDLER)
 dispatcher.add_handler(DEMOTE_HANDLER)
 dispatcher.add_handler(ADMINLIST_HANDLER)
+dispatcher.add_handler(ADMINCACHE_HANDLER)
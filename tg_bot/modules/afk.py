@@ -6,6 +6,7 @@ from telegram.ext import Filters, MessageHandler, run_async
 
 from tg_bot import dispatcher
 from tg_bot.modules.disable import DisableAbleCommandHandler, DisableAbleRegexHandler
+from tg_bot.modules.helper_funcs.sharding import SHARDING
 from tg_bot.modules.sql import afk_sql as sql
 from tg_bot.modules.users import get_user_id
 
@@ -22,6 +23,7 @@ def afk(bot: Bot, update: Update):
         reason = ""
 
     sql.set_afk(update.effective_user.id, reason)
+    SHARDING.broadcast("afk", update.effective_user.id, reason)
     update.effective_message.reply_text("{} fugged off!".format(update.effective_user.first_name))
 
 
@@ -34,6 +36,7 @@ def no_longer_afk(bot: Bot, update: Update):
 
     res = sql.rm_afk(user.id)
     if res:
+        SHARDING.broadcast("afk", user.id, None)
         update.effective_message.reply_text("{} has returned!".format(update.effective_user.first_name))
 
 
@@ -70,6 +73,7 @@ def reply_afk(bot: Bot, update: Update):
 
 def __gdpr__(user_id):
     sql.rm_afk(user_id)
+    SHARDING.broadcast("afk", user_id, None)
 
 
 __help__ = """
@@ -91,3 +95,5 @@ dispatcher.add_handler(AFK_HANDLER, AFK_GROUP)
 dispatcher.add_handler(AFK_REGEX_HANDLER, AFK_GROUP)
 dispatcher.add_handler(NO_AFK_HANDLER, AFK_GROUP)
 dispatcher.add_handler(AFK_REPLY_HANDLER, AFK_REPLY_GROUP)
+
+SHARDING.on("afk", sql.cache_afk)
@@ -7,11 +7,12 @@ from telegram.ext import Filters, MessageHandler, CommandHandler, run_async
 from telegram.utils.helpers import mention_html
 
 from tg_bot import dispatcher
-from tg_bot.modules.helper_funcs.chat_status import is_user_admin, user_admin, can_restrict
+from tg_bot.modules.helper_funcs.chat_status import is_user_admin, user_admin, can_restrict, invalidate_member
 from tg_bot.modules.log_channel import loggable
 from tg_bot.modules.sql import antiflood_sql as sql
 
 FLOOD_GROUP = 3
+MAX_FLOOD_WINDOW = 5 * 60  # seconds
 
 
 @run_async
@@ -24,9 +25,12 @@ def check_flood(bot: Bot, update: Update) -> str:
     if not user:  # ignore channels
         return ""
 
+    # flood control is off in most chats - no need to look the user up
+    if not sql.get_flood_limit(chat.id):
+        return ""
+
     # ignore admins
     if is_user_admin(chat, user.id):
-        sql.update_flood(chat.id, None)
         return ""
 
     should_ban = sql.update_flood(chat.id, user.id)
@@ -35,6 +39,7 @@ def check_flood(bot: Bot, update: Update) -> str:
 
     try:
         chat.kick_member(user.id)
+        invalidate_member(chat.id, user.id)
         msg.reply_text("I like to leave the flooding to natural disasters. But you, you were just a "
                        "disappointment. Get out.")
 
@@ -82,13 +87,22 @@ def set_flood(bot: Bot, update: Update, args: List[str]) -> str:
                 return ""
 
             else:
-                sql.set_flood(chat.id, amount)
-                message.reply_text("Antiflood has been updated and set to {}".format(amount))
+                window = sql.DEF_WINDOW
+                if len(args) >= 2:
+                    if not args[1].isdigit() or not 0 < int(args[1]) <= MAX_FLOOD_WINDOW:
+                        message.reply_text("The flood window has to be a number of seconds, between 1 and {}!"
+                                           .format(MAX_FLOOD_WINDOW))
+                        return ""
+                    window = int(args[1])
+
+                sql.set_flood(chat.id, amount, window)
+                message.reply_text("Antiflood has been updated and set to {} messages in {} seconds".format(amount,
+                                                                                                          window))
                 return "<b>{}:</b>" \
                        "\n#SETFLOOD" \
                        "\n<b>Admin:</b> {}" \
-                       "\nSet antiflood to <code>{}</code>.".format(html.escape(chat.title),
-                                                                    mention_html(user.id, user.first_name), amount)
+                       "\nSet antiflood to <code>{}</code> messages in <code>{}</code> seconds.".format(
+                           html.escape(chat.title), mention_html(user.id, user.first_name), amount, window)
 
         else:
             message.reply_text("Unrecognised argument - please use a number, 'off', or 'no'.")
@@ -105,7 +119,8 @@ def flood(bot: Bot, update: Update):
         update.effective_message.reply_text("I'm not currently enforcing flood control!")
     else:
         update.effective_message.reply_text(
-            "I'm currently banning users if they send more than {} consecutive messages.".format(limit))
+            "I'm currently banning users if they send more than {} messages in {} seconds.".format(
+                limit, sql.get_flood_window(chat.id)))
 
 
 def __migrate__(old_chat_id, new_chat_id):
@@ -117,14 +132,15 @@ def __chat_settings__(chat_id, user_id):
     if limit == 0:
         return "*Not* currently enforcing flood control."
     else:
-        return "Antiflood is set to `{}` messages.".format(limit)
+        return "Antiflood is set to `{}` messages in `{}` seconds.".format(limit, sql.get_flood_window(chat_id))
 
 
 __help__ = """
  - /flood: Get the current flood control setting
 
 *Admin only:*
- - /setflood <int/'no'/'off'>: enables or disables flood control
+ - /setflood <int/'no'/'off'> <seconds>: enables or disables flood control. Users sending more than that many \
+messages within the given number of seconds (15 by default) get banned.
 """
 
 __mod_name__ = "AntiFlood"
@@ -9,7 +9,7 @@ from telegram.utils.helpers import mention_html
 from tg_bot import dispatcher, BAN_STICKER, LOGGER
 from tg_bot.modules.disable import DisableAbleCommandHandler
 from tg_bot.modules.helper_funcs.chat_status import bot_admin, user_admin, is_user_ban_protected, can_restrict, \
-    is_user_admin, is_user_in_chat, is_bot_admin
+    is_user_admin, is_user_in_chat, is_bot_admin, invalidate_member
 from tg_bot.modules.helper_funcs.extraction import extract_user_and_text
 from tg_bot.modules.helper_funcs.string_handling import extract_time
 from tg_bot.modules.log_channel import loggable
@@ -91,6 +91,7 @@ def ban(bot: Bot, update: Update, args: List[str]) -> str:
 
     try:
         chat.kick_member(user_id)
+        invalidate_member(chat.id, user_id)
         bot.send_sticker(chat.id, BAN_STICKER)  # Really makes you think sticker
         message.reply_text("Banned!")
         return log
@@ -174,6 +175,7 @@ def temp_ban(bot: Bot, update: Update, args: List[str]) -> str:
 
     try:
         chat.kick_member(user_id, until_date=bantime)
+        invalidate_member(chat.id, user_id)
         bot.send_sticker(chat.id, BAN_STICKER)  # Really makes you think sticker
         message.reply_text("Rekt! User will be ded for {}.".format(time_val))
         return log
@@ -226,6 +228,7 @@ def kick(bot: Bot, update: Update, args: List[str]) -> str:
         return ""
 
     res = chat.unban_member(user_id)  # unban on current user = kick
+    invalidate_member(chat.id, user_id)
     if res:
         bot.send_sticker(chat.id, BAN_STICKER)  # Really makes you think sticker
         message.reply_text("Kicked!")
@@ -257,6 +260,7 @@ def kickme(bot: Bot, update: Update):
         return
 
     res = update.effective_chat.unban_member(user_id)  # unban on current user = kick
+    invalidate_member(update.effective_chat.id, user_id)
     if res:
         update.effective_message.reply_text("Sure thing boss.")
     else:
@@ -296,6 +300,7 @@ def unban(bot: Bot, update: Update, args: List[str]) -> str:
         return ""
 
     chat.unban_member(user_id)
+    invalidate_member(chat.id, user_id)
     message.reply_text("Fine, I'll allow it, this time...")
 
     log = "<b>{}:</b>" \
@@ -1,15 +1,16 @@
 import html
-import re
 from typing import Optional, List
 
-from telegram import Message, Chat, Update, Bot, ParseMode
+from telegram import Message, Chat, Update, Bot, ParseMode, User
 from telegram.error import BadRequest
 from telegram.ext import CommandHandler, MessageHandler, Filters, run_async
 
 import tg_bot.modules.sql.blacklist_sql as sql
 from tg_bot import dispatcher, LOGGER
 from tg_bot.modules.disable import DisableAbleCommandHandler
-from tg_bot.modules.helper_funcs.chat_status import user_admin, user_not_admin
+from tg_bot.modules.helper_funcs.async_engine import ENGINE
+from tg_bot.modules.helper_funcs.chat_status import user_admin, is_user_admin
+from tg_bot.modules.sql.aio import blacklist_sql as aio_sql
 from tg_bot.modules.helper_funcs.extraction import extract_text
 from tg_bot.modules.helper_funcs.misc import split_message
 
@@ -107,27 +108,25 @@ def unblacklist(bot: Bot, update: Update):
         msg.reply_text("Tell me which words you would like to remove from the blacklist.")
 
 
-@run_async
-@user_not_admin
-def del_blacklist(bot: Bot, update: Update):
+async def del_blacklist(bot: Bot, update: Update):
     chat = update.effective_chat  # type: Optional[Chat]
     message = update.effective_message  # type: Optional[Message]
+    user = update.effective_user  # type: Optional[User]
     to_match = extract_text(message)
-    if not to_match:
+    if not to_match or not user:
         return
 
-    chat_filters = sql.get_chat_blacklist(chat.id)
-    for trigger in chat_filters:
-        pattern = r"( |^|[^\w])" + re.escape(trigger) + r"( |$|[^\w])"
-        if re.search(pattern, to_match, flags=re.IGNORECASE):
-            try:
-                message.delete()
-            except BadRequest as excp:
-                if excp.message == "Message to delete not found":
-                    pass
-                else:
-                    LOGGER.exception("Error while deleting blacklist message.")
-            break
+    # single pass over the message, whatever the number of triggers - and only then the admin check, which can
+    # mean an api call
+    if await aio_sql.get_blacklist_match(chat.id, to_match) and \
+            not await ENGINE.run_sync(is_user_admin, chat, user.id):
+        try:
+            await ENGINE.api.delete_message(chat.id, message.message_id)
+        except BadRequest as excp:
+            if excp.message == "Message to delete not found":
+                pass
+            else:
+                LOGGER.exception("Error while deleting blacklist message.")
 
 
 def __migrate__(old_chat_id, new_chat_id):
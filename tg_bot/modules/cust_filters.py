@@ -1,4 +1,3 @@
-import re
 from typing import Optional
 
 import telegram
@@ -10,12 +9,14 @@ from telegram.utils.helpers import escape_markdown
 
 from tg_bot import dispatcher, LOGGER
 from tg_bot.modules.disable import DisableAbleCommandHandler
+from tg_bot.modules.helper_funcs.async_engine import queued
 from tg_bot.modules.helper_funcs.chat_status import user_admin
 from tg_bot.modules.helper_funcs.extraction import extract_text
 from tg_bot.modules.helper_funcs.filters import CustomFilters
 from tg_bot.modules.helper_funcs.misc import build_keyboard
 from tg_bot.modules.helper_funcs.string_handling import split_quotes, button_markdown_parser
 from tg_bot.modules.sql import cust_filters_sql as sql
+from tg_bot.modules.sql.aio import cust_filters_sql as aio_sql
 
 HANDLER_GROUP = 10
 BASIC_FILTER_STRING = "*Filters in this chat:*\n"
@@ -141,59 +142,55 @@ def stop_filter(bot: Bot, update: Update):
     update.effective_message.reply_text("That's not a current filter - run /filters for all active filters.")
 
 
-@run_async
-def reply_filter(bot: Bot, update: Update):
+async def reply_filter(bot: Bot, update: Update):
     chat = update.effective_chat  # type: Optional[Chat]
     message = update.effective_message  # type: Optional[Message]
     to_match = extract_text(message)
     if not to_match:
         return
 
-    chat_filters = sql.get_chat_triggers(chat.id)
-    for keyword in chat_filters:
-        pattern = r"( |^|[^\w])" + re.escape(keyword) + r"( |$|[^\w])"
-        if re.search(pattern, to_match, flags=re.IGNORECASE):
-            filt = sql.get_filter(chat.id, keyword)
-            if filt.is_sticker:
-                message.reply_sticker(filt.reply)
-            elif filt.is_document:
-                message.reply_document(filt.reply)
-            elif filt.is_image:
-                message.reply_photo(filt.reply)
-            elif filt.is_audio:
-                message.reply_audio(filt.reply)
-            elif filt.is_voice:
-                message.reply_voice(filt.reply)
-            elif filt.is_video:
-                message.reply_video(filt.reply)
-            elif filt.has_markdown:
-                buttons = sql.get_buttons(chat.id, filt.keyword)
-                keyb = build_keyboard(buttons)
-                keyboard = InlineKeyboardMarkup(keyb)
-
-                try:
-                    message.reply_text(filt.reply, parse_mode=ParseMode.MARKDOWN,
-                                       disable_web_page_preview=True,
-                                       reply_markup=keyboard)
-                except BadRequest as excp:
-                    if excp.message == "Unsupported url protocol":
-                        message.reply_text("You seem to be trying to use an unsupported url protocol. Telegram "
-                                           "doesn't support buttons for some protocols, such as tg://. Please try "
-                                           "again, or ask in @MarieSupport for help.")
-                    elif excp.message == "Reply message not found":
-                        bot.send_message(chat.id, filt.reply, parse_mode=ParseMode.MARKDOWN,
-                                         disable_web_page_preview=True,
-                                         reply_markup=keyboard)
-                    else:
-                        message.reply_text("This note could not be sent, as it is incorrectly formatted. Ask in "
-                                           "@MarieSupport if you can't figure out why!")
-                        LOGGER.warning("Message %s could not be parsed", str(filt.reply))
-                        LOGGER.exception("Could not parse filter %s in chat %s", str(filt.keyword), str(chat.id))
-
-            else:
-                # LEGACY - all new filters will have has_markdown set to True.
-                message.reply_text(filt.reply)
-            break
+    keyword = await aio_sql.get_matching_trigger(chat.id, to_match)
+    if keyword:
+        filt = await aio_sql.get_filter(chat.id, keyword)
+        if filt.is_sticker:
+            await queued(message.reply_sticker, filt.reply)
+        elif filt.is_document:
+            await queued(message.reply_document, filt.reply)
+        elif filt.is_image:
+            await queued(message.reply_photo, filt.reply)
+        elif filt.is_audio:
+            await queued(message.reply_audio, filt.reply)
+        elif filt.is_voice:
+            await queued(message.reply_voice, filt.reply)
+        elif filt.is_video:
+            await queued(message.reply_video, filt.reply)
+        elif filt.has_markdown:
+            buttons = await aio_sql.get_buttons(chat.id, filt.keyword)
+            keyb = build_keyboard(buttons)
+            keyboard = InlineKeyboardMarkup(keyb)
+
+            try:
+                await queued(message.reply_text, filt.reply, parse_mode=ParseMode.MARKDOWN,
+                             disable_web_page_preview=True,
+                             reply_markup=keyboard)
+            except BadRequest as excp:
+                if excp.message == "Unsupported url protocol":
+                    await queued(message.reply_text, "You seem to be trying to use an unsupported url protocol. "
+                                                     "Telegram doesn't support buttons for some protocols, such as "
+                                                     "tg://. Please try again, or ask in @MarieSupport for help.")
+                elif excp.message == "Reply message not found":
+                    await queued(bot.send_message, chat.id, filt.reply, parse_mode=ParseMode.MARKDOWN,
+                                 disable_web_page_preview=True,
+                                 reply_markup=keyboard)
+                else:
+                    await queued(message.reply_text, "This note could not be sent, as it is incorrectly formatted. "
+                                                     "Ask in @MarieSupport if you can't figure out why!")
+                    LOGGER.warning("Message %s could not be parsed", str(filt.reply))
+                    LOGGER.exception("Could not parse filter %s in chat %s", str(filt.keyword), str(chat.id))
+
+        else:
+            # LEGACY - all new filters will have has_markdown set to True.
+            await queued(message.reply_text, filt.reply)
 
 
 def __stats__():
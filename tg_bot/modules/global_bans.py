@@ -1,18 +1,21 @@
 import html
-from io import BytesIO
 from typing import Optional, List
 
 from telegram import Message, Update, Bot, User, Chat, ParseMode
-from telegram.error import BadRequest, TelegramError
+from telegram.error import BadRequest
 from telegram.ext import run_async, CommandHandler, MessageHandler, Filters
 from telegram.utils.helpers import mention_html
 
 import tg_bot.modules.sql.global_bans_sql as sql
-from tg_bot import dispatcher, OWNER_ID, SUDO_USERS, SUPPORT_USERS, STRICT_GBAN
-from tg_bot.modules.helper_funcs.chat_status import user_admin, is_user_admin
+from tg_bot import dispatcher, updater, LOGGER, SUDO_USERS, SUPPORT_USERS, STRICT_GBAN
+from tg_bot.modules.helper_funcs.chat_status import user_admin, is_user_admin, invalidate_member, \
+    invalidate_member_everywhere, bot_can_restrict
+from tg_bot.modules.helper_funcs.export import send_list
 from tg_bot.modules.helper_funcs.extraction import extract_user, extract_user_and_text
+from tg_bot.modules.helper_funcs.fanout import FANOUT
 from tg_bot.modules.helper_funcs.filters import CustomFilters
 from tg_bot.modules.helper_funcs.misc import send_to_list
+from tg_bot.modules.helper_funcs.sharding import SHARDING
 from tg_bot.modules.sql.users_sql import get_all_chats
 
 GBAN_ENFORCE_GROUP = 6
@@ -44,6 +47,45 @@ UNGBAN_ERRORS = {
 }
 
 
+def gban_in_chat(bot: Bot, params: dict, chat_id) -> bool:
+    try:
+        bot.kick_chat_member(chat_id, params["user_id"])
+    except BadRequest as excp:
+        if excp.message in GBAN_ERRORS:
+            return False
+        raise
+    invalidate_member_everywhere(chat_id, params["user_id"])
+    return True
+
+
+def gban_done(bot: Bot, params: dict, job):
+    send_to_list(bot, SUDO_USERS + SUPPORT_USERS,
+                 "{} has been successfully gbanned!\n{}".format(mention_html(params["user_id"], params["name"]),
+                                                                 html.escape(job.summary())),
+                 html=True)
+
+
+def ungban_in_chat(bot: Bot, params: dict, chat_id) -> bool:
+    try:
+        member = bot.get_chat_member(chat_id, params["user_id"])
+        if member.status != 'kicked':
+            return False
+        bot.unban_chat_member(chat_id, params["user_id"])
+    except BadRequest as excp:
+        if excp.message in UNGBAN_ERRORS:
+            return False
+        raise
+    invalidate_member_everywhere(chat_id, params["user_id"])
+    return True
+
+
+def ungban_done(bot: Bot, params: dict, job):
+    send_to_list(bot, SUDO_USERS + SUPPORT_USERS,
+                 "{} has been successfully un-gbanned!\n{}".format(mention_html(params["user_id"], params["name"]),
+                                                                    html.escape(job.summary())),
+                 html=True)
+
+
 @run_async
 def gban(bot: Bot, update: Update, args: List[str]):
     message = update.effective_message  # type: Optional[Message]
@@ -108,32 +150,13 @@ def gban(bot: Bot, update: Update, args: List[str]):
                 html=True)
 
     sql.gban_user(user_id, user_chat.username or user_chat.first_name, reason)
+    SHARDING.broadcast("gban", user_id, True)
 
-    chats = get_all_chats()
-    for chat in chats:
-        chat_id = chat.chat_id
-
-        # Check if this group has disabled gbans
-        if not sql.does_chat_gban(chat_id):
-            continue
-
-        try:
-            bot.kick_chat_member(chat_id, user_id)
-        except BadRequest as excp:
-            if excp.message in GBAN_ERRORS:
-                pass
-            else:
-                message.reply_text("Could not gban due to: {}".format(excp.message))
-                send_to_list(bot, SUDO_USERS + SUPPORT_USERS, "Could not gban due to: {}".format(excp.message))
-                sql.ungban_user(user_id)
-                return
-        except TelegramError:
-            pass
-
-    send_to_list(bot, SUDO_USERS + SUPPORT_USERS,
-                   "{} has been successfully gbanned!".format(mention_html(user_chat.id, user_chat.first_name)),
-                   html=True)  
-    message.reply_text("Person has been \"Dealt with\".")
+    # Check if each group has disabled gbans
+    chats = [chat["chat_id"] for chat in get_all_chats() if sql.does_chat_gban(chat["chat_id"])]
+    status = message.reply_text("Enforcing the gban in {} chats...".format(len(chats)))
+    FANOUT.submit("gban", "gban {}".format(user_id), {"user_id": user_id, "name": user_chat.first_name}, chats,
+                  report_to=[status.chat_id, status.message_id])
 
 
 @run_async
@@ -169,62 +192,38 @@ def ungban(bot: Bot, update: Update, args: List[str]):
                                                                     user_chat.id),
                 html=True)
 
-    chats = get_all_chats()
-    for chat in chats:
-        chat_id = chat.chat_id
-
-        # Check if this group has disabled gbans
-        if not sql.does_chat_gban(chat_id):
-            continue
-
-        try:
-            member = bot.get_chat_member(chat_id, user_id)
-            if member.status == 'kicked':
-                bot.unban_chat_member(chat_id, user_id)
-
-        except BadRequest as excp:
-            if excp.message in UNGBAN_ERRORS:
-                pass
-            else:
-                message.reply_text("Could not un-gban due to: {}".format(excp.message))
-                bot.send_message(OWNER_ID, "Could not un-gban due to: {}".format(excp.message))
-                return
-        except TelegramError:
-            pass
-
+    # stop enforcing straight away, so nobody gets kicked again while we're still unbanning
     sql.ungban_user(user_id)
+    SHARDING.broadcast("gban", user_id, False)
 
-    send_to_list(bot, SUDO_USERS + SUPPORT_USERS, 
-                  "{} has been successfully un-gbanned!".format(mention_html(user_chat.id, 
-                                                                         user_chat.first_name)),
-                 html=True)
-
-    message.reply_text("Person has been un-gbanned.")
+    # Check if each group has disabled gbans
+    chats = [chat["chat_id"] for chat in get_all_chats() if sql.does_chat_gban(chat["chat_id"])]
+    status = message.reply_text("Lifting the gban in {} chats...".format(len(chats)))
+    FANOUT.submit("ungban", "ungban {}".format(user_id), {"user_id": user_id, "name": user_chat.first_name}, chats,
+                  report_to=[status.chat_id, status.message_id])
 
 
 @run_async
 def gbanlist(bot: Bot, update: Update):
-    banned_users = sql.get_gban_list()
-
-    if not banned_users:
+    if not sql.num_gbanned_users():
         update.effective_message.reply_text("There aren't any gbanned users! You're kinder than I expected...")
         return
 
-    banfile = 'Screw these guys.\n'
-    for user in banned_users:
-        banfile += "[x] {} - {}\n".format(user["name"], user["user_id"])
-        if user["reason"]:
-            banfile += "Reason: {}\n".format(user["reason"])
+    send_list(update.effective_message, "gbanlist.txt", "Screw these guys.\n", gbanlist_lines(),
+              caption="Here is the list of currently gbanned users.")
 
-    with BytesIO(str.encode(banfile)) as output:
-        output.name = "gbanlist.txt"
-        update.effective_message.reply_document(document=output, filename="gbanlist.txt",
-                                                caption="Here is the list of currently gbanned users.")
+
+def gbanlist_lines():
+    for user in sql.iter_gban_list():
+        yield "[x] {} - {}\n".format(user["name"], user["user_id"])
+        if user.get("reason"):
+            yield "Reason: {}\n".format(user["reason"])
 
 
 def check_and_ban(update, user_id, should_message=True):
     if sql.is_user_gbanned(user_id):
         update.effective_chat.kick_member(user_id)
+        invalidate_member(update.effective_chat.id, user_id)
         if should_message:
             update.effective_message.reply_text("This is a bad person, they shouldn't be here!")
 
@@ -232,23 +231,30 @@ def check_and_ban(update, user_id, should_message=True):
 @run_async
 def enforce_gban(bot: Bot, update: Update):
     # Not using @restrict handler to avoid spamming - just ignore if cant gban.
-    if sql.does_chat_gban(update.effective_chat.id) and update.effective_chat.get_member(bot.id).can_restrict_members:
-        user = update.effective_user  # type: Optional[User]
-        chat = update.effective_chat  # type: Optional[Chat]
-        msg = update.effective_message  # type: Optional[Message]
-
-        if user and not is_user_admin(chat, user.id):
-            check_and_ban(update, user.id)
-
-        if msg.new_chat_members:
-            new_members = update.effective_message.new_chat_members
-            for mem in new_members:
-                check_and_ban(update, mem.id)
+    user = update.effective_user  # type: Optional[User]
+    chat = update.effective_chat  # type: Optional[Chat]
+    msg = update.effective_message  # type: Optional[Message]
+
+    # (user id, whether admins are let off, whether to say so)
+    suspects = [(user.id, True, True)] if user else []
+    suspects.extend((mem.id, False, True) for mem in msg.new_chat_members or [])
+    if msg.reply_to_message and msg.reply_to_message.from_user:
+        suspects.append((msg.reply_to_message.from_user.id, True, False))
+
+    # hardly anyone is gbanned, and that's a lookup in memory - only go to the api once someone is
+    gbanned = [suspect for suspect in suspects if sql.is_user_gbanned(suspect[0])]
+    if not gbanned or not sql.does_chat_gban(chat.id) or not bot_can_restrict(chat, bot.id):
+        return
 
-        if msg.reply_to_message:
-            user = msg.reply_to_message.from_user  # type: Optional[User]
-            if user and not is_user_admin(chat, user.id):
-                check_and_ban(update, user.id, should_message=False)
+    for user_id, spare_admins, should_message in gbanned:
+        if spare_admins and is_user_admin(chat, user_id):
+            continue
+        try:
+            check_and_ban(update, user_id, should_message=should_message)
+        except BadRequest:
+            # we may have lost our rights - check them again next time
+            invalidate_member(chat.id, bot.id)
+            raise
 
 
 @run_async
@@ -257,10 +263,12 @@ def gbanstat(bot: Bot, update: Update, args: List[str]):
     if len(args) > 0:
         if args[0].lower() in ["on", "yes"]:
             sql.enable_gbans(update.effective_chat.id)
+            SHARDING.broadcast("gban_setting", update.effective_chat.id, True)
             update.effective_message.reply_text("I've enabled gbans in this group. This will help protect you "
                                                 "from spammers, unsavoury characters, and the biggest trolls.")
         elif args[0].lower() in ["off", "no"]:
             sql.disable_gbans(update.effective_chat.id)
+            SHARDING.broadcast("gban_setting", update.effective_chat.id, False)
             update.effective_message.reply_text("I've disabled gbans in this group. GBans wont affect your users "
                                                 "anymore. You'll be less protected from any trolls and spammers "
                                                 "though!")
@@ -272,6 +280,12 @@ def gbanstat(bot: Bot, update: Update, args: List[str]):
                                             "spammers.".format(sql.does_chat_gban(update.effective_chat.id)))
 
 
+def reconcile_gbans(bot: Bot, job):
+    drift = sql.reconcile_gbanned_list()
+    if drift:
+        LOGGER.warning("gban cache had drifted from the db by %s ids, reloaded it", drift)
+
+
 def __stats__():
     return "{} gbanned users.".format(sql.num_gbanned_users())
 
@@ -298,6 +312,10 @@ def __chat_settings__(chat_id, user_id):
     return "This chat is enforcing *gbans*: `{}`.".format(sql.does_chat_gban(chat_id))
 
 
+SHARDING.on("gban", sql.cache_gban)
+updater.job_queue.run_repeating(reconcile_gbans, interval=sql.RECONCILE_INTERVAL, first=sql.RECONCILE_INTERVAL)
+SHARDING.on("gban_setting", sql.cache_gban_setting)
+
 __help__ = """
 *Admin only:*
  - /gbanstat <on/off/yes/no>: Will disable the effect of global bans on your group, or return your current settings.
@@ -320,6 +338,9 @@ GBAN_STATUS = CommandHandler("gbanstat", gbanstat, pass_args=True, filters=Filte
 
 GBAN_ENFORCER = MessageHandler(Filters.all & Filters.group, enforce_gban)
 
+FANOUT.register("gban", gban_in_chat, gban_done)
+FANOUT.register("ungban", ungban_in_chat, ungban_done)
+
 dispatcher.add_handler(GBAN_HANDLER)
 dispatcher.add_handler(UNGBAN_HANDLER)
 dispatcher.add_handler(GBAN_LIST)
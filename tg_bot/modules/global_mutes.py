@@ -1,22 +1,93 @@
 import html
-from io import BytesIO
 from typing import Optional, List
 
 from telegram import Message, Update, Bot, User, Chat
-from telegram.error import BadRequest, TelegramError
+from telegram.error import BadRequest
 from telegram.ext import run_async, CommandHandler, MessageHandler, Filters
 from telegram.utils.helpers import mention_html
 
 import tg_bot.modules.sql.global_mutes_sql as sql
-from tg_bot import dispatcher, OWNER_ID, SUDO_USERS, SUPPORT_USERS, STRICT_GMUTE
-from tg_bot.modules.helper_funcs.chat_status import user_admin, is_user_admin
+from tg_bot import dispatcher, updater, LOGGER, SUDO_USERS, SUPPORT_USERS, STRICT_GMUTE
+from tg_bot.modules.helper_funcs.chat_status import user_admin, is_user_admin, invalidate_member, \
+    invalidate_member_everywhere, bot_can_restrict
+from tg_bot.modules.helper_funcs.export import send_list
 from tg_bot.modules.helper_funcs.extraction import extract_user, extract_user_and_text
+from tg_bot.modules.helper_funcs.fanout import FANOUT
 from tg_bot.modules.helper_funcs.filters import CustomFilters
 from tg_bot.modules.helper_funcs.misc import send_to_list
+from tg_bot.modules.helper_funcs.sharding import SHARDING
 from tg_bot.modules.sql.users_sql import get_all_chats
 
 GMUTE_ENFORCE_GROUP = 6
 
+GMUTE_ERRORS = {
+    "User is an administrator of the chat",
+    "Chat not found",
+    "Not enough rights to restrict/unrestrict chat member",
+    "User_not_participant",
+    "Peer_id_invalid",  # Suspect this happens when a group is suspended by telegram.
+    "Group chat was deactivated",
+    "Need to be inviter of a user to kick it from a basic group",
+    "Chat_admin_required",
+    "Only the creator of a basic group can kick group administrators",
+    "Method is available only for supergroups",
+    "Can't demote chat creator",
+}
+
+UNGMUTE_ERRORS = {
+    "User is an administrator of the chat",
+    "Chat not found",
+    "Not enough rights to restrict/unrestrict chat member",
+    "User_not_participant",
+    "Method is available for supergroup and channel chats only",
+    "Not in the chat",
+    "Channel_private",
+    "Chat_admin_required",
+}
+
+
+def gmute_in_chat(bot: Bot, params: dict, chat_id) -> bool:
+    try:
+        bot.restrict_chat_member(chat_id, params["user_id"], can_send_messages=False)
+    except BadRequest as excp:
+        if excp.message in GMUTE_ERRORS:
+            return False
+        raise
+    invalidate_member_everywhere(chat_id, params["user_id"])
+    return True
+
+
+def gmute_done(bot: Bot, params: dict, job):
+    send_to_list(bot, SUDO_USERS + SUPPORT_USERS,
+                 "{} has been successfully gmuted!\n{}".format(mention_html(params["user_id"], params["name"]),
+                                                                html.escape(job.summary())),
+                 html=True)
+
+
+def ungmute_in_chat(bot: Bot, params: dict, chat_id) -> bool:
+    try:
+        member = bot.get_chat_member(chat_id, params["user_id"])
+        if member.status != 'restricted':
+            return False
+        bot.restrict_chat_member(chat_id, int(params["user_id"]),
+                                 can_send_messages=True,
+                                 can_send_media_messages=True,
+                                 can_send_other_messages=True,
+                                 can_add_web_page_previews=True)
+    except BadRequest as excp:
+        if excp.message in UNGMUTE_ERRORS:
+            return False
+        raise
+    invalidate_member_everywhere(chat_id, params["user_id"])
+    return True
+
+
+def ungmute_done(bot: Bot, params: dict, job):
+    send_to_list(bot, SUDO_USERS + SUPPORT_USERS,
+                 "{} has been successfully un-gmuted!\n{}".format(mention_html(params["user_id"], params["name"]),
+                                                                   html.escape(job.summary())),
+                 html=True)
+
 
 @run_async
 def gmute(bot: Bot, update: Update, args: List[str]):
@@ -81,53 +152,13 @@ def gmute(bot: Bot, update: Update, args: List[str]):
 
 
     sql.gmute_user(user_id, user_chat.username or user_chat.first_name, reason)
+    SHARDING.broadcast("gmute", user_id, True)
 
-    chats = get_all_chats()
-    for chat in chats:
-        chat_id = chat.chat_id
-
-        # Check if this group has disabled gmutes
-        if not sql.does_chat_gmute(chat_id):
-            continue
-
-        try:
-            bot.restrict_chat_member(chat_id, user_id, can_send_messages=False)
-        except BadRequest as excp:
-            if excp.message == "User is an administrator of the chat":
-                pass
-            elif excp.message == "Chat not found":
-                pass
-            elif excp.message == "Not enough rights to restrict/unrestrict chat member":
-                pass
-            elif excp.message == "User_not_participant":
-                pass
-            elif excp.message == "Peer_id_invalid":  # Suspect this happens when a group is suspended by telegram.
-                pass
-            elif excp.message == "Group chat was deactivated":
-                pass
-            elif excp.message == "Need to be inviter of a user to kick it from a basic group":
-                pass
-            elif excp.message == "Chat_admin_required":
-                pass
-            elif excp.message == "Only the creator of a basic group can kick group administrators":
-                pass
-            elif excp.message == "Method is available only for supergroups":
-                pass
-            elif excp.message == "Can't demote chat creator":
-                pass
-            else:
-                message.reply_text("Could not gmute due to: {}".format(excp.message))
-                send_to_list(bot, SUDO_USERS + SUPPORT_USERS, "Could not gmute due to: {}".format(excp.message))
-                sql.ungmute_user(user_id)
-                return
-        except TelegramError:
-            pass
-
-    send_to_list(bot, SUDO_USERS + SUPPORT_USERS, 
-                  "{} has been successfully gmuted!".format(mention_html(user_chat.id, user_chat.first_name)),
-                html=True)
-
-    message.reply_text("They won't be talking again anytime soon.")
+    # Check if each group has disabled gmutes
+    chats = [chat["chat_id"] for chat in get_all_chats() if sql.does_chat_gmute(chat["chat_id"])]
+    status = message.reply_text("Enforcing the gmute in {} chats...".format(len(chats)))
+    FANOUT.submit("gmute", "gmute {}".format(user_id), {"user_id": user_id, "name": user_chat.first_name}, chats,
+                  report_to=[status.chat_id, status.message_id])
 
 
 @run_async
@@ -164,80 +195,38 @@ def ungmute(bot: Bot, update: Update, args: List[str]):
                  html=True)
 
 
-    chats = get_all_chats()
-    for chat in chats:
-        chat_id = chat.chat_id
-
-        # Check if this group has disabled gmutes
-        if not sql.does_chat_gmute(chat_id):
-            continue
-
-        try:
-            member = bot.get_chat_member(chat_id, user_id)
-            if member.status == 'restricted':
-                bot.restrict_chat_member(chat_id, int(user_id),
-                                     can_send_messages=True,
-                                     can_send_media_messages=True,
-                                     can_send_other_messages=True,
-                                     can_add_web_page_previews=True)
-
-        except BadRequest as excp:
-            if excp.message == "User is an administrator of the chat":
-                pass
-            elif excp.message == "Chat not found":
-                pass
-            elif excp.message == "Not enough rights to restrict/unrestrict chat member":
-                pass
-            elif excp.message == "User_not_participant":
-                pass
-            elif excp.message == "Method is available for supergroup and channel chats only":
-                pass
-            elif excp.message == "Not in the chat":
-                pass
-            elif excp.message == "Channel_private":
-                pass
-            elif excp.message == "Chat_admin_required":
-                pass
-            else:
-                message.reply_text("Could not un-gmute due to: {}".format(excp.message))
-                bot.send_message(OWNER_ID, "Could not un-gmute due to: {}".format(excp.message))
-                return
-        except TelegramError:
-            pass
-
+    # stop enforcing straight away, so nobody gets muted again while we're still unmuting
     sql.ungmute_user(user_id)
+    SHARDING.broadcast("gmute", user_id, False)
 
-    send_to_list(bot, SUDO_USERS + SUPPORT_USERS, 
-                  "{} has been successfully un-gmuted!".format(mention_html(user_chat.id, 
-                                                                         user_chat.first_name)),
-                  html=True)
-
-    message.reply_text("Person has been un-gmuted.")
+    # Check if each group has disabled gmutes
+    chats = [chat["chat_id"] for chat in get_all_chats() if sql.does_chat_gmute(chat["chat_id"])]
+    status = message.reply_text("Lifting the gmute in {} chats...".format(len(chats)))
+    FANOUT.submit("ungmute", "ungmute {}".format(user_id), {"user_id": user_id, "name": user_chat.first_name},
+                  chats, report_to=[status.chat_id, status.message_id])
 
 
 @run_async
 def gmutelist(bot: Bot, update: Update):
-    muted_users = sql.get_gmute_list()
-
-    if not muted_users:
+    if not sql.num_gmuted_users():
         update.effective_message.reply_text("There aren't any gmuted users! You're kinder than I expected...")
         return
 
-    mutefile = 'Screw these guys.\n'
-    for user in muted_users:
-        mutefile += "[x] {} - {}\n".format(user["name"], user["user_id"])
-        if user["reason"]:
-            mutefile += "Reason: {}\n".format(user["reason"])
+    send_list(update.effective_message, "gmutelist.txt", "Screw these guys.\n", gmutelist_lines(),
+              caption="Here is the list of currently gmuted users.")
+
 
-    with BytesIO(str.encode(mutefile)) as output:
-        output.name = "gmutelist.txt"
-        update.effective_message.reply_document(document=output, filename="gmutelist.txt",
-                                                caption="Here is the list of currently gmuted users.")
+def gmutelist_lines():
+    for user in sql.iter_gmute_list():
+        yield "[x] {} - {}\n".format(user["name"], user["user_id"])
+        if user.get("reason"):
+            yield "Reason: {}\n".format(user["reason"])
 
 
 def check_and_mute(bot, update, user_id, should_message=True):
     if sql.is_user_gmuted(user_id):
         bot.restrict_chat_member(update.effective_chat.id, user_id, can_send_messages=False)
+        invalidate_member(update.effective_chat.id, user_id)
         if should_message:
             update.effective_message.reply_text("This is a bad person, I'll silence them for you!")
 
@@ -245,21 +234,31 @@ def check_and_mute(bot, update, user_id, should_message=True):
 @run_async
 def enforce_gmute(bot: Bot, update: Update):
     # Not using @restrict handler to avoid spamming - just ignore if cant gmute.
-    if sql.does_chat_gmute(update.effective_chat.id) and update.effective_chat.get_member(bot.id).can_restrict_members:
-        user = update.effective_user  # type: Optional[User]
-        chat = update.effective_chat  # type: Optional[Chat]
-        msg = update.effective_message  # type: Optional[Message]
-
-        if user and not is_user_admin(chat, user.id):
-            check_and_mute(bot, update, user.id, should_message=True)
-        if msg.new_chat_members:
-            new_members = update.effective_message.new_chat_members
-            for mem in new_members:
-                check_and_mute(bot, update, mem.id, should_message=True)
-        if msg.reply_to_message:
-            user = msg.reply_to_message.from_user  # type: Optional[User]
-            if user and not is_user_admin(chat, user.id):
-                check_and_mute(bot, update, user.id, should_message=True)
+    user = update.effective_user  # type: Optional[User]
+    chat = update.effective_chat  # type: Optional[Chat]
+    msg = update.effective_message  # type: Optional[Message]
+
+    # (user id, whether admins are let off)
+    suspects = [(user.id, True)] if user else []
+    suspects.extend((mem.id, False) for mem in msg.new_chat_members or [])
+    if msg.reply_to_message and msg.reply_to_message.from_user:
+        suspects.append((msg.reply_to_message.from_user.id, True))
+
+    # hardly anyone is gmuted, and that's a lookup in memory - only go to the api once someone is
+    gmuted = [suspect for suspect in suspects if sql.is_user_gmuted(suspect[0])]
+    if not gmuted or not sql.does_chat_gmute(chat.id) or not bot_can_restrict(chat, bot.id):
+        return
+
+    for user_id, spare_admins in gmuted:
+        if spare_admins and is_user_admin(chat, user_id):
+            continue
+        try:
+            check_and_mute(bot, update, user_id, should_message=True)
+        except BadRequest:
+            # we may have lost our rights - check them again next time
+            invalidate_member(chat.id, bot.id)
+            raise
+
 
 @run_async
 @user_admin
@@ -267,10 +266,12 @@ def gmutestat(bot: Bot, update: Update, args: List[str]):
     if len(args) > 0:
         if args[0].lower() in ["on", "yes"]:
             sql.enable_gmutes(update.effective_chat.id)
+            SHARDING.broadcast("gmute_setting", update.effective_chat.id, True)
             update.effective_message.reply_text("I've enabled gmutes in this group. This will help protect you "
                                                 "from spammers, unsavoury characters, and Anirudh.")
         elif args[0].lower() in ["off", "no"]:
             sql.disable_gmutes(update.effective_chat.id)
+            SHARDING.broadcast("gmute_setting", update.effective_chat.id, False)
             update.effective_message.reply_text("I've disabled gmutes in this group. GMutes wont affect your users "
                                                 "anymore. You'll be less protected from Anirudh though!")
     else:
@@ -281,6 +282,12 @@ def gmutestat(bot: Bot, update: Update, args: List[str]):
                                             "spammers.".format(sql.does_chat_gmute(update.effective_chat.id)))
 
 
+def reconcile_gmutes(bot: Bot, job):
+    drift = sql.reconcile_gmuted_list()
+    if drift:
+        LOGGER.warning("gmute cache had drifted from the db by %s ids, reloaded it", drift)
+
+
 def __stats__():
     return "{} gmuted users.".format(sql.num_gmuted_users())
 
@@ -307,6 +314,10 @@ def __chat_settings__(chat_id, user_id):
     return "This chat is enforcing *gmutes*: `{}`.".format(sql.does_chat_gmute(chat_id))
 
 
+SHARDING.on("gmute", sql.cache_gmute)
+updater.job_queue.run_repeating(reconcile_gmutes, interval=sql.RECONCILE_INTERVAL, first=sql.RECONCILE_INTERVAL)
+SHARDING.on("gmute_setting", sql.cache_gmute_setting)
+
 __help__ = """
 *Admin only:*
  - /gmutestat <on/off/yes/no>: Will disable the effect of global mutes on your group, or return your current settings.
@@ -329,6 +340,9 @@ GMUTE_STATUS = CommandHandler("gmutestat", gmutestat, pass_args=True, filters=Fi
 
 GMUTE_ENFORCER = MessageHandler(Filters.all & Filters.group, enforce_gmute)
 
+FANOUT.register("gmute", gmute_in_chat, gmute_done)
+FANOUT.register("ungmute", ungmute_in_chat, ungmute_done)
+
 dispatcher.add_handler(GMUTE_HANDLER)
 dispatcher.add_handler(UNGMUTE_HANDLER)
 dispatcher.add_handler(GMUTE_LIST)
@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from telegram import Update
+
+from tg_bot.modules.helper_funcs.chat_status import is_user_admin
+from tg_bot.modules.helper_funcs.handlers import CMD_STARTERS
+from tg_bot.modules.helper_funcs.ratelimit import TokenBucket
+
+CHAT_RATE = 10  # updates per second, per chat
+CHAT_BURST = 10
+GLOBAL_RATE = 100  # updates per second, across all chats
+GLOBAL_BURST = 300
+MAX_DEFER = 2  # seconds an update may be held back before we'd rather drop it
+MAX_TRACKED_CHATS = 50000
+
+
+class AdmissionController(object):
+    """Decides, per incoming update, whether to process it now, later, or not at all.
+
+    Every chat has its own token bucket, and all of them share a global one. Updates over the rate are deferred as
+    long as the wait stays under MAX_DEFER, and dropped past that. Service messages and admin commands are never
+    held back.
+    """
+
+    def __init__(self):
+        self.admitted = 0
+        self.deferred = 0
+        self.dropped = 0
+        self.prioritised = 0
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_BURST, time.monotonic())
+        self._chats = OrderedDict()
+        self._released = set()  # update ids which were deferred, and whose turn has now come
+        self._lock = threading.Lock()
+
+    def set_global_rate(self, rate: float, burst: float):
+        """For when several processes share the bot's global limit."""
+        with self._lock:
+            self._global = TokenBucket(rate, burst, time.monotonic())
+
+    @staticmethod
+    def _is_priority(update: Update) -> bool:
+        msg = update.effective_message
+        if not msg:
+            return False
+
+        # joins, leaves, migrations, pins... - these keep the bot's view of the chat correct
+        if not (msg.text or msg.caption or msg.effective_attachment or msg.contact or msg.location or msg.venue):
+            return True
+
+        user = update.effective_user
+        return bool(msg.text and msg.text.startswith(CMD_STARTERS) and user
+                    and is_user_admin(update.effective_chat, user.id))
+
+    def _chat_bucket(self, chat_id: int, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(CHAT_RATE, CHAT_BURST, now)
+        else:
+            self._chats.move_to_end(chat_id)
+
+        # a bucket which has refilled completely is the same as a new one, so idle chats cost nothing to forget
+        while self._chats:
+            oldest_id, oldest = next(iter(self._chats.items()))
+            if oldest_id == chat_id or (len(self._chats) <= MAX_TRACKED_CHATS and not oldest.is_full(now)):
+                break
+            del self._chats[oldest_id]
+        return bucket
+
+    def admit(self, update) -> Optional[float]:
+        """Returns 0 to process the update now, a delay in seconds to process it later, or None to drop it."""
+        if not isinstance(update, Update):
+            # errors, strings put on the queue by jobs... - nothing telegram sent us, so nothing to throttle
+            return 0
+
+        with self._lock:
+            if update.update_id in self._released:
+                self._released.discard(update.update_id)
+                self.admitted += 1
+                return 0
+
+            now = time.monotonic()
+            chat = update.effective_chat
+            wait = self._global.take(now, MAX_DEFER)
+            if wait is not None and chat:
+                chat_wait = self._chat_bucket(chat.id, now).take(now, MAX_DEFER)
+                if chat_wait is None:
+                    self._global.give_back()
+                    wait = None
+                else:
+                    wait = max(wait, chat_wait)
+
+            if wait == 0:
+                self.admitted += 1
+                return 0
+
+        # only check priority once we know the update would be held back - it may need an admin lookup
+        if self._is_priority(update):
+            with self._lock:
+                self.prioritised += 1
+            return 0
+
+        with self._lock:
+            if wait is None:
+                self.dropped += 1
+                return None
+
+            self.deferred += 1
+            self._released.add(update.update_id)
+            return wait
+
+    def stats(self) -> str:
+        return "{} updates admitted, {} deferred, {} dropped, {} let through on priority; tracking {} chats.".format(
+            self.admitted, self.deferred, self.dropped, self.prioritised, len(self._chats))
+
+
+ADMISSION = AdmissionController()
+
+
+def __stats__():
+    return ADMISSION.stats()
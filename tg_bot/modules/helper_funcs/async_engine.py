@@ -0,0 +1,239 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial, wraps
+from typing import Callable, Optional
+
+import aiohttp
+from telegram import Message, ChatMember
+from telegram.error import TelegramError, RetryAfter, BadRequest, Unauthorized, ChatMigrated, NetworkError, \
+    TimedOut
+from telegram.ext import run_async, DispatcherHandlerStop
+
+from tg_bot import dispatcher, LOGGER, TOKEN
+
+MAX_IN_FLIGHT = 5000  # handlers running at once on the loop, beyond which new ones wait their turn
+LEGACY_WORKERS = 16  # threads for sync code called from the loop
+API_URL = "https://api.telegram.org/bot{}/{}"
+API_TIMEOUT = 30  # seconds
+MAX_RETRIES = 3
+
+
+class AsyncBotApi(object):
+    """Minimal Bot API client on aiohttp, for use from coroutine handlers.
+
+    Errors are raised as the same TelegramError subclasses python-telegram-bot uses, and flood waits are slept off
+    and retried.
+    """
+
+    def __init__(self, token: str):
+        self._token = token
+        self._session = None  # type: Optional[aiohttp.ClientSession]
+
+    async def call(self, method: str, **params):
+        params = {key: value for key, value in params.items() if value is not None}
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                return await self._post(method, params)
+            except RetryAfter as excp:
+                if attempt == MAX_RETRIES:
+                    raise
+                await asyncio.sleep(excp.retry_after)
+
+    async def _post(self, method: str, params: dict):
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        try:
+            async with self._session.post(API_URL.format(self._token, method), json=params,
+                                          timeout=API_TIMEOUT) as resp:
+                data = await resp.json(content_type=None)
+        except asyncio.TimeoutError:
+            raise TimedOut()
+        except aiohttp.ClientError as excp:
+            raise NetworkError(str(excp))
+
+        if data.get("ok"):
+            return data["result"]
+
+        description = data.get("description", "Unknown error")
+        parameters = data.get("parameters") or {}
+        if parameters.get("retry_after"):
+            raise RetryAfter(parameters["retry_after"])
+        if parameters.get("migrate_to_chat_id"):
+            raise ChatMigrated(parameters["migrate_to_chat_id"])
+        if data.get("error_code") in (401, 403):
+            raise Unauthorized(description)
+        if data.get("error_code") == 400:
+            raise BadRequest(description)
+        raise TelegramError(description)
+
+    async def send_message(self, chat_id, text: str, parse_mode: str = None, reply_to_message_id: int = None,
+                           disable_web_page_preview: bool = None, reply_markup=None) -> Message:
+        result = await self.call("sendMessage", chat_id=chat_id, text=text, parse_mode=parse_mode,
+                                 reply_to_message_id=reply_to_message_id,
+                                 disable_web_page_preview=disable_web_page_preview,
+                                 reply_markup=reply_markup.to_dict() if reply_markup else None)
+        return Message.de_json(result, dispatcher.bot)
+
+    async def delete_message(self, chat_id, message_id: int) -> bool:
+        return await self.call("deleteMessage", chat_id=chat_id, message_id=message_id)
+
+    async def get_chat_member(self, chat_id, user_id: int) -> ChatMember:
+        result = await self.call("getChatMember", chat_id=chat_id, user_id=user_id)
+        return ChatMember.de_json(result, dispatcher.bot)
+
+    async def kick_chat_member(self, chat_id, user_id: int, until_date: int = None) -> bool:
+        return await self.call("kickChatMember", chat_id=chat_id, user_id=user_id, until_date=until_date)
+
+    async def restrict_chat_member(self, chat_id, user_id: int, until_date: int = None, **permissions) -> bool:
+        return await self.call("restrictChatMember", chat_id=chat_id, user_id=user_id, until_date=until_date,
+                               **permissions)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class AsyncEngine(object):
+    """Runs coroutine handlers on a single event loop, in a thread of its own.
+
+    Any handler whose callback is an `async def` is picked up by the dispatcher and run here instead of tying up
+    one of the WORKERS threads, so thousands of them can be waiting on the api or the db at once. Like @run_async
+    handlers they run detached from the dispatcher: DispatcherHandlerStop has no effect (it's swallowed), and
+    TelegramErrors go to the error handlers. Don't put @run_async on them - see checking().
+
+    Blocking code (most of the sql modules, the sync Bot) must not be called from the loop directly - await
+    run_sync() for that, or wrap whole legacy handlers with @legacy_handler. Sends through the outbound queue can
+    be awaited with queued().
+    """
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, legacy_workers: int = LEGACY_WORKERS):
+        self.loop = None  # type: Optional[asyncio.AbstractEventLoop]
+        self.api = AsyncBotApi(TOKEN)
+        self.started = 0
+        self.finished = 0
+        self.failed = 0
+        self._max_in_flight = max_in_flight
+        self._slots = None  # type: Optional[asyncio.Semaphore]
+        self._legacy = ThreadPoolExecutor(max_workers=legacy_workers)
+        self._thread = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run_loop, name="async-engine", daemon=True)
+                self._thread.start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._slots = asyncio.Semaphore(self._max_in_flight)
+        self.loop = loop
+        self._ready.set()
+        loop.run_forever()
+
+    def submit(self, coro, update=None) -> Future:
+        """Schedule a coroutine on the loop, from any thread."""
+        if not self._ready.is_set():
+            self.start()
+        return asyncio.run_coroutine_threadsafe(self._run(coro, update), self.loop)
+
+    async def _run(self, coro, update):
+        async with self._slots:
+            self.started += 1
+            try:
+                result = await coro
+            except DispatcherHandlerStop:
+                # the dispatcher moved on to the next update long ago, there's nothing left to stop
+                self.finished += 1
+            except TelegramError as excp:
+                self.failed += 1
+                LOGGER.warning("A TelegramError was raised while processing the Update")
+                await self.run_sync(self._dispatch_error, update, excp)
+            except Exception:
+                self.failed += 1
+                LOGGER.exception("An uncaught error was raised while processing the update")
+            else:
+                self.finished += 1
+                return result
+
+    @staticmethod
+    def _dispatch_error(update, error: TelegramError):
+        try:
+            dispatcher.dispatch_error(update, error)
+        except Exception:
+            LOGGER.exception("An uncaught error was raised while handling the error")
+
+    async def run_sync(self, func: Callable, *args, **kwargs):
+        """Run blocking code on the legacy pool, without holding up the loop."""
+        return await asyncio.get_event_loop().run_in_executor(self._legacy, partial(func, *args, **kwargs))
+
+    def in_flight(self) -> int:
+        return self.started - self.finished - self.failed
+
+    def stats(self) -> str:
+        return "{} async handlers run, {} failed, {} in flight.".format(self.finished, self.failed,
+                                                                       self.in_flight())
+
+    def stop(self):
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.api.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._legacy.shutdown(wait=False)
+
+
+ENGINE = AsyncEngine()
+
+
+def legacy_handler(func):
+    """Adapt a sync handler to the async pipeline: it runs on the engine's legacy pool instead of a dispatcher
+    worker, and can be awaited from other coroutines."""
+
+    @wraps(func)
+    async def wrapped(bot, update, *args, **kwargs):
+        return await ENGINE.run_sync(func, bot, update, *args, **kwargs)
+
+    return wrapped
+
+
+async def queued(send: Callable, *args, **kwargs):
+    """Await a send through the outbound queue, eg `await queued(message.reply_text, text)`, without holding up
+    a thread while the message waits its turn."""
+    return await asyncio.wrap_future(send(*args, wait=False, **kwargs))
+
+
+_RUN_ASYNC_CODE = run_async(lambda: None).__code__
+
+
+def check_handler(handler):
+    """Refuse an async def callback which also has @run_async: that runs it on a worker thread, which hands back a
+    Promise instead of the coroutine, so the coroutine would never be awaited - silently."""
+    layer = getattr(handler, "callback", None)
+    pooled = False
+    while layer is not None:
+        pooled = pooled or getattr(layer, "__code__", None) is _RUN_ASYNC_CODE
+        if asyncio.iscoroutinefunction(layer):
+            if pooled:
+                raise ValueError("{} is an async def handler - drop its @run_async".format(layer.__qualname__))
+            return
+        layer = getattr(layer, "__wrapped__", None)
+
+
+def checking(add_handler):
+    """Wrap Dispatcher.add_handler with check_handler(), so a broken handler fails at startup."""
+
+    @wraps(add_handler)
+    def wrapper(self, handler, *args, **kwargs):
+        check_handler(handler)
+        return add_handler(self, handler, *args, **kwargs)
+
+    return wrapper
+
+
+def __stats__():
+    return ENGINE.stats()
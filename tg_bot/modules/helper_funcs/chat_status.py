@@ -1,13 +1,175 @@
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
-from typing import Optional
+from typing import Callable, Optional, Union, Dict
 
 from telegram import User, Chat, ChatMember, Update, Bot
+from telegram.error import TelegramError
 
 from tg_bot import DEL_CMDS, SUDO_USERS, WHITELIST_USERS
+from tg_bot.modules.helper_funcs.sharding import SHARDING
+
+MEMBER_CACHE_TTL = 5 * 60  # seconds
+MEMBER_CACHE_SIZE = 50000  # (chat, user) pairs
+ADMIN_CACHE_TTL = 10 * 60  # seconds
+ADMIN_CACHE_SIZE = 10000  # chats
+
+
+class TTLCache(object):
+    """Thread-safe cache with a per-entry TTL and LRU eviction, counting hits and misses."""
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def replace(self, key, func: Callable):
+        """Swap a live entry's value for func(value), keeping its expiry - without counting as a hit or a miss.
+        func should return a new value rather than change the old one, which readers may still be holding."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] >= time.monotonic():
+                self._entries[key] = (entry[0], func(entry[1]))
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return entry[1] if entry else None
+
+    def pop_chat(self, chat_id: int):
+        # keys are either the chat id itself, or a (chat id, ...) tuple
+        with self._lock:
+            for key in [key for key in self._entries
+                        if key == chat_id or isinstance(key, tuple) and key[0] == chat_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# (chat, user) -> ChatMember
+MEMBER_CACHE = TTLCache(MEMBER_CACHE_TTL, MEMBER_CACHE_SIZE)
+# chat -> {admin user id: ChatMember, or None when we updated the roster ourselves and don't have the details}
+ADMIN_CACHE = TTLCache(ADMIN_CACHE_TTL, ADMIN_CACHE_SIZE)
+
+
+def get_member(chat: Chat, user_id: int) -> ChatMember:
+    member = MEMBER_CACHE.get((chat.id, user_id))
+    if member is None:
+        member = chat.get_member(user_id)
+        MEMBER_CACHE.set((chat.id, user_id), member)
+    return member
+
+
+def invalidate_member(chat_id: Union[int, str], user_id: int = None):
+    if user_id is not None:
+        MEMBER_CACHE.pop((int(chat_id), int(user_id)))
+    else:
+        MEMBER_CACHE.pop_chat(int(chat_id))
+
+
+def invalidate_member_everywhere(chat_id: Union[int, str], user_id: int = None):
+    # for changes made from outside the chat (remote commands, fan-out jobs): when sharded, the cached status lives
+    # on whichever shard owns that chat, which needn't be this one
+    invalidate_member(chat_id, user_id)
+    SHARDING.broadcast("invalidate_member", chat_id, user_id)
+
+
+SHARDING.on("invalidate_member", invalidate_member)
+
+
+def get_admins(chat: Chat) -> Optional[Dict[int, Optional[ChatMember]]]:
+    # one getChatAdministrators call per chat per ADMIN_CACHE_TTL, instead of a getChatMember per message
+    admins = ADMIN_CACHE.get(chat.id)
+    if admins is None:
+        try:
+            admins = {admin.user.id: admin for admin in chat.get_administrators()}
+        except TelegramError:
+            return None
+        ADMIN_CACHE.set(chat.id, admins)
+    return admins
+
+
+def add_admin(chat_id: Union[int, str], user_id: int, member: ChatMember = None):
+    ADMIN_CACHE.replace(int(chat_id), lambda admins: {**admins, int(user_id): member})
+
+
+def remove_admin(chat_id: Union[int, str], user_id: int):
+    ADMIN_CACHE.replace(int(chat_id), lambda admins: {admin_id: admin for admin_id, admin in admins.items()
+                                                      if admin_id != int(user_id)})
+
+
+def invalidate_admins(chat_id: Union[int, str]):
+    ADMIN_CACHE.pop(int(chat_id))
+
+
+def _is_admin(chat: Chat, user_id: int, member: ChatMember = None) -> bool:
+    if member:
+        return member.status in ('administrator', 'creator')
+
+    admins = get_admins(chat)
+    if admins is not None:
+        return user_id in admins
+    return get_member(chat, user_id).status in ('administrator', 'creator')
+
+
+# not async - cheap, and has to run before the other handlers look at the member
+def member_status_changed(bot: Bot, update: Update):
+    msg = update.effective_message
+    chat = update.effective_chat
+    if not msg or not chat:
+        return
+
+    for new_mem in msg.new_chat_members or []:
+        invalidate_member(chat.id, new_mem.id)
+        if new_mem.id == bot.id:
+            # we just got added - whatever we knew about this chat is out of date
+            invalidate_admins(chat.id)
+        else:
+            # people join as regular members
+            remove_admin(chat.id, new_mem.id)
+
+    if msg.left_chat_member:
+        invalidate_member(chat.id, msg.left_chat_member.id)
+        remove_admin(chat.id, msg.left_chat_member.id)
 
 
 def can_delete(chat: Chat, bot_id: int) -> bool:
-    return chat.get_member(bot_id).can_delete_messages
+    admins = get_admins(chat)
+    if admins is not None:
+        if bot_id not in admins:
+            return False
+        if admins[bot_id] is not None:
+            return admins[bot_id].can_delete_messages
+    return get_member(chat, bot_id).can_delete_messages
 
 
 def is_user_ban_protected(chat: Chat, user_id: int, member: ChatMember = None) -> bool:
@@ -17,9 +179,7 @@ def is_user_ban_protected(chat: Chat, user_id: int, member: ChatMember = None) -
             or chat.all_members_are_administrators:
         return True
 
-    if not member:
-        member = chat.get_member(user_id)
-    return member.status in ('administrator', 'creator')
+    return _is_admin(chat, user_id, member)
 
 
 def is_user_admin(chat: Chat, user_id: int, member: ChatMember = None) -> bool:
@@ -28,9 +188,7 @@ def is_user_admin(chat: Chat, user_id: int, member: ChatMember = None) -> bool:
             or chat.all_members_are_administrators:
         return True
 
-    if not member:
-        member = chat.get_member(user_id)
-    return member.status in ('administrator', 'creator')
+    return _is_admin(chat, user_id, member)
 
 
 def is_bot_admin(chat: Chat, bot_id: int, bot_member: ChatMember = None) -> bool:
@@ -38,13 +196,16 @@ def is_bot_admin(chat: Chat, bot_id: int, bot_member: ChatMember = None) -> bool
             or chat.all_members_are_administrators:
         return True
 
-    if not bot_member:
-        bot_member = chat.get_member(bot_id)
-    return bot_member.status in ('administrator', 'creator')
+    return _is_admin(chat, bot_id, bot_member)
+
+
+def bot_can_restrict(chat: Chat, bot_id: int) -> bool:
+    # cached like any other member - drop it with invalidate_member when a restriction fails
+    return bool(get_member(chat, bot_id).can_restrict_members)
 
 
 def is_user_in_chat(chat: Chat, user_id: int) -> bool:
-    member = chat.get_member(user_id)
+    member = get_member(chat, user_id)
     return member.status not in ('left', 'kicked')
 
 
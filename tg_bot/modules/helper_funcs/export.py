@@ -0,0 +1,36 @@
+import gzip
+import shutil
+from tempfile import SpooledTemporaryFile
+from typing import Iterable
+
+from telegram import Message
+
+SPOOL_SIZE = 1024 * 1024  # bytes held in memory before an export spills over to a temp file
+COMPRESS_OVER = 50000  # rows - bigger lists go out gzipped
+
+
+def send_list(message: Message, filename: str, header: str, lines: Iterable[str], caption: str,
+              compress_over: int = COMPRESS_OVER):
+    """Reply with a text file built from `lines`, written out as they come rather than joined up in memory.
+
+    Pass a cursor-backed generator and not even the rows need to fit in memory at once. If it comes to more than
+    `compress_over` rows, it goes out gzipped.
+    """
+    with SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+        spool.write(header.encode("utf-8"))
+        rows = 0
+        for line in lines:
+            spool.write(line.encode("utf-8"))
+            rows += 1
+        spool.seek(0)
+
+        if rows <= compress_over:
+            # sends block until they're done, so the spool is still open for the upload
+            message.reply_document(document=spool, filename=filename, caption=caption)
+            return
+
+        with SpooledTemporaryFile(max_size=SPOOL_SIZE) as packed:
+            with gzip.GzipFile(filename=filename, mode="wb", fileobj=packed) as output:
+                shutil.copyfileobj(spool, output)
+            packed.seek(0)
+            message.reply_document(document=packed, filename=filename + ".gz", caption=caption)
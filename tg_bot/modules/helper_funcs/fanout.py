@@ -0,0 +1,295 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from telegram import Bot
+from telegram.error import BadRequest, RetryAfter, NetworkError, TelegramError
+
+from tg_bot import dispatcher, LOGGER
+import tg_bot.modules.sql.fanout_jobs_sql as sql
+
+FANOUT_WORKERS = 8
+GLOBAL_RATE = 30  # api calls per second, across every running job - telegram's bulk limit
+CHAT_INTERVAL = 1  # seconds between two calls to the same chat
+MAX_RETRIES = 3
+BATCH_SIZE = 100  # targets between two checkpoints
+PROGRESS_INTERVAL = 10  # seconds between progress reports
+HEARTBEAT_INTERVAL = 30  # seconds between lease renewals - well inside sql.LEASE
+
+
+class RateLimiter(object):
+    """Spaces out api calls: at most GLOBAL_RATE per second overall, and one per CHAT_INTERVAL for any one chat.
+
+    A RetryAfter from telegram pauses everything until the flood wait is over.
+    """
+
+    def __init__(self, rate: float = GLOBAL_RATE, chat_interval: float = CHAT_INTERVAL):
+        self._interval = 1 / rate
+        self._next = 0.0
+        self._chat_interval = chat_interval
+        self._chat_next = {}  # type: Dict[int, float]
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, chat_id):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._paused_until, self._chat_next.get(chat_id, 0), self._next)
+            self._next = start + self._interval
+            self._chat_next[chat_id] = start + self._chat_interval
+
+            if len(self._chat_next) > 10000:
+                self._chat_next = {chat: at for chat, at in self._chat_next.items() if at > now}
+
+        if start > now:
+            time.sleep(start - now)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class FanOutJob(object):
+    """One bulk operation - the same action, run once for each of a list of chats."""
+
+    def __init__(self, job_id: int, kind: str, name: str, params: dict, targets: List,
+                 report_to: Optional[List[int]] = None):
+        self.job_id = job_id
+        self.kind = kind
+        self.name = name
+        self.params = params
+        self.targets = targets
+        self.report_to = report_to  # [chat_id, message_id] of the status message to keep up to date
+        self.total = len(targets)
+        self.position = 0  # everything before this has been handed out
+        self.succeeded = 0  # the action actually did something
+        self.skipped = 0  # nothing to do in that chat
+        self.failed = 0
+        self.errors = Counter()
+        self.started = time.monotonic()
+        self._batch_left = 0
+        self._last_progress = self.started
+        self._cancelled = threading.Event()
+        self._finished = threading.Event()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "FanOutJob":
+        job = cls(doc["job_id"], doc["kind"], doc["name"], doc["params"], doc["targets"], doc.get("report_to"))
+        job.position = doc["position"]
+        job.succeeded = doc["succeeded"]
+        job.skipped = doc["skipped"]
+        job.failed = doc["failed"]
+        job.errors = Counter(dict(doc["errors"]))
+        return job
+
+    @property
+    def done(self) -> int:
+        return self.succeeded + self.skipped + self.failed
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._finished.wait(timeout)
+
+    def status(self) -> str:
+        return "#{} {}: {}/{} chats done ({} ok, {} skipped, {} failed){} after {}s".format(
+            self.job_id, self.name, self.done, self.total, self.succeeded, self.skipped, self.failed,
+            ", cancelled" if self.cancelled else "", int(time.monotonic() - self.started))
+
+    def summary(self) -> str:
+        text = self.status()
+        if self.errors:
+            text += "\nErrors:\n" + "\n".join("{}x {}".format(count, error)
+                                             for error, count in self.errors.most_common(10))
+        return text
+
+    def _record(self, outcome: Optional[bool], error: Optional[str]) -> bool:
+        """Count one target as done; returns True when that was the last one of the current batch."""
+        with self._lock:
+            if outcome is None:
+                self.failed += 1
+                self.errors[error] += 1
+            elif outcome:
+                self.succeeded += 1
+            else:
+                self.skipped += 1
+
+            self._batch_left -= 1
+            return self._batch_left == 0
+
+
+class FanOutExecutor(object):
+    """Runs bulk chat operations (gbans, broadcasts...) on a small pool of its own, instead of a dispatcher worker.
+
+    Every api call goes through a shared RateLimiter, and flood waits are honoured and retried. Jobs are stored in
+    the db and checkpointed after every batch of targets, so whatever was still running when the bot stopped
+    carries on from its last checkpoint on the next start.
+
+    Several instances can share the db: each job is leased to the instance running it, which keeps renewing the
+    lease. Only jobs whose lease has run out - their instance is gone - get resumed elsewhere.
+
+    Each kind of job registers an action, called as `action(bot, params, chat_id)` for every target; it returns
+    whether it did anything, and raises TelegramError on failure. An optional `on_finish(bot, params, job)` runs
+    once the job is over.
+    """
+
+    def __init__(self, workers: int = FANOUT_WORKERS, limiter: RateLimiter = None):
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self.limiter = limiter or RateLimiter()
+        self._kinds = {}  # type: Dict[str, tuple]
+        self._jobs = {}  # type: Dict[int, FanOutJob]
+        self._lock = threading.Lock()
+        self._heartbeat = None  # type: Optional[threading.Thread]
+        self._adopting = False
+
+    def register(self, kind: str, action: Callable[[Bot, dict, object], bool],
+                 on_finish: Callable[[Bot, dict, FanOutJob], None] = None):
+        self._kinds[kind] = (action, on_finish)
+
+    def submit(self, kind: str, name: str, params: dict, targets: Iterable,
+               report_to: Optional[List[int]] = None) -> FanOutJob:
+        with self._lock:
+            job = FanOutJob(sql.next_job_id(), kind, name, params, list(targets), report_to)
+            sql.add_job(job.job_id, kind, name, params, job.targets, report_to)
+            self._jobs = {job_id: running for job_id, running in self._jobs.items() if not running.finished}
+            self._jobs[job.job_id] = job
+
+        self._start_heartbeat()
+        self._next_batch(job)
+        return job
+
+    def resume(self):
+        """Take over every job left without an owner, now and from then on."""
+        self._adopting = True
+        self._adopt()
+        self._start_heartbeat()
+
+    def _adopt(self):
+        while True:
+            doc = sql.claim_unfinished_job(self._kinds)
+            if doc is None:
+                return
+            running = self._jobs.get(doc["job_id"])
+            if running and not running.finished:
+                continue  # ours all along - we were just too slow renewing it
+
+            job = FanOutJob.from_doc(doc)
+            LOGGER.info("Resuming fan-out job %s", job.status())
+            with self._lock:
+                self._jobs[job.job_id] = job
+            self._next_batch(job)
+
+    def _start_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name="fanout-heartbeat", daemon=True)
+                self._heartbeat.start()
+
+    def _beat(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                running = [job.job_id for job in self.running()]
+                if sql.renew_leases(running) < len(running):
+                    LOGGER.warning("Lost the lease on some fan-out jobs; another instance may be running them too")
+                if self._adopting:
+                    self._adopt()
+            except Exception:
+                LOGGER.exception("Fan-out heartbeat failed")
+
+    def _next_batch(self, job: FanOutJob):
+        if job.cancelled or job.position >= job.total:
+            self._finish(job)
+            return
+
+        batch = job.targets[job.position:job.position + BATCH_SIZE]
+        job.position += len(batch)
+        job._batch_left = len(batch)
+        for chat_id in batch:
+            self._pool.submit(self._run, job, chat_id)
+
+    def _batch_done(self, job: FanOutJob):
+        try:
+            sql.save_progress(job.job_id, job.position, job.succeeded, job.skipped, job.failed,
+                              [[error, count] for error, count in job.errors.items()])
+        except Exception:
+            # worst case a restart redoes this batch - not worth stopping the job over
+            LOGGER.exception("Couldn't checkpoint fan-out job %s", job.name)
+        if time.monotonic() - job._last_progress >= PROGRESS_INTERVAL:
+            job._last_progress = time.monotonic()
+            self._report(job)
+        self._next_batch(job)
+
+    def _finish(self, job: FanOutJob):
+        sql.finish_job(job.job_id, sql.CANCELLED if job.cancelled else sql.DONE)
+        job._finished.set()
+        self._report(job)
+
+        on_finish = self._kinds[job.kind][1]
+        if on_finish:
+            try:
+                on_finish(dispatcher.bot, job.params, job)
+            except Exception:
+                LOGGER.exception("Finishing fan-out job %s failed", job.name)
+
+    def _report(self, job: FanOutJob):
+        if not job.report_to:
+            return
+        try:
+            dispatcher.bot.edit_message_text(job.summary() if job.finished else job.status(), *job.report_to)
+        except TelegramError:
+            pass  # deleted, or unchanged since the last report
+
+    def _run(self, job: FanOutJob, chat_id):
+        try:
+            outcome, error = self._attempt(job, chat_id)
+        except Exception as excp:
+            LOGGER.exception("Fan-out job %s failed in %s", job.name, chat_id)
+            outcome, error = None, str(excp)
+
+        if job._record(outcome, error):
+            self._batch_done(job)
+
+    def _attempt(self, job: FanOutJob, chat_id) -> Tuple[Optional[bool], Optional[str]]:
+        action = self._kinds[job.kind][0]
+        error = None
+        for attempt in range(MAX_RETRIES + 1):
+            if job.cancelled:
+                return None, "Cancelled"
+
+            self.limiter.acquire(chat_id)
+            try:
+                return bool(action(dispatcher.bot, job.params, chat_id)), None
+            except RetryAfter as excp:
+                self.limiter.pause(excp.retry_after)
+                error = "Flood wait"
+            except BadRequest as excp:
+                return None, excp.message
+            except NetworkError as excp:
+                # timeouts and connection trouble - worth another go
+                error = excp.message
+            except TelegramError as excp:
+                return None, excp.message
+
+        return None, error
+
+    def get(self, job_id: int) -> Optional[FanOutJob]:
+        return self._jobs.get(job_id)
+
+    def running(self) -> List[FanOutJob]:
+        return [job for job in list(self._jobs.values()) if not job.finished]
+
+
+FANOUT = FanOutExecutor()
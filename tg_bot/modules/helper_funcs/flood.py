@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+FLOOD_SHARDS = 16
+MAX_TRACKED_USERS = 100000  # (chat, user) pairs, across all shards
+
+
+class _Shard(object):
+    __slots__ = ("lock", "entries")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (chat_id, user_id) -> [expires_at, deque of message timestamps], least recently active first
+        self.entries = OrderedDict()
+
+
+class FloodTracker(object):
+    """Per (chat, user) sliding window flood detection: more than `limit` messages within `window` seconds.
+
+    Each user gets a fixed size ring buffer of their last limit + 1 message times, so the check is O(1). Users who
+    have gone quiet for longer than the window are evicted, and the total number of tracked users is capped, so
+    memory stays bounded however many chats the bot is in. Locks are sharded by (chat, user) to keep contention
+    on the hot path low.
+    """
+
+    def __init__(self, shards: int = FLOOD_SHARDS, max_tracked: int = MAX_TRACKED_USERS):
+        self._shards = [_Shard() for _ in range(shards)]
+        self._shard_cap = max(1, max_tracked // shards)
+
+    def _shard(self, key) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def check(self, chat_id, user_id, limit: int, window: float, now: float = None) -> bool:
+        if not limit:
+            return False
+
+        now = time.monotonic() if now is None else now
+        key = (chat_id, user_id)
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is None or entry[1].maxlen != limit + 1:
+                # new user, or the chat's limit changed since we last saw them
+                entry = shard.entries[key] = [0, deque(maxlen=limit + 1)]
+            else:
+                shard.entries.move_to_end(key)
+
+            stamps = entry[1]
+            stamps.append(now)
+            entry[0] = now + window
+
+            flooding = len(stamps) == stamps.maxlen and now - stamps[0] <= window
+            if flooding:
+                del shard.entries[key]
+
+            self._evict(shard, now)
+            return flooding
+
+    def _evict(self, shard: _Shard, now: float):
+        # least recently active first, so stop at the first user who is still inside their window
+        while shard.entries:
+            key, entry = next(iter(shard.entries.items()))
+            if entry[0] > now and len(shard.entries) <= self._shard_cap:
+                break
+            del shard.entries[key]
+
+    def reset_user(self, chat_id, user_id):
+        key = (chat_id, user_id)
+        shard = self._shard(key)
+        with shard.lock:
+            shard.entries.pop(key, None)
+
+    def reset_chat(self, chat_id):
+        for shard in self._shards:
+            with shard.lock:
+                for key in [key for key in shard.entries if key[0] == chat_id]:
+                    del shard.entries[key]
+
+    def __len__(self):
+        return sum(len(shard.entries) for shard in self._shards)
@@ -0,0 +1,94 @@
+import threading
+from array import array
+from bisect import bisect_left
+from heapq import merge
+from typing import Iterable, Iterator
+
+MAX_DELTA = 4096  # changes held beside the array before they're merged into it
+
+
+class IdSet(object):
+    """Set of integer ids (users, chats), packed into a sorted array('q').
+
+    That's 8 bytes an id, against the 60 or so a python set costs, which adds up for ban lists in the hundreds of
+    thousands. Lookups are a binary search. Ids added or removed since the last compaction sit in two small sets
+    beside the array, and get merged into it once there are MAX_DELTA of them, so single changes stay cheap.
+
+    Reads take no lock: a compaction only ever swaps in complete objects.
+    """
+
+    def __init__(self, ids: Iterable[int] = ()):
+        self._ids = array('q', sorted(set(ids)))
+        self._added = set()
+        self._removed = set()
+        self._lock = threading.Lock()
+
+    def _in_array(self, user_id: int) -> bool:
+        ids = self._ids
+        pos = bisect_left(ids, user_id)
+        return pos < len(ids) and ids[pos] == user_id
+
+    def __contains__(self, user_id) -> bool:
+        if user_id in self._added:
+            return True
+        if user_id in self._removed:
+            return False
+        return self._in_array(user_id)
+
+    def add(self, user_id: int):
+        with self._lock:
+            self._removed.discard(user_id)
+            if not self._in_array(user_id):
+                self._added.add(user_id)
+                self._maybe_compact()
+
+    def discard(self, user_id: int):
+        with self._lock:
+            self._added.discard(user_id)
+            if self._in_array(user_id):
+                self._removed.add(user_id)
+                self._maybe_compact()
+
+    def replace(self, ids: Iterable[int]) -> int:
+        """Swap the whole contents for a fresh set of ids, eg a reload from the db; returns how many ids changed."""
+        ids = array('q', sorted(set(ids)))
+        with self._lock:
+            drift = _count_differences(iter(self), ids)
+            self._ids = ids
+            self._added = set()
+            self._removed = set()
+        return drift
+
+    def _maybe_compact(self):
+        if len(self._added) + len(self._removed) < MAX_DELTA:
+            return
+        removed = self._removed
+        self._ids = array('q', merge((user_id for user_id in self._ids if user_id not in removed),
+                                     sorted(self._added)))
+        # swap in new sets rather than clearing, so a lookup running right now still sees a consistent picture
+        self._added = set()
+        self._removed = set()
+
+    def __len__(self) -> int:
+        return len(self._ids) - len(self._removed) + len(self._added)
+
+    def __iter__(self) -> Iterator[int]:
+        removed = self._removed
+        return merge((user_id for user_id in self._ids if user_id not in removed), sorted(self._added))
+
+
+def _count_differences(old: Iterator[int], new: Iterable[int]) -> int:
+    # both sorted, so one walk along them finds everything that's in only one of the two
+    differences = 0
+    current = next(old, None)
+    for user_id in new:
+        while current is not None and current < user_id:
+            differences += 1
+            current = next(old, None)
+        if current == user_id:
+            current = next(old, None)
+        else:
+            differences += 1
+    if current is not None:
+        differences += 1 + sum(1 for _ in old)
+    return differences
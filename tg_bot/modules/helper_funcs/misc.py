@@ -2,7 +2,6 @@ from math import ceil
 from typing import List, Dict
 
 from telegram import MAX_MESSAGE_LENGTH, InlineKeyboardButton, Bot, ParseMode
-from telegram.error import TelegramError
 
 from tg_bot import LOAD, NO_LOAD
 
@@ -71,16 +70,15 @@ def paginate_modules(page_n: int, module_dict: Dict, prefix, chat=None) -> List:
 def send_to_list(bot: Bot, send_to: list, message: str, markdown=False, html=False) -> None:
     if html and markdown:
         raise Exception("Can only send with either markdown or HTML!")
+    # queued without waiting, so failures (users who blocked the bot...) only show up on the Future, where the
+    # outbound queue logs and otherwise ignores them
     for user_id in set(send_to):
-        try:
-            if markdown:
-                bot.send_message(user_id, message, parse_mode=ParseMode.MARKDOWN)
-            elif html:
-                bot.send_message(user_id, message, parse_mode=ParseMode.HTML)
-            else:
-                bot.send_message(user_id, message)
-        except TelegramError:
-            pass  # ignore users who fail
+        if markdown:
+            bot.send_message(user_id, message, parse_mode=ParseMode.MARKDOWN, bulk=True, wait=False)
+        elif html:
+            bot.send_message(user_id, message, parse_mode=ParseMode.HTML, bulk=True, wait=False)
+        else:
+            bot.send_message(user_id, message, bulk=True, wait=False)
 
 
 def build_keyboard(buttons):
@@ -0,0 +1,234 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial, wraps
+from typing import Callable, Dict, Optional, Tuple
+
+from telegram import Bot
+from telegram.error import RetryAfter
+
+from tg_bot import LOGGER
+from tg_bot.modules.helper_funcs.ratelimit import TokenBucket, SlidingWindow
+
+INTERACTIVE = 0  # replies to someone who's waiting on them
+BULK = 1  # logs, reports, broadcasts - fine to arrive a little later
+
+GLOBAL_RATE = 30  # messages per second, across all chats
+CHAT_RATE = 1  # messages per second, per chat...
+CHAT_BURST = 3  # ...after a short burst
+GROUP_LIMIT = 20  # messages per GROUP_PERIOD seconds, per group
+GROUP_PERIOD = 60
+SENDERS = 4  # threads making the actual api calls
+MAX_RETRIES = 3
+MAX_IDLE_LANES = 10000
+
+# every Bot method which sends something to a chat; the first argument is always that chat's id
+SEND_METHODS = ("send_message", "forward_message", "send_photo", "send_audio", "send_document", "send_sticker",
+                "send_video", "send_voice", "send_video_note", "send_animation", "send_location", "send_venue",
+                "send_contact", "send_media_group")
+
+
+def is_group(chat_id) -> bool:
+    try:
+        return int(chat_id) < 0
+    except (TypeError, ValueError):
+        return True  # @channelusername
+
+
+class _Outgoing(object):
+    __slots__ = ("call", "future", "attempts")
+
+    def __init__(self, call: Callable, future: Future):
+        self.call = call
+        self.future = future
+        self.attempts = 0
+
+
+class _Lane(object):
+    """Everything waiting to go to one chat, and how much that chat can take right now."""
+    __slots__ = ("bucket", "window", "queues", "blocked_until")
+
+    def __init__(self, chat_id, now: float):
+        self.bucket = TokenBucket(CHAT_RATE, CHAT_BURST, now)
+        self.window = SlidingWindow(GROUP_LIMIT, GROUP_PERIOD) if is_group(chat_id) else None
+        self.queues = (deque(), deque())  # by priority
+        self.blocked_until = 0.0  # set by a flood wait
+
+    def wait(self, now: float) -> float:
+        return max(self.blocked_until - now, self.bucket.wait(now), self.window.wait(now) if self.window else 0)
+
+    def hit(self, now: float):
+        self.bucket.take(now, 0)
+        if self.window:
+            self.window.hit(now)
+
+    def is_idle(self, now: float) -> bool:
+        return not any(self.queues) and self.bucket.is_full(now) and (not self.window or self.window.is_idle(now)) \
+            and self.blocked_until <= now
+
+
+class OutboundQueue(object):
+    """Central queue for everything the bot sends, shaped to telegram's limits.
+
+    Messages go out at most GLOBAL_RATE per second overall, CHAT_RATE per second per chat and GROUP_LIMIT per
+    GROUP_PERIOD per group, so we stay clear of 429s instead of running into them. Interactive messages always go
+    before bulk ones, and chats take turns so one busy chat can't hold up the rest. A flood wait holds back that
+    chat only, and the message is retried once it's over.
+    """
+
+    def __init__(self, senders: int = SENDERS):
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.flood_waits = 0
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_RATE, time.monotonic())
+        self._lanes = {}  # type: Dict[object, _Lane]
+        self._ready = (OrderedDict(), OrderedDict())  # by priority: chats with something of that priority queued
+        self._pool = ThreadPoolExecutor(max_workers=senders)
+        self._cond = threading.Condition()
+        self._scheduler = None
+
+    def send(self, chat_id, call: Callable, priority: int = INTERACTIVE) -> Future:
+        future = Future()
+        with self._cond:
+            now = time.monotonic()
+            lane = self._lanes.get(chat_id)
+            if lane is None:
+                if len(self._lanes) > MAX_IDLE_LANES:
+                    self._lanes = {chat: lane for chat, lane in self._lanes.items() if not lane.is_idle(now)}
+                lane = self._lanes[chat_id] = _Lane(chat_id, now)
+
+            lane.queues[priority].append(_Outgoing(call, future))
+            self._ready[priority][chat_id] = None
+
+            if self._scheduler is None:
+                self._scheduler = threading.Thread(target=self._schedule, name="outbound", daemon=True)
+                self._scheduler.start()
+            self._cond.notify()
+        return future
+
+    def set_global_rate(self, rate: float):
+        """For when several processes share the bot's global limit."""
+        with self._cond:
+            self._global = TokenBucket(rate, rate, time.monotonic())
+
+    def depth(self) -> Tuple[int, int]:
+        with self._cond:
+            return tuple(sum(len(self._lanes[chat_id].queues[priority]) for chat_id in ready)
+                         for priority, ready in enumerate(self._ready))
+
+    def stats(self) -> str:
+        interactive, bulk = self.depth()
+        return "{} messages sent, {} failed, {} retried after {} flood waits; {} interactive and {} bulk " \
+               "queued.".format(self.sent, self.failed, self.retried, self.flood_waits, interactive, bulk)
+
+    def _schedule(self):
+        while True:
+            with self._cond:
+                picked = None
+                while picked is None:
+                    now = time.monotonic()
+                    wait = self._global.wait(now)
+                    if not wait:
+                        picked, wait = self._pick(now)
+                    if picked is None:
+                        self._cond.wait(wait)
+            self._pool.submit(self._deliver, *picked)
+
+    def _pick(self, now: float) -> Tuple[Optional[tuple], Optional[float]]:
+        soonest = None
+        for priority, ready in enumerate(self._ready):
+            for chat_id in ready:
+                lane = self._lanes[chat_id]
+                wait = lane.wait(now)
+                if wait:
+                    soonest = wait if soonest is None else min(soonest, wait)
+                    continue
+
+                queue = lane.queues[priority]
+                outgoing = queue.popleft()
+                if queue:
+                    ready.move_to_end(chat_id)  # back of the line
+                else:
+                    del ready[chat_id]
+
+                lane.hit(now)
+                self._global.take(now, 0)
+                return (chat_id, priority, outgoing), None
+        return None, soonest
+
+    def _deliver(self, chat_id, priority: int, outgoing: _Outgoing):
+        if outgoing.attempts == 0 and not outgoing.future.set_running_or_notify_cancel():
+            return
+
+        try:
+            result = outgoing.call()
+        except RetryAfter as excp:
+            with self._cond:
+                self.flood_waits += 1
+                if outgoing.attempts < MAX_RETRIES:
+                    lane = self._lanes.get(chat_id)
+                    if lane is None:
+                        lane = self._lanes[chat_id] = _Lane(chat_id, time.monotonic())
+                    lane.blocked_until = time.monotonic() + excp.retry_after
+                    outgoing.attempts += 1
+                    lane.queues[priority].appendleft(outgoing)
+                    self._ready[priority][chat_id] = None
+                    self.retried += 1
+                    self._cond.notify()
+                    return
+                self.failed += 1
+            outgoing.future.set_exception(excp)
+        except Exception as excp:
+            with self._cond:
+                self.failed += 1
+            outgoing.future.set_exception(excp)
+        else:
+            with self._cond:
+                self.sent += 1
+            outgoing.future.set_result(result)
+
+
+OUTBOUND = OutboundQueue()
+
+
+def _queued(method):
+    @wraps(method)
+    def send(self, *args, bulk: bool = False, wait: bool = True, **kwargs):
+        chat_id = args[0] if args else kwargs.get("chat_id")
+        future = OUTBOUND.send(chat_id, partial(method, self, *args, **kwargs), BULK if bulk else INTERACTIVE)
+        if wait:
+            return future.result()
+        future.add_done_callback(_log_failure)
+        return future
+
+    return send
+
+
+def _log_failure(future: Future):
+    if future.exception():
+        LOGGER.debug("Couldn't deliver a queued message: %s", future.exception())
+
+
+
+class QueuedBot(Bot):
+    """Bot whose sends all go through OUTBOUND.
+
+    Every send method takes two extra keyword arguments: `bulk=True` queues the message behind interactive ones,
+    and `wait=False` returns straight away with a Future instead of blocking until the message is sent. Only use
+    that where nothing needs the sent Message, or where the Future is handled.
+    """
+
+
+for _name in SEND_METHODS:
+    if hasattr(Bot, _name):
+        _method = _queued(getattr(Bot, _name))
+        setattr(QueuedBot, _name, _method)
+        # the camelCase aliases point at Bot's own methods, so they need replacing too
+        _camel = _name.split("_")[0] + "".join(part.capitalize() for part in _name.split("_")[1:])
+        setattr(QueuedBot, _camel, _method)
+
+
+def __stats__():
+    return OUTBOUND.stats()
@@ -0,0 +1,57 @@
+from collections import deque
+from typing import Optional
+
+
+class TokenBucket(object):
+    __slots__ = ("rate", "capacity", "tokens", "last")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def take(self, now: float, max_wait: float) -> Optional[float]:
+        """Take a token: returns 0 if there was one, how long to wait for the reserved one, or None if that's too
+        long."""
+        self.refill(now)
+        wait = max(0.0, (1 - self.tokens) / self.rate)
+        if wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+    def give_back(self):
+        self.tokens += 1
+
+    def is_full(self, now: float) -> bool:
+        return self.tokens + (now - self.last) * self.rate >= self.capacity
+
+    def wait(self, now: float) -> float:
+        """How long until a token is available, without taking it."""
+        self.refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class SlidingWindow(object):
+    """At most `limit` events in any `period` seconds."""
+    __slots__ = ("period", "events")
+
+    def __init__(self, limit: int, period: float):
+        self.period = period
+        self.events = deque(maxlen=limit)
+
+    def wait(self, now: float) -> float:
+        if len(self.events) < self.events.maxlen:
+            return 0.0
+        return max(0.0, self.events[0] + self.period - now)
+
+    def hit(self, now: float):
+        self.events.append(now)
+
+    def is_idle(self, now: float) -> bool:
+        return not self.events or self.events[-1] + self.period <= now
@@ -0,0 +1,119 @@
+import threading
+from heapq import merge
+from typing import Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import Handler, CommandHandler, CallbackQueryHandler, InlineQueryHandler, \
+    ChosenInlineResultHandler, ShippingQueryHandler, PreCheckoutQueryHandler
+
+from tg_bot.modules.helper_funcs.handlers import CMD_STARTERS
+
+UPDATE_KINDS = ("message", "edited_message", "channel_post", "edited_channel_post", "callback_query",
+                "inline_query", "chosen_inline_result", "shipping_query", "pre_checkout_query")
+
+# handlers which can only ever match a single kind of update
+SINGLE_KIND = ((CallbackQueryHandler, "callback_query"),
+               (InlineQueryHandler, "inline_query"),
+               (ChosenInlineResultHandler, "chosen_inline_result"),
+               (ShippingQueryHandler, "shipping_query"),
+               (PreCheckoutQueryHandler, "pre_checkout_query"))
+
+
+def update_kind(update) -> Optional[str]:
+    if not isinstance(update, Update):
+        return None
+    for kind in UPDATE_KINDS:
+        if getattr(update, kind) is not None:
+            return kind
+    return None
+
+
+def command_name(update: Update) -> Optional[str]:
+    msg = update.message or update.edited_message
+    if not msg or not msg.text or len(msg.text) < 2 or not msg.text.startswith(CMD_STARTERS):
+        return None
+    return msg.text.split(None, 1)[0][1:].split('@', 1)[0].lower()
+
+
+def handler_kinds(handler: Handler) -> Tuple[str, ...]:
+    for handler_type, kind in SINGLE_KIND:
+        if isinstance(handler, handler_type):
+            return kind,
+
+    # MessageHandler and RegexHandler both say which kinds of message they want
+    if hasattr(handler, "message_updates"):
+        kinds = []
+        if handler.message_updates:
+            kinds.append("message")
+        if handler.channel_post_updates:
+            kinds.append("channel_post")
+        if handler.edited_updates:
+            kinds.extend(("edited_message", "edited_channel_post"))
+        return tuple(kinds)
+
+    # don't know what this one wants (conversations, custom handlers...), so it gets to see everything
+    return UPDATE_KINDS
+
+
+class _GroupIndex(object):
+    __slots__ = ("commands", "kinds", "untyped")
+
+    def __init__(self, handlers: List[Handler]):
+        self.commands = {}  # type: Dict[str, List[Tuple[int, Handler]]]
+        self.kinds = {kind: [] for kind in UPDATE_KINDS}  # type: Dict[str, List[Tuple[int, Handler]]]
+        self.untyped = []  # type: List[Tuple[int, Handler]]
+
+        for pos, handler in enumerate(handlers):
+            if isinstance(handler, CommandHandler) and isinstance(handler.command, list):
+                for command in handler.command:
+                    self.commands.setdefault(command.lower(), []).append((pos, handler))
+                continue
+
+            kinds = handler_kinds(handler)
+            if kinds is UPDATE_KINDS:
+                # may match objects which aren't Updates at all, eg the job queue's StringCommandHandler
+                self.untyped.append((pos, handler))
+            for kind in kinds:
+                self.kinds[kind].append((pos, handler))
+
+    def candidates(self, kind: Optional[str], command: Optional[str]):
+        if kind is None:
+            return (handler for _, handler in self.untyped)
+
+        by_kind = self.kinds[kind]
+        by_command = self.commands.get(command) if command else None
+        if not by_command:
+            return (handler for _, handler in by_kind)
+        # keep registration order, since the first handler in a group to match is the only one which runs
+        return (handler for _, handler in merge(by_kind, by_command, key=lambda entry: entry[0]))
+
+
+class HandlerRouter(object):
+    """Narrows down which handlers could possibly match an update, so the dispatcher only has to check those.
+
+    Command handlers are indexed by command name, and everything else by the kind of update it handles. The index
+    is rebuilt on the first update after a handler is added or removed.
+    """
+
+    def __init__(self):
+        self._groups = None  # type: Optional[List[Tuple[int, _GroupIndex]]]
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._groups = None
+
+    def _build(self, dispatcher) -> List[Tuple[int, _GroupIndex]]:
+        with self._lock:
+            if self._groups is None:
+                self._groups = [(group, _GroupIndex(list(dispatcher.handlers[group]))) for group in dispatcher.groups]
+            return self._groups
+
+    def route(self, dispatcher, update):
+        groups = self._groups or self._build(dispatcher)
+        kind = update_kind(update)
+        command = command_name(update) if kind in ("message", "edited_message") else None
+        for group, index in groups:
+            yield group, index.candidates(kind, command)
+
+
+ROUTER = HandlerRouter()
@@ -0,0 +1,163 @@
+import multiprocessing
+import os
+import signal
+import threading
+from typing import Callable, Dict, List, Optional
+
+from telegram import Update
+from telegram.error import TelegramError
+
+from tg_bot import LOGGER, SHARDS
+from tg_bot.modules.helper_funcs import admission, fanout, outbound
+
+SHARD_ENV = "SHARD_INDEX"  # set for each shard process, so it knows which one it is as soon as it starts
+STOP_TIMEOUT = 30  # seconds to let a shard finish what it's doing on shutdown
+
+UPDATE = "update"
+EVENT = "event"
+
+
+def shard_of(key, count: int) -> int:
+    return int(key) % count
+
+
+class Sharding(object):
+    """Splits the bot over SHARDS worker processes, by chat.
+
+    The process started by `python -m tg_bot` becomes the ingress: it polls (or takes webhooks) as usual, but
+    instead of dispatching each update it hands it to the shard which owns that chat, chat_id % SHARDS. Each shard
+    is a full copy of the bot with its own dispatcher, caches and GIL, and gets all of its chats' updates through
+    one queue, in the order they came in. Updates without a chat (inline queries...) go by user instead.
+
+    State every shard needs (gbans, gmutes, afk) is kept in sync with broadcast(): a shard which changes it tells all
+    the others, whose listeners (registered with on()) patch their own caches. The same goes for cached member
+    statuses changed from outside their chat, eg by remote commands or fan-out jobs. Sudo/support lists come from
+    the config, so every shard already has the same ones.
+
+    Every shard still loads the per-chat caches (blacklists, filters, locks, flood settings...) of all chats, not
+    just its own: the /settings menu in pm reads other chats' state, from whichever shard the user's pm lands on.
+    Those caches are only ever written by the owning shard, so the copies elsewhere can lag until the next restart
+    - fine for display, but nothing outside the owning shard should act on them.
+
+    The bot-wide rate limits (outbound sends, fan-out calls, admitted updates) are split evenly between the shards.
+    The ingress loads no modules at all, since it never dispatches anything itself.
+
+    Work which must only happen once, eg rss polling or resuming fan-out jobs, belongs on the primary shard.
+    """
+
+    def __init__(self, count: int = SHARDS):
+        self.count = max(count, 1)
+        index = os.environ.get(SHARD_ENV)
+        self.index = int(index) if index is not None else None  # type: Optional[int]
+        self._inboxes = []  # type: List[multiprocessing.Queue]
+        self._processes = []  # type: List[multiprocessing.Process]
+        self._listeners = {}  # type: Dict[str, List[Callable]]
+        self._moved = {}  # type: Dict[int, int] - migrated chat_id -> shard which has its state
+
+    @property
+    def enabled(self) -> bool:
+        return self.count > 1
+
+    @property
+    def is_ingress(self) -> bool:
+        return self.enabled and self.index is None
+
+    @property
+    def primary(self) -> bool:
+        return not self.enabled or self.index == 0
+
+    def shard_for(self, update: Update) -> int:
+        if update.effective_chat:
+            msg = update.effective_message
+            # a migrated group keeps its state on the old chat's shard until the next restart reloads the caches
+            if msg and (msg.migrate_to_chat_id or msg.migrate_from_chat_id):
+                old, new = (msg.chat_id, msg.migrate_to_chat_id) if msg.migrate_to_chat_id \
+                    else (msg.migrate_from_chat_id, msg.chat_id)
+                self._moved[new] = self._moved.get(old, shard_of(old, self.count))
+            chat_id = update.effective_chat.id
+            return self._moved.get(chat_id, shard_of(chat_id, self.count))
+        if update.effective_user:
+            return shard_of(update.effective_user.id, self.count)
+        return 0
+
+    # ingress side
+    def start(self, target: Callable[[List[multiprocessing.Queue]], None]):
+        """Start every shard, each running target(inboxes) - target must be importable from the shard process."""
+        ctx = multiprocessing.get_context("spawn")  # fresh interpreters, so no mongo clients or threads are forked
+        self._inboxes = [ctx.Queue() for _ in range(self.count)]
+        for index in range(self.count):
+            os.environ[SHARD_ENV] = str(index)
+            process = ctx.Process(target=target, args=(self._inboxes,), name="shard-{}".format(index))
+            process.start()
+            self._processes.append(process)
+        del os.environ[SHARD_ENV]
+        LOGGER.info("Started %s shards", self.count)
+
+    def forward(self, update):
+        """Takes the place of the ingress dispatcher's process_update."""
+        if isinstance(update, TelegramError):
+            LOGGER.warning("Error while getting updates: %s", update)
+            return
+        self._inboxes[self.shard_for(update)].put((UPDATE, update.to_dict()))
+
+    def stop(self):
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for process in self._processes:
+            process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                LOGGER.warning("%s didn't stop in time, terminating it", process.name)
+                process.terminate()
+
+    # shard side
+    def on(self, event: str, listener: Callable):
+        self._listeners.setdefault(event, []).append(listener)
+
+    def broadcast(self, event: str, *args):
+        """Let every other shard know about a change to global state; this shard has already made it."""
+        if not self.enabled or self.index is None:
+            return
+        for index, inbox in enumerate(self._inboxes):
+            if index != self.index:
+                inbox.put((EVENT, event, args))
+
+    def run(self, updater, inboxes: List[multiprocessing.Queue]):
+        """Run this shard until the ingress tells it to stop."""
+        # ctrl+c goes to the whole process group; let the ingress decide when we're done
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        self._inboxes = inboxes
+        dispatcher = updater.dispatcher
+
+        # the global limits are per bot, not per process
+        outbound.OUTBOUND.set_global_rate(outbound.GLOBAL_RATE / self.count)
+        fanout.FANOUT.limiter = fanout.RateLimiter(fanout.GLOBAL_RATE / self.count)
+        admission.ADMISSION.set_global_rate(admission.GLOBAL_RATE / self.count, admission.GLOBAL_BURST / self.count)
+
+        updater.job_queue.start()
+        dispatcher_thread = threading.Thread(target=dispatcher.start, name="dispatcher")
+        dispatcher_thread.start()
+        LOGGER.info("Shard %s of %s running", self.index, self.count)
+
+        inbox = inboxes[self.index]
+        while True:
+            message = inbox.get()
+            if message is None:
+                break
+            if message[0] == UPDATE:
+                dispatcher.update_queue.put(Update.de_json(message[1], dispatcher.bot))
+            else:
+                self._notify(message[1], message[2])
+
+        dispatcher.stop()
+        updater.job_queue.stop()
+        dispatcher_thread.join()
+
+    def _notify(self, event: str, args: tuple):
+        for listener in self._listeners.get(event, []):
+            try:
+                listener(*args)
+            except Exception:
+                LOGGER.exception("Shard listener for %s failed", event)
+
+
+SHARDING = Sharding()
@@ -181,6 +181,45 @@ def escape_invalid_curly_brackets(text: str, valids: List[str]) -> str:
     return new_text
 
 
+HTML_TOKEN = re.compile(r"<(/?)(\w+)[^>]*>|&#?\w+;|[^<&]+|[<&]")
+TRUNCATED = "…"
+
+
+def truncate_html(text: str, limit: int) -> str:
+    """Cut telegram HTML down to at most limit characters, never through a tag or an entity, and closing whatever
+    tags the cut leaves open."""
+    if len(text) <= limit:
+        return text
+
+    limit -= len(TRUNCATED)
+    kept = []
+    open_tags = []
+    length = 0
+    for match in HTML_TOKEN.finditer(text):
+        token, closing, tag = match.group(0), match.group(1), match.group(2)
+        if tag and closing:
+            # room for it was kept back when its tag opened
+            if open_tags and open_tags[-1] == tag:
+                open_tags.pop()
+            kept.append(token)
+            length += len(token)
+            continue
+
+        room = limit - length - sum(len(open_tag) + 3 for open_tag in open_tags)
+        if tag:
+            if len(token) + len(tag) + 3 > room:
+                break
+            open_tags.append(tag)
+        elif len(token) > room:
+            if not token.startswith("&"):
+                kept.append(token[:max(room, 0)])
+            break
+        kept.append(token)
+        length += len(token)
+
+    return "".join(kept) + "".join("</{}>".format(tag) for tag in reversed(open_tags)) + TRUNCATED
+
+
 SMART_OPEN = '“'
 SMART_CLOSE = '”'
 START_CHAR = ('\'', '"', SMART_OPEN)
@@ -0,0 +1,198 @@
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+
+def default_priority(keyword: str):
+    # longer (more specific) keywords win over shorter ones
+    return -len(keyword), keyword
+
+
+# characters re.IGNORECASE counts as equal even though their lowercase forms differ (sre_compile's
+# _ignorecase_fixes), each folded to one of them; this also undoes str.lower()'s word-final sigma
+_FOLD_FIXES = str.maketrans({
+    "\u0131": "i",  # dotless i
+    "\u017f": "s",  # long s
+    "\u00b5": "\u03bc",  # micro sign -> mu
+    "\u0345": "\u03b9",  # combining ypogegrammeni -> iota
+    "\u1fbe": "\u03b9",  # prosgegrammeni -> iota
+    "\u1fd3": "\u0390",
+    "\u1fe3": "\u03b0",
+    "\u03d0": "\u03b2",  # beta symbol -> beta
+    "\u03f5": "\u03b5",  # lunate epsilon -> epsilon
+    "\u03d1": "\u03b8",  # theta symbol -> theta
+    "\u03f0": "\u03ba",  # kappa symbol -> kappa
+    "\u03d6": "\u03c0",  # pi symbol -> pi
+    "\u03f1": "\u03c1",  # rho symbol -> rho
+    "\u03c2": "\u03c3",  # final sigma -> sigma
+    "\u03d5": "\u03c6",  # phi symbol -> phi
+    "\u1e9b": "\u1e61",  # long s with dot above -> s with dot above
+    "\ufb05": "\ufb06",  # long s t ligature -> s t ligature
+})
+
+
+def _fold(text: str) -> str:
+    """Lowercase text one character for one character, so offsets into the result are offsets into the original.
+
+    str.lower() can turn one character into several (eg 'İ' into 'i' and a combining dot), which would throw the word
+    boundary checks off; there, take the first one - the same simple case mapping re.IGNORECASE uses. The characters
+    re.IGNORECASE treats as equal on top of that (σ/ς/Σ, ı/i...) are folded together too.
+    """
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        lowered = "".join(char.lower()[0] for char in text)
+    return lowered.translate(_FOLD_FIXES)
+
+
+def _is_word_char(char: str) -> bool:
+    # same set of characters as the \w regex class
+    return char.isalnum() or char == "_"
+
+
+class _Automaton(object):
+    """Aho-Corasick automaton over a fixed, priority ordered list of keywords.
+
+    Matches are case insensitive and only count when the keyword stands on its own, ie the characters either side
+    of it are not word characters - the same rule as the old ( |^|[^\\w])keyword( |$|[^\\w]) regexes.
+    """
+    __slots__ = ("keywords", "lengths", "goto", "fail", "output")
+
+    def __init__(self, keywords: List[str]):
+        self.keywords = keywords
+        self.lengths = []
+        self.goto = [{}]  # type: List[Dict[str, int]]
+        self.output = [[]]  # type: List[List[int]]
+
+        for rank, keyword in enumerate(keywords):
+            lowered = _fold(keyword)
+            self.lengths.append(len(lowered))
+            if not lowered:
+                continue
+
+            node = 0
+            for char in lowered:
+                nxt = self.goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.output.append([])
+                    self.goto[node][char] = nxt
+                node = nxt
+            self.output[node].append(rank)
+
+        # breadth first, so every failure target is complete before it gets used
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, nxt in self.goto[node].items():
+                queue.append(nxt)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(char, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def iter_ranks(self, text: str):
+        text = _fold(text)
+        goto, fail, output, lengths = self.goto, self.fail, self.output, self.lengths
+        text_len = len(text)
+        node = 0
+        for end, char in enumerate(text, 1):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for rank in output[node]:
+                start = end - lengths[rank]
+                if (start == 0 or not _is_word_char(text[start - 1])) \
+                        and (end == text_len or not _is_word_char(text[end])):
+                    yield rank
+
+
+class TriggerIndex(object):
+    """Per-chat keyword index, matched in a single pass over the text whatever the number of keywords.
+
+    Keywords are kept in priority order. The automaton for a chat is built on first use, and thrown away whenever
+    that chat's keywords change.
+    """
+
+    def __init__(self, priority: Callable[[str], object] = default_priority):
+        self._priority = priority
+        self._triggers = {}  # type: Dict[str, List[str]]
+        self._automata = {}  # type: Dict[str, _Automaton]
+        self._lock = threading.RLock()
+
+    def add(self, chat_id: Union[int, str], keyword: str):
+        chat_id = str(chat_id)
+        with self._lock:
+            triggers = self._triggers.setdefault(chat_id, [])
+            if keyword not in triggers:
+                triggers.append(keyword)
+                triggers.sort(key=self._priority)
+                self._automata.pop(chat_id, None)
+
+    def remove(self, chat_id: Union[int, str], keyword: str) -> bool:
+        chat_id = str(chat_id)
+        with self._lock:
+            triggers = self._triggers.get(chat_id)
+            if not triggers or keyword not in triggers:
+                return False
+
+            triggers.remove(keyword)
+            if not triggers:
+                del self._triggers[chat_id]
+            self._automata.pop(chat_id, None)
+            return True
+
+    def set(self, chat_id: Union[int, str], keywords: Iterable[str]):
+        chat_id = str(chat_id)
+        with self._lock:
+            triggers = sorted(set(keywords), key=self._priority)
+            if triggers:
+                self._triggers[chat_id] = triggers
+            else:
+                self._triggers.pop(chat_id, None)
+            self._automata.pop(chat_id, None)
+
+    def migrate(self, old_chat_id: Union[int, str], new_chat_id: Union[int, str]):
+        with self._lock:
+            triggers = self._triggers.pop(str(old_chat_id), [])
+            self._automata.pop(str(old_chat_id), None)
+            self.set(new_chat_id, triggers)
+
+    def clear(self):
+        with self._lock:
+            self._triggers.clear()
+            self._automata.clear()
+
+    def triggers(self, chat_id: Union[int, str]) -> List[str]:
+        return list(self._triggers.get(str(chat_id), []))
+
+    def _automaton(self, chat_id: str) -> Optional[_Automaton]:
+        automaton = self._automata.get(chat_id)
+        if automaton is None:
+            with self._lock:
+                triggers = self._triggers.get(chat_id)
+                if not triggers:
+                    return None
+                automaton = self._automata[chat_id] = _Automaton(list(triggers))
+        return automaton
+
+    def all_matches(self, chat_id: Union[int, str], text: str) -> List[str]:
+        automaton = self._automaton(str(chat_id))
+        if automaton is None or not text:
+            return []
+        return [automaton.keywords[rank] for rank in sorted(set(automaton.iter_ranks(text)))]
+
+    def first_match(self, chat_id: Union[int, str], text: str) -> Optional[str]:
+        automaton = self._automaton(str(chat_id))
+        if automaton is None or not text:
+            return None
+
+        best = None
+        for rank in automaton.iter_ranks(text):
+            if best is None or rank < best:
+                best = rank
+                if best == 0:
+                    break
+        return automaton.keywords[best] if best is not None else None
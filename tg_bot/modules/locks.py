@@ -12,38 +12,81 @@ from telegram.utils.helpers import mention_html
 import tg_bot.modules.sql.locks_sql as sql
 from tg_bot import dispatcher, SUDO_USERS, LOGGER
 from tg_bot.modules.disable import DisableAbleCommandHandler
-from tg_bot.modules.helper_funcs.chat_status import can_delete, is_user_admin, user_not_admin, user_admin, \
-    bot_can_delete, is_bot_admin
+from tg_bot.modules.helper_funcs.chat_status import can_delete, is_user_admin, user_admin, bot_can_delete, \
+    is_bot_admin
 from tg_bot.modules.log_channel import loggable
 from tg_bot.modules.sql import users_sql
 
-LOCK_TYPES = {'sticker': Filters.sticker,
-              'audio': Filters.audio,
-              'voice': Filters.voice,
-              'document': Filters.document & ~Filters.animation,
-              'video': Filters.video,
-              'videonote': Filters.video_note,
-              'contact': Filters.contact,
-              'photo': Filters.photo,
-              'gif': Filters.animation,
-              'url': Filters.entity(MessageEntity.URL) | Filters.caption_entity(MessageEntity.URL),
-              'bots': Filters.status_update.new_chat_members,
-              'forward': Filters.forwarded,
-              'game': Filters.game,
-              'location': Filters.location,
+LOCK_BITS = sql.LOCK_BITS
+
+LOCK_TYPES = {'sticker': LOCK_BITS['sticker'],
+              'audio': LOCK_BITS['audio'],
+              'voice': LOCK_BITS['voice'],
+              'document': LOCK_BITS['document'],
+              'video': LOCK_BITS['video'],
+              'videonote': LOCK_BITS['videonote'],
+              'contact': LOCK_BITS['contact'],
+              'photo': LOCK_BITS['photo'],
+              'gif': LOCK_BITS['gif'],
+              'url': LOCK_BITS['url'],
+              'bots': LOCK_BITS['bots'],
+              'forward': LOCK_BITS['forward'],
+              'game': LOCK_BITS['game'],
+              'location': LOCK_BITS['location'],
               }
 
-GIF = Filters.animation
-OTHER = Filters.game | Filters.sticker | GIF
-MEDIA = Filters.audio | Filters.document | Filters.video | Filters.video_note | Filters.voice | Filters.photo
-MESSAGES = Filters.text | Filters.contact | Filters.location | Filters.venue | Filters.command | MEDIA | OTHER
-PREVIEWS = Filters.entity("url")
+RESTRICTION_TYPES = {'messages': LOCK_BITS['messages'],
+                     'media': LOCK_BITS['media'],
+                     'other': LOCK_BITS['other'],
+                     # 'previews': LOCK_BITS['preview'], # NOTE: this has been removed cos its useless atm.
+                     'all': sql.RESTR_ALL}
+
+MEDIA = LOCK_BITS['media']
+OTHER = LOCK_BITS['other']
+MESSAGES = LOCK_BITS['messages']
+
+
+def message_content_mask(message: Message) -> int:
+    """Classify a message once, as the LOCK_BITS of every lock/restriction type its content falls under."""
+    mask = 0
+    if message.text:
+        mask |= MESSAGES
+    if message.sticker:
+        mask |= LOCK_BITS['sticker'] | OTHER
+    if message.animation:
+        mask |= LOCK_BITS['gif'] | OTHER
+    if message.document:
+        # gifs are sent as documents too, but only lock as gifs
+        mask |= MEDIA if message.animation else LOCK_BITS['document'] | MEDIA
+    if message.audio:
+        mask |= LOCK_BITS['audio'] | MEDIA
+    if message.voice:
+        mask |= LOCK_BITS['voice'] | MEDIA
+    if message.video:
+        mask |= LOCK_BITS['video'] | MEDIA
+    if message.video_note:
+        mask |= LOCK_BITS['videonote'] | MEDIA
+    if message.photo:
+        mask |= LOCK_BITS['photo'] | MEDIA
+    if message.contact:
+        mask |= LOCK_BITS['contact'] | MESSAGES
+    if message.location:
+        mask |= LOCK_BITS['location'] | MESSAGES
+    if message.venue:
+        mask |= MESSAGES
+    if message.game:
+        mask |= LOCK_BITS['game'] | OTHER
+    if message.new_chat_members:
+        mask |= LOCK_BITS['bots']
+    if message.forward_date:
+        mask |= LOCK_BITS['forward']
+    if any(entity.type == MessageEntity.URL for entity in message.entities) \
+            or any(entity.type == MessageEntity.URL for entity in message.caption_entities):
+        mask |= LOCK_BITS['url']
+    if mask & (MEDIA | OTHER):
+        mask |= MESSAGES
+    return mask
 
-RESTRICTION_TYPES = {'messages': MESSAGES,
-                     'media': MEDIA,
-                     'other': OTHER,
-                     # 'previews': PREVIEWS, # NOTE: this has been removed cos its useless atm.
-                     'all': Filters.all}
 
 PERM_GROUP = 1
 REST_GROUP = 2
@@ -190,13 +233,22 @@ def unlock(bot: Bot, update: Update, args: List[str]) -> str:
 
 
 @run_async
-@user_not_admin
 def del_lockables(bot: Bot, update: Update):
     chat = update.effective_chat  # type: Optional[Chat]
     message = update.effective_message  # type: Optional[Message]
+    user = update.effective_user  # type: Optional[User]
 
-    for lockable, filter in LOCK_TYPES.items():
-        if filter(message) and sql.is_locked(chat.id, lockable) and can_delete(chat, bot.id):
+    # most chats have nothing locked, and most messages aren't locked content - one AND settles both, before
+    # we go looking at who sent it
+    locked = sql.get_chat_lock_bitmap(chat.id) & sql.PERM_ALL
+    if not locked:
+        return
+    locked &= message_content_mask(message)
+    if not locked or not user or is_user_admin(chat, user.id):
+        return
+
+    for lockable, bit in LOCK_TYPES.items():
+        if locked & bit and can_delete(chat, bot.id):
             if lockable == "bots":
                 new_members = update.effective_message.new_chat_members
                 for new_mem in new_members:
@@ -221,53 +273,41 @@ def del_lockables(bot: Bot, update: Update):
 
 
 @run_async
-@user_not_admin
 def rest_handler(bot: Bot, update: Update):
     msg = update.effective_message  # type: Optional[Message]
     chat = update.effective_chat  # type: Optional[Chat]
-    for restriction, filter in RESTRICTION_TYPES.items():
-        if filter(msg) and sql.is_restr_locked(chat.id, restriction) and can_delete(chat, bot.id):
-            try:
-                msg.delete()
-            except BadRequest as excp:
-                if excp.message == "Message to delete not found":
-                    pass
-                else:
-                    LOGGER.exception("ERROR in restrictions")
-            break
+    user = update.effective_user  # type: Optional[User]
+    restricted = sql.get_chat_lock_bitmap(chat.id) & sql.RESTR_ALL
+    if not restricted or not user or is_user_admin(chat, user.id):
+        return
+
+    # 'all' covers every message, otherwise the restricted types have to match the content
+    if (restricted == sql.RESTR_ALL or restricted & message_content_mask(msg)) and can_delete(chat, bot.id):
+        try:
+            msg.delete()
+        except BadRequest as excp:
+            if excp.message == "Message to delete not found":
+                pass
+            else:
+                LOGGER.exception("ERROR in restrictions")
 
 
 def build_lock_message(chat_id):
     locks = sql.get_locks(chat_id)
     restr = sql.get_restr(chat_id)
-    if not (locks or restr):
+    if locks is None and restr is None:
         res = "There are no current locks in this chat."
     else:
         res = "These are the locks in this chat:"
-        if locks:
-            res += "\n - sticker = `{}`" \
-                   "\n - audio = `{}`" \
-                   "\n - voice = `{}`" \
-                   "\n - document = `{}`" \
-                   "\n - video = `{}`" \
-                   "\n - videonote = `{}`" \
-                   "\n - contact = `{}`" \
-                   "\n - photo = `{}`" \
-                   "\n - gif = `{}`" \
-                   "\n - url = `{}`" \
-                   "\n - bots = `{}`" \
-                   "\n - forward = `{}`" \
-                   "\n - game = `{}`" \
-                   "\n - location = `{}`".format(locks.sticker, locks.audio, locks.voice, locks.document,
-                                                 locks.video, locks.videonote, locks.contact, locks.photo, locks.gif, locks.url,
-                                                 locks.bots, locks.forward, locks.game, locks.location)
-        if restr:
-            res += "\n - messages = `{}`" \
-                   "\n - media = `{}`" \
-                   "\n - other = `{}`" \
-                   "\n - previews = `{}`" \
-                   "\n - all = `{}`".format(restr.messages, restr.media, restr.other, restr.preview,
-                                            all([restr.messages, restr.media, restr.other, restr.preview]))
+        if locks is not None:
+            for lock_type in ("sticker", "audio", "voice", "document", "video", "videonote", "contact", "photo",
+                              "gif", "url", "bots", "forward", "game", "location"):
+                res += "\n - {} = `{}`".format(lock_type, bool(locks & sql.LOCK_BITS[lock_type]))
+        if restr is not None:
+            for restr_type in ("messages", "media", "other", "preview"):
+                res += "\n - {} = `{}`".format("previews" if restr_type == "preview" else restr_type,
+                                               bool(restr & sql.LOCK_BITS[restr_type]))
+            res += "\n - all = `{}`".format(restr & sql.RESTR_ALL == sql.RESTR_ALL)
     return res
 
 
@@ -1,5 +1,9 @@
+import atexit
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, wait
 from functools import wraps
-from typing import Optional
+from typing import Optional, List, Tuple
 
 from tg_bot.modules.helper_funcs.misc import is_module_loaded
 
@@ -11,8 +15,9 @@ if is_module_loaded(FILENAME):
     from telegram.ext import CommandHandler, run_async
     from telegram.utils.helpers import escape_markdown
 
-    from tg_bot import dispatcher, LOGGER
+    from tg_bot import dispatcher, updater, LOGGER
     from tg_bot.modules.helper_funcs.chat_status import user_admin
+    from tg_bot.modules.helper_funcs.string_handling import truncate_html
     from tg_bot.modules.sql import log_channel_sql as sql
 
 
@@ -29,7 +34,7 @@ if is_module_loaded(FILENAME):
                                                                                            message.message_id)
                 log_chat = sql.get_chat_log_channel(chat.id)
                 if log_chat:
-                    send_log(bot, log_chat, chat.id, result)
+                    LOG_SINK.add(log_chat, chat.id, result)
             elif result == "":
                 pass
             else:
@@ -40,19 +45,79 @@ if is_module_loaded(FILENAME):
         return log_action
 
 
-    def send_log(bot: Bot, log_chat_id: str, orig_chat_id: str, result: str):
-        try:
-            bot.send_message(log_chat_id, result, parse_mode=ParseMode.HTML)
-        except BadRequest as excp:
+    FLUSH_INTERVAL = 3  # seconds
+    EXIT_TIMEOUT = 10  # seconds to let the last logs go out on shutdown
+    MAX_LOG_LENGTH = 4000  # telegram allows 4096; leaves room for the plain text fallback note
+    NO_FORMAT_NOTE = "\n\nFormatting has been disabled due to an unexpected error."
+
+
+    class LogSink(object):
+        """Buffers log entries per log channel, and sends them as a few long messages instead of one per action."""
+
+        def __init__(self):
+            self._pending = OrderedDict()  # log channel -> [(orig chat, entry)]
+            self._lock = threading.Lock()
+
+        def add(self, log_chat_id: str, orig_chat_id, entry: str):
+            with self._lock:
+                self._pending.setdefault(log_chat_id, []).append((orig_chat_id, entry))
+
+        def flush(self, bot: Bot) -> List[Future]:
+            with self._lock:
+                pending, self._pending = self._pending, OrderedDict()
+
+            return [send_log(bot, log_chat_id, orig_chats, text)
+                    for log_chat_id, entries in pending.items()
+                    for orig_chats, text in self.pack(entries)]
+
+        @staticmethod
+        def pack(entries: List[Tuple[object, str]]) -> List[Tuple[set, str]]:
+            batches = []
+            orig_chats, text = set(), ""
+            for orig_chat_id, entry in entries:
+                entry = truncate_html(entry, MAX_LOG_LENGTH)
+                if text and len(text) + 2 + len(entry) > MAX_LOG_LENGTH:
+                    batches.append((orig_chats, text))
+                    orig_chats, text = set(), ""
+                orig_chats.add(orig_chat_id)
+                text = text + "\n\n" + entry if text else entry
+            if text:
+                batches.append((orig_chats, text))
+            return batches
+
+
+    LOG_SINK = LogSink()
+
+
+    def flush_logs(bot: Bot, job):
+        LOG_SINK.flush(bot)
+
+
+    # don't lose the last few seconds of logs on shutdown
+    def flush_logs_on_exit():
+        wait(LOG_SINK.flush(dispatcher.bot), timeout=EXIT_TIMEOUT)
+
+
+    def send_log(bot: Bot, log_chat_id: str, orig_chat_ids: set, result: str) -> Future:
+        def sent(future):
+            excp = future.exception()
+            if not isinstance(excp, BadRequest):
+                if excp:
+                    LOGGER.warning("Could not send logs to %s: %s", log_chat_id, excp)
+                return
+
             if excp.message == "Chat not found":
-                bot.send_message(orig_chat_id, "This log channel has been deleted - unsetting.")
-                sql.stop_chat_logging(orig_chat_id)
+                for orig_chat_id in orig_chat_ids:
+                    bot.send_message(orig_chat_id, "This log channel has been deleted - unsetting.", wait=False)
+                    sql.stop_chat_logging(orig_chat_id)
             else:
-                LOGGER.warning(excp.message)
-                LOGGER.warning(result)
-                LOGGER.exception("Could not parse")
+                LOGGER.warning("Could not parse logs for %s (%s), sending them as plain text", log_chat_id,
+                               excp.message)
+                bot.send_message(log_chat_id, result + NO_FORMAT_NOTE, bulk=True, wait=False)
 
-                bot.send_message(log_chat_id, result + "\n\nFormatting has been disabled due to an unexpected error.")
+        future = bot.send_message(log_chat_id, result, parse_mode=ParseMode.HTML, bulk=True, wait=False)
+        future.add_done_callback(sent)
+        return future
 
 
     @run_async
@@ -160,6 +225,9 @@ Setting the log channel is done by:
     SET_LOG_HANDLER = CommandHandler("setlog", setlog)
     UNSET_LOG_HANDLER = CommandHandler("unsetlog", unsetlog)
 
+    updater.job_queue.run_repeating(flush_logs, interval=FLUSH_INTERVAL, first=FLUSH_INTERVAL)
+    atexit.register(flush_logs_on_exit)
+
     dispatcher.add_handler(LOG_HANDLER)
     dispatcher.add_handler(SET_LOG_HANDLER)
     dispatcher.add_handler(UNSET_LOG_HANDLER)
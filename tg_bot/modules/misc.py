@@ -16,6 +16,7 @@ from tg_bot.__main__ import GDPR
 from tg_bot.__main__ import STATS, USER_INFO
 from tg_bot.modules.disable import DisableAbleCommandHandler
 from tg_bot.modules.helper_funcs.extraction import extract_user
+from tg_bot.modules.helper_funcs.fanout import FANOUT
 from tg_bot.modules.helper_funcs.filters import CustomFilters
 from tg_bot.modules.helper_funcs.chat_status import bot_admin, user_admin, can_restrict
 from tg_bot.modules.sql.safemode_sql import set_safemode, is_safemoded
@@ -417,6 +418,26 @@ def stats(bot: Bot, update: Update):
     update.effective_message.reply_text("Current stats:\n" + "\n".join([mod.__stats__() for mod in STATS]))
 
 
+@run_async
+def tasks(bot: Bot, update: Update):
+    running = FANOUT.running()
+    if running:
+        update.effective_message.reply_text("\n".join(job.status() for job in running))
+    else:
+        update.effective_message.reply_text("Nothing running right now.")
+
+
+@run_async
+def cancel_task(bot: Bot, update: Update, args: List[str]):
+    job = FANOUT.get(int(args[0].lstrip("#"))) if args and args[0].lstrip("#").isdigit() else None
+    if not job or job.finished:
+        update.effective_message.reply_text("There's no such task running - check /tasks for the ids.")
+        return
+
+    job.cancel()
+    update.effective_message.reply_text("Cancelling {}; chats it already got to are left as they are.".format(job.name))
+
+
 def gps(bot: Bot, update: Update, args: List[str]):
     message = update.effective_message
     try:
@@ -464,6 +485,8 @@ MD_HELP_HANDLER = CommandHandler("markdownhelp", markdown_help, filters=Filters.
 
 STATS_HANDLER = CommandHandler("stats", stats, filters=CustomFilters.sudo_filter)
 GDPR_HANDLER = CommandHandler("gdpr", gdpr, filters=Filters.private)
+TASKS_HANDLER = CommandHandler("tasks", tasks, filters=CustomFilters.sudo_filter)
+CANCEL_TASK_HANDLER = CommandHandler("canceltask", cancel_task, pass_args=True, filters=CustomFilters.sudo_filter)
 GPS_HANDLER = DisableAbleCommandHandler("gps", gps, pass_args=True)
 
 
@@ -478,5 +501,7 @@ dispatcher.add_handler(ECHO_HANDLER)
 dispatcher.add_handler(MD_HELP_HANDLER)
 dispatcher.add_handler(STATS_HANDLER)
 dispatcher.add_handler(GDPR_HANDLER)
+dispatcher.add_handler(TASKS_HANDLER)
+dispatcher.add_handler(CANCEL_TASK_HANDLER)
 dispatcher.add_handler(SAFEMODE_HANDLER)
 dispatcher.add_handler(GPS_HANDLER)
@@ -8,7 +8,7 @@ from telegram.utils.helpers import mention_html
 
 from tg_bot import dispatcher
 from tg_bot.modules.helper_funcs.chat_status import bot_admin, user_admin, is_user_ban_protected, can_restrict, \
-    is_user_admin, is_user_in_chat, is_bot_admin
+    is_user_admin, is_user_in_chat, is_bot_admin, invalidate_member_everywhere
 from tg_bot.modules.helper_funcs.extraction import extract_user_and_text
 from tg_bot.modules.helper_funcs.string_handling import extract_time
 from tg_bot.modules.helper_funcs.filters import CustomFilters
@@ -137,6 +137,7 @@ def rban(bot: Bot, update: Update, args: List[str]):
 
     try:
         chat.kick_member(user_id)
+        invalidate_member_everywhere(chat.id, user_id)
         message.reply_text("Wew lad! they banned af.")
     except BadRequest as excp:
         if excp.message == "Reply message not found":
@@ -204,6 +205,7 @@ def runban(bot: Bot, update: Update, args: List[str]):
 
     try:
         chat.unban_member(user_id)
+        invalidate_member_everywhere(chat.id, user_id)
         message.reply_text("Fine, I'll allow it this time...")
     except BadRequest as excp:
         if excp.message == "Reply message not found":
@@ -271,6 +273,7 @@ def rkick(bot: Bot, update: Update, args: List[str]):
 
     try:
         chat.unban_member(user_id)
+        invalidate_member_everywhere(chat.id, user_id)
         message.reply_text("Fugg off!")
     except BadRequest as excp:
         if excp.message == "Reply message not found":
@@ -338,6 +341,7 @@ def rmute(bot: Bot, update: Update, args: List[str]):
 
     try:
         bot.restrict_chat_member(chat.id, user_id, can_send_messages=False)
+        invalidate_member_everywhere(chat.id, user_id)
         message.reply_text("STFU Thanks!")
     except BadRequest as excp:
         if excp.message == "Reply message not found":
@@ -411,6 +415,7 @@ def runmute(bot: Bot, update: Update, args: List[str]):
                                      can_send_media_messages=True,
                                      can_send_other_messages=True,
                                      can_add_web_page_previews=True)
+        invalidate_member_everywhere(chat.id, user_id)
         message.reply_text("Yeah fine, they can talk...")
     except BadRequest as excp:
         if excp.message == "Reply message not found":
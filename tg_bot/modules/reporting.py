@@ -89,13 +89,13 @@ def report(bot: Bot, update: Update) -> str:
 
             if sql.user_should_report(admin.user.id):
                 try:
-                    bot.send_message(admin.user.id, msg + link, parse_mode=ParseMode.HTML)
+                    bot.send_message(admin.user.id, msg + link, parse_mode=ParseMode.HTML, bulk=True)
 
                     if should_forward:
-                        message.reply_to_message.forward(admin.user.id)
+                        bot.forward_message(admin.user.id, chat.id, message.reply_to_message.message_id, bulk=True)
 
                         if len(message.text.split()) > 1:  # If user is giving a reason, send his message too
-                            message.forward(admin.user.id)
+                            bot.forward_message(admin.user.id, chat.id, message.message_id, bulk=True)
 
                 except Unauthorized:
                     pass
@@ -7,6 +7,7 @@ from telegram.ext import CommandHandler
 
 from tg_bot import dispatcher, updater
 from tg_bot.modules.helper_funcs.chat_status import user_admin
+from tg_bot.modules.helper_funcs.sharding import SHARDING
 from tg_bot.modules.sql import rss_sql as sql
 
 
@@ -228,10 +229,12 @@ __mod_name__ = "RSS Feed"
 
 job = updater.job_queue
 
-job_rss_set = job.run_once(rss_set, 5)
-job_rss_update = job.run_repeating(rss_update, interval=60, first=60)
-job_rss_set.enabled = True
-job_rss_update.enabled = True
+# feeds are polled for every chat at once, so only one shard does it
+if SHARDING.primary:
+    job_rss_set = job.run_once(rss_set, 5)
+    job_rss_update = job.run_repeating(rss_update, interval=60, first=60)
+    job_rss_set.enabled = True
+    job_rss_update.enabled = True
 
 SHOW_URL_HANDLER = CommandHandler("rss", show_url, pass_args=True)
 ADD_URL_HANDLER = CommandHandler("addrss", add_url, pass_args=True)
@@ -1,18 +1,39 @@
 import os
 from pymongo import MongoClient
 
+from tg_bot import MONGO_POOL_SIZE, MONGO_COMPRESSORS, MONGO_TIMEOUT, MONGO_SOCKET_TIMEOUT, MONGO_READ_PREFERENCE
+
 # Get MongoDB URI from environment variable or fallback to local DB
 MONGO_URI = os.environ.get("MONGO_DB_URI", "mongodb://localhost:27017")
 
+# Pool, compression and timeouts - shared by every client we make, sync or async
+CLIENT_OPTIONS = {
+    "maxPoolSize": MONGO_POOL_SIZE,
+    "serverSelectionTimeoutMS": MONGO_TIMEOUT * 1000,
+    "socketTimeoutMS": MONGO_SOCKET_TIMEOUT * 1000 or None,
+}
+if MONGO_COMPRESSORS:
+    CLIENT_OPTIONS["compressors"] = MONGO_COMPRESSORS
+
 # Create a MongoDB client
-client = MongoClient(MONGO_URI)
+client = MongoClient(MONGO_URI, **CLIENT_OPTIONS)
 
 # Choose the database (you can rename 'levi_bot' if needed)
 db = client["levi_bot"]
 
+# Reads which can stand to be a moment out of date (stats...) get a client and pool of their own, so they
+# don't queue up behind write bursts. Without a read preference they just share the main one.
+if MONGO_READ_PREFERENCE:
+    read_client = MongoClient(MONGO_URI, readPreference=MONGO_READ_PREFERENCE, **CLIENT_OPTIONS)
+    read_db = read_client[db.name]
+else:
+    read_client = client
+    read_db = db
+
 # Exported DB object can be used in each module
 # Example use in another file: from sql import db
 # Then use: db["collection_name"].find_one(...)
+# Reads nobody expects to reflect a write they just made use read_db["collection_name"] instead
 
 # Import all model modules to register usage
 # Ensure each module now uses: `from sql import db` to access the database
@@ -21,7 +42,9 @@ import tg_bot.modules.sql.antiflood_sql
 import tg_bot.modules.sql.blacklist_sql
 import tg_bot.modules.sql.cust_filters_sql
 import tg_bot.modules.sql.disable_sql
+import tg_bot.modules.sql.fanout_jobs_sql
 import tg_bot.modules.sql.global_bans_sql
+import tg_bot.modules.sql.global_feed_sql
 import tg_bot.modules.sql.global_mutes_sql
 import tg_bot.modules.sql.locks_sql
 import tg_bot.modules.sql.log_channel_sql
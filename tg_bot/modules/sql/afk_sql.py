@@ -35,6 +35,14 @@ def rm_afk(user_id):
             del AFK_USERS[user_id]
         return result.deleted_count > 0
 
+# ✅ Mirror an AFK change made elsewhere (eg another shard) - reason None means no longer AFK
+def cache_afk(user_id, reason):
+    with INSERTION_LOCK:
+        if reason is None:
+            AFK_USERS.pop(user_id, None)
+        else:
+            AFK_USERS[user_id] = reason
+
 # ✅ Load existing AFK users into memory on startup
 def __load_afk_users():
     global AFK_USERS
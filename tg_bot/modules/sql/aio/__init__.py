@@ -0,0 +1,65 @@
+"""asyncio versions of the sql modules, on top of motor.
+
+Most of the bot's handlers run on the dispatcher's worker threads and keep using the blocking modules in
+tg_bot.modules.sql. Code running on an event loop - the async def handlers, eg the blacklist and filter message
+handlers - imports the same module from here instead, eg
+
+    from tg_bot.modules.sql.aio import warns_sql as sql
+    num_warns, reasons = await sql.warn_user(user_id, chat_id, reason)
+
+and gets the same functions as coroutines, so a single loop can keep any number of db calls in flight. Both sides
+share the in-memory caches (blacklists, filters, chat settings, buffered user sightings), so whatever one writes the
+other sees straight away. Only the calls made while handling updates are here; admin and stats commands stay sync.
+"""
+from typing import Optional
+
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:
+    AsyncIOMotorClient = None
+
+from sql import MONGO_URI, CLIENT_OPTIONS, db as sync_db
+from tg_bot import MONGO_READ_PREFERENCE
+
+_client = None  # type: Optional[AsyncIOMotorClient]
+_read_client = None  # type: Optional[AsyncIOMotorClient]
+
+
+def _new_client(**options) -> AsyncIOMotorClient:
+    if AsyncIOMotorClient is None:
+        raise RuntimeError("The async data layer needs motor - pip install motor")
+    return AsyncIOMotorClient(MONGO_URI, **dict(CLIENT_OPTIONS, **options))
+
+
+def get_db():
+    # motor clients belong to the event loop they're first used on, so don't make one until something asks
+    global _client
+    if _client is None:
+        _client = _new_client()
+    return _client[sync_db.name]
+
+
+def get_read_db():
+    # like sql.read_db: a client of its own for reads which can go to a secondary, if there's a read preference
+    global _read_client
+    if not MONGO_READ_PREFERENCE:
+        return get_db()
+    if _read_client is None:
+        _read_client = _new_client(readPreference=MONGO_READ_PREFERENCE)
+    return _read_client[sync_db.name]
+
+
+def collection(name: str):
+    return get_db()[name]
+
+
+def read_collection(name: str):
+    return get_read_db()[name]
+
+
+def close():
+    global _client, _read_client
+    for client in (_client, _read_client):
+        if client is not None:
+            client.close()
+    _client = _read_client = None
@@ -0,0 +1,40 @@
+from typing import Optional, Set
+
+from tg_bot.modules.sql import blacklist_sql as sync
+from tg_bot.modules.sql.aio import collection
+
+
+# ✅ Add a trigger to blacklist
+async def add_to_blacklist(chat_id, trigger: str):
+    await collection("blacklist").update_one(
+        {"chat_id": str(chat_id), "trigger": trigger},
+        {"$set": {"chat_id": str(chat_id), "trigger": trigger}},
+        upsert=True,
+    )
+    sync.CHAT_BLACKLISTS.setdefault(str(chat_id), set()).add(trigger)
+    sync.BLACKLIST_INDEX.add(chat_id, trigger)
+
+
+# ✅ Remove a trigger from blacklist
+async def rm_from_blacklist(chat_id, trigger: str) -> bool:
+    result = await collection("blacklist").delete_one({"chat_id": str(chat_id), "trigger": trigger})
+    if result.deleted_count:
+        sync.CHAT_BLACKLISTS.get(str(chat_id), set()).discard(trigger)
+        sync.BLACKLIST_INDEX.remove(chat_id, trigger)
+        return True
+    return False
+
+
+# ✅ Get set of blacklisted triggers for a chat
+async def get_chat_blacklist(chat_id) -> Set[str]:
+    return sync.get_chat_blacklist(chat_id)
+
+
+# ✅ Get the first blacklisted trigger found in the text (None if nothing matches)
+async def get_blacklist_match(chat_id, text: str) -> Optional[str]:
+    return sync.get_blacklist_match(chat_id, text)
+
+
+# ✅ Count blacklist filters in one specific chat
+async def num_blacklist_chat_filters(chat_id) -> int:
+    return await collection("blacklist").count_documents({"chat_id": str(chat_id)})
@@ -0,0 +1,40 @@
+from typing import List, Optional
+
+from tg_bot.modules.sql import cust_filters_sql as sync
+from tg_bot.modules.sql.aio import collection
+
+
+# ✅ Add a custom filter
+async def add_filter(chat_id, keyword: str, reply):
+    await collection("cust_filters").update_one(
+        {"chat_id": str(chat_id), "name": keyword},
+        {"$set": {"keyword": reply}},
+        upsert=True,
+    )
+    sync.CHAT_FILTERS.setdefault(str(chat_id), {})[keyword] = reply
+    sync.FILTER_INDEX.add(chat_id, keyword)
+
+
+# ✅ Remove a custom filter
+async def remove_filter(chat_id, keyword: str) -> bool:
+    result = await collection("cust_filters").delete_one({"chat_id": str(chat_id), "name": keyword})
+    if result.deleted_count:
+        sync.CHAT_FILTERS.get(str(chat_id), {}).pop(keyword, None)
+        sync.FILTER_INDEX.remove(chat_id, keyword)
+        return True
+    return False
+
+
+# ✅ Get a specific filter
+async def get_filter(chat_id, keyword: str):
+    return sync.get_filter(chat_id, keyword)
+
+
+# ✅ Get the highest priority keyword found in the text (None if nothing matches)
+async def get_matching_trigger(chat_id, text: str) -> Optional[str]:
+    return sync.get_matching_trigger(chat_id, text)
+
+
+# ✅ Get buttons for a specific filter
+async def get_buttons(chat_id, keyword: str) -> List[tuple]:
+    return sync.get_buttons(chat_id, keyword)
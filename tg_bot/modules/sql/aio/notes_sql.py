@@ -0,0 +1,19 @@
+from typing import List, Optional
+
+from pymongo import ASCENDING
+
+from tg_bot.modules.sql.aio import collection
+
+
+async def get_note(chat_id, note_name: str) -> Optional[dict]:
+    return await collection("notes").find_one({"chat_id": str(chat_id), "name": note_name})
+
+
+async def get_all_chat_notes(chat_id) -> List[dict]:
+    return await collection("notes").find({"chat_id": str(chat_id)}).sort("name", ASCENDING).to_list(None)
+
+
+async def get_buttons(chat_id, note_name: str) -> List[dict]:
+    return await collection("note_buttons").find(
+        {"chat_id": str(chat_id), "note_name": note_name}
+    ).sort("_id", ASCENDING).to_list(None)
@@ -0,0 +1,16 @@
+from typing import Optional, Union
+
+from tg_bot.modules.sql.aio import collection
+
+
+async def set_rules(chat_id: Union[int, str], rules_text: str):
+    await collection("rules").update_one(
+        {"chat_id": str(chat_id)},
+        {"$set": {"rules": rules_text}},
+        upsert=True
+    )
+
+
+async def get_rules(chat_id: Union[int, str]) -> Optional[str]:
+    doc = await collection("rules").find_one({"chat_id": str(chat_id)})
+    return doc["rules"] if doc else None
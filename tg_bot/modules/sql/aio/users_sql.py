@@ -0,0 +1,97 @@
+from typing import List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from tg_bot import LOGGER
+from tg_bot.modules.sql import users_sql as sync
+from tg_bot.modules.sql.aio import collection
+
+
+# ✅ Buffer a user (and chat) sighting, to be written on the next flush - shares the sync module's buffer
+async def update_user(user_id: int, username: Optional[str], chat_id: Optional[str] = None,
+                      chat_name: Optional[str] = None):
+    sync.update_user(user_id, username, chat_id, chat_name)
+
+
+async def _bulk_upsert(name: str, requests: List[UpdateOne]) -> bool:
+    if not requests:
+        return True
+    try:
+        await collection(name).bulk_write(requests, ordered=False)
+    except BulkWriteError as excp:
+        if sync.only_duplicates(excp):
+            return True
+        LOGGER.warning("Couldn't flush %s, will retry: %s", name, excp.details)
+        return False
+    except PyMongoError:
+        LOGGER.exception("Couldn't flush %s, will retry", name)
+        return False
+    return True
+
+
+# ✅ Write everything buffered so far, as one unordered batch per collection; whatever fails is kept for next time
+async def flush_pending():
+    users, chats, members = sync.take_pending()
+
+    users_written = await _bulk_upsert("users", [
+        UpdateOne({"user_id": user_id}, {"$set": {"username": username}}, upsert=True)
+        for user_id, username in users.items()
+    ])
+    chats_written = await _bulk_upsert("chats", [
+        UpdateOne({"chat_id": chat_id}, {"$set": {"chat_name": chat_name}}, upsert=True)
+        for chat_id, chat_name in chats.items()
+    ])
+    members_written = await _bulk_upsert("chat_members", [
+        UpdateOne({"chat": chat_id, "user": user_id}, {"$setOnInsert": {"chat": chat_id, "user": user_id}},
+                  upsert=True)
+        for chat_id, user_id in members
+    ])
+
+    sync.mark_flushed(users if users_written else {}, chats if chats_written else {},
+                      members if members_written else set())
+    sync.return_pending({} if users_written else users, {} if chats_written else chats,
+                        set() if members_written else members)
+
+
+async def _flush_for_read():
+    if sync.has_pending():
+        try:
+            await flush_pending()
+        except Exception:
+            LOGGER.exception("Couldn't flush pending users before a read")
+
+
+async def get_userid_by_name(username: str) -> List[dict]:
+    await _flush_for_read()
+    return await collection("users").find({"username": {"$regex": f"^{username}$", "$options": "i"}}).to_list(None)
+
+
+async def get_name_by_userid(user_id: int) -> Optional[dict]:
+    await _flush_for_read()
+    return await collection("users").find_one({"user_id": user_id})
+
+
+async def get_chat_members(chat_id: str) -> List[dict]:
+    await _flush_for_read()
+    return await collection("chat_members").find({"chat": str(chat_id)}).to_list(None)
+
+
+async def get_all_chats() -> List[dict]:
+    await _flush_for_read()
+    return await collection("chats").find().to_list(None)
+
+
+async def get_user_num_chats(user_id: int) -> int:
+    await _flush_for_read()
+    return await collection("chat_members").count_documents({"user": user_id})
+
+
+async def num_chats() -> int:
+    await _flush_for_read()
+    return await collection("chats").estimated_document_count()
+
+
+async def num_users() -> int:
+    await _flush_for_read()
+    return await collection("users").estimated_document_count()
@@ -0,0 +1,70 @@
+from typing import List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from tg_bot.modules.sql import warns_sql as sync
+from tg_bot.modules.sql.aio import collection
+
+
+# Warn Management
+async def warn_user(user_id: int, chat_id: str, reason: Optional[str] = None) -> Tuple[int, List[str]]:
+    # a single atomic update, so concurrent warns can't overwrite each other without needing a lock. Always $push,
+    # if only nothing, so a new record gets its reasons list - the sync side expects one
+    record = await collection("warns").find_one_and_update(
+        {"user_id": user_id, "chat_id": chat_id},
+        {"$inc": {"num_warns": 1}, "$push": {"reasons": {"$each": [reason] if reason else []}}},
+        upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return record["num_warns"], record.get("reasons", [])
+
+
+async def remove_warn(user_id: int, chat_id: str) -> bool:
+    result = await collection("warns").update_one(
+        {"user_id": user_id, "chat_id": chat_id, "num_warns": {"$gt": 0}},
+        {"$inc": {"num_warns": -1}}
+    )
+    return result.modified_count > 0
+
+
+async def reset_warns(user_id: int, chat_id: str):
+    await collection("warns").update_one(
+        {"user_id": user_id, "chat_id": chat_id},
+        {"$set": {"num_warns": 0, "reasons": []}}
+    )
+
+
+async def get_warns(user_id: int, chat_id: str) -> Optional[Tuple[int, List[str]]]:
+    record = await collection("warns").find_one({"user_id": user_id, "chat_id": chat_id})
+    return (record["num_warns"], record.get("reasons", [])) if record else None
+
+
+# Warn Filters
+async def get_warn_filter_match(chat_id: str, text: str) -> Optional[str]:
+    return sync.get_warn_filter_match(chat_id, text)
+
+
+async def get_warn_filter(chat_id: str, keyword: str) -> Optional[dict]:
+    return await collection("warn_filters").find_one({"chat_id": chat_id, "keyword": keyword})
+
+
+# Settings
+async def set_warn_limit(chat_id: str, warn_limit: int):
+    await _set_warn_settings(chat_id, {"warn_limit": warn_limit})
+
+
+async def set_warn_strength(chat_id: str, soft_warn: bool):
+    await _set_warn_settings(chat_id, {"soft_warn": soft_warn})
+
+
+async def get_warn_setting(chat_id: str) -> Tuple[int, bool]:
+    cached, setting = sync.WARN_SETTINGS.lookup(chat_id)
+    if not cached:
+        setting = await collection("warn_settings").find_one({"chat_id": sync.WARN_SETTINGS.key(chat_id)})
+        sync.WARN_SETTINGS.fill(chat_id, setting)
+    return (setting.get("warn_limit", 3), setting.get("soft_warn", False)) if setting else (3, False)
+
+
+async def _set_warn_settings(chat_id: str, fields: dict):
+    await collection("warn_settings").update_one({"chat_id": sync.WARN_SETTINGS.key(chat_id)}, {"$set": fields},
+                                              upsert=True)
+    sync.WARN_SETTINGS.patch(chat_id, fields)
@@ -1,49 +1,46 @@
 import threading
 from sql import db
+from tg_bot.modules.helper_funcs.flood import FloodTracker
 
 # MongoDB collection
 flood_collection = db["antiflood"]
 
-DEF_COUNT = 0
 DEF_LIMIT = 0
-DEF_OBJ = (None, DEF_COUNT, DEF_LIMIT)
+DEF_WINDOW = 15  # seconds
+DEF_OBJ = (DEF_LIMIT, DEF_WINDOW)
 
 INSERTION_LOCK = threading.RLock()
+# chat_id -> (limit, window)
 CHAT_FLOOD = {}
+# per (chat, user) message windows - in memory only
+FLOOD_TRACKER = FloodTracker()
 
-# ✅ Set flood limit for a chat
-def set_flood(chat_id, amount):
+# ✅ Set flood limit (and the window it applies to) for a chat
+def set_flood(chat_id, amount, window=DEF_WINDOW):
     with INSERTION_LOCK:
         flood_collection.update_one(
             {"chat_id": str(chat_id)},
-            {"$set": {"user_id": None, "limit": amount}},
+            {"$set": {"limit": amount, "window": window}},
             upsert=True,
         )
-        CHAT_FLOOD[str(chat_id)] = (None, DEF_COUNT, amount)
+        CHAT_FLOOD[str(chat_id)] = (amount, window)
+        FLOOD_TRACKER.reset_chat(str(chat_id))
 
-# ✅ Check/update message count, return True if flood threshold exceeded
+# ✅ Record a message, return True if this user sent more than the limit within the chat's window
 def update_flood(chat_id: str, user_id) -> bool:
-    if str(chat_id) in CHAT_FLOOD:
-        curr_user_id, count, limit = CHAT_FLOOD.get(str(chat_id), DEF_OBJ)
-
-        if limit == 0:
-            return False
-
-        if user_id != curr_user_id or user_id is None:
-            CHAT_FLOOD[str(chat_id)] = (user_id, DEF_COUNT + 1, limit)
-            return False
-
-        count += 1
-        if count > limit:
-            CHAT_FLOOD[str(chat_id)] = (None, DEF_COUNT, limit)
-            return True
-
-        CHAT_FLOOD[str(chat_id)] = (user_id, count, limit)
+    limit, window = CHAT_FLOOD.get(str(chat_id), DEF_OBJ)
+    if limit == 0 or user_id is None:
         return False
 
+    return FLOOD_TRACKER.check(str(chat_id), user_id, limit, window)
+
 # ✅ Get flood limit for a chat
 def get_flood_limit(chat_id):
-    return CHAT_FLOOD.get(str(chat_id), DEF_OBJ)[2]
+    return CHAT_FLOOD.get(str(chat_id), DEF_OBJ)[0]
+
+# ✅ Get the window (in seconds) the flood limit applies to
+def get_flood_window(chat_id):
+    return CHAT_FLOOD.get(str(chat_id), DEF_OBJ)[1]
 
 # ✅ Migrate chat ID (e.g., after group ID change)
 def migrate_chat(old_chat_id, new_chat_id):
@@ -52,17 +49,18 @@ def migrate_chat(old_chat_id, new_chat_id):
         if data:
             flood_collection.update_one(
                 {"chat_id": str(new_chat_id)},
-                {"$set": {"limit": data.get("limit", DEF_LIMIT), "user_id": None}},
+                {"$set": {"limit": data.get("limit", DEF_LIMIT), "window": data.get("window", DEF_WINDOW)}},
                 upsert=True
             )
             CHAT_FLOOD[str(new_chat_id)] = CHAT_FLOOD.get(str(old_chat_id), DEF_OBJ)
+        FLOOD_TRACKER.reset_chat(str(old_chat_id))
 
 # ✅ Load all flood configs into memory
 def __load_flood_settings():
     global CHAT_FLOOD
     all_chats = flood_collection.find()
     CHAT_FLOOD = {
-        chat["chat_id"]: (None, DEF_COUNT, chat.get("limit", DEF_LIMIT))
+        chat["chat_id"]: (chat.get("limit", DEF_LIMIT), chat.get("window", DEF_WINDOW))
         for chat in all_chats
     }
 
@@ -1,11 +1,14 @@
 import threading
 from sql import db
+from tg_bot.modules.helper_funcs.triggers import TriggerIndex
 
 # MongoDB collection
 blacklist_collection = db["blacklist"]
 
 BLACKLIST_FILTER_INSERTION_LOCK = threading.RLock()
 CHAT_BLACKLISTS = {}
+# per-chat keyword automata, matched in one pass over a message; a chat's is rebuilt on first use after a change
+BLACKLIST_INDEX = TriggerIndex()
 
 # ✅ Add a trigger to blacklist
 def add_to_blacklist(chat_id, trigger):
@@ -16,6 +19,7 @@ def add_to_blacklist(chat_id, trigger):
             upsert=True,
         )
         CHAT_BLACKLISTS.setdefault(str(chat_id), set()).add(trigger)
+        BLACKLIST_INDEX.add(chat_id, trigger)
 
 # ✅ Remove a trigger from blacklist
 def rm_from_blacklist(chat_id, trigger):
@@ -23,6 +27,7 @@ def rm_from_blacklist(chat_id, trigger):
         result = blacklist_collection.delete_one({"chat_id": str(chat_id), "trigger": trigger})
         if result.deleted_count:
             CHAT_BLACKLISTS.get(str(chat_id), set()).discard(trigger)
+            BLACKLIST_INDEX.remove(chat_id, trigger)
             return True
         return False
 
@@ -30,6 +35,10 @@ def rm_from_blacklist(chat_id, trigger):
 def get_chat_blacklist(chat_id):
     return CHAT_BLACKLISTS.get(str(chat_id), set())
 
+# ✅ Get the first blacklisted trigger found in the text, in one scan (None if nothing matches)
+def get_blacklist_match(chat_id, text):
+    return BLACKLIST_INDEX.first_match(chat_id, text)
+
 # ✅ Count total number of blacklist filters across all chats
 def num_blacklist_filters():
     return blacklist_collection.count_documents({})
@@ -64,6 +73,7 @@ def migrate_chat(old_chat_id, new_chat_id):
         CHAT_BLACKLISTS[new_id] = CHAT_BLACKLISTS.get(old_id, set())
         if old_id in CHAT_BLACKLISTS:
             del CHAT_BLACKLISTS[old_id]
+        BLACKLIST_INDEX.migrate(old_id, new_id)
 
 # ✅ Load all blacklisted triggers into memory on startup
 def __load_chat_blacklists():
@@ -75,5 +85,8 @@ def __load_chat_blacklists():
         trigger = entry["trigger"]
         temp.setdefault(chat_id, []).append(trigger)
     CHAT_BLACKLISTS = {x: set(y) for x, y in temp.items()}
+    BLACKLIST_INDEX.clear()
+    for chat_id, triggers in CHAT_BLACKLISTS.items():
+        BLACKLIST_INDEX.set(chat_id, triggers)
 
 __load_chat_blacklists()
@@ -1,5 +1,6 @@
 import threading
 from sql import db
+from tg_bot.modules.helper_funcs.triggers import TriggerIndex
 
 # MongoDB collections
 filters_collection = db["cust_filters"]
@@ -11,6 +12,9 @@ BUTTON_LOCK = threading.RLock()
 CHAT_FILTERS = {}
 BTN = {}
 
+# per-chat trigger index, keywords kept in priority order (longest first)
+FILTER_INDEX = TriggerIndex()
+
 # ✅ Add a custom filter
 def add_filter(chat_id, keyword, reply):
     with CUST_FILT_LOCK:
@@ -20,6 +24,7 @@ def add_filter(chat_id, keyword, reply):
             upsert=True,
         )
         CHAT_FILTERS.setdefault(str(chat_id), {})[keyword] = reply
+        FILTER_INDEX.add(chat_id, keyword)
 
 # ✅ Remove a custom filter
 def remove_filter(chat_id, keyword):
@@ -27,6 +32,7 @@ def remove_filter(chat_id, keyword):
         result = filters_collection.delete_one({"chat_id": str(chat_id), "name": keyword})
         if result.deleted_count:
             CHAT_FILTERS.get(str(chat_id), {}).pop(keyword, None)
+            FILTER_INDEX.remove(chat_id, keyword)
             return True
         return False
 
@@ -38,6 +44,14 @@ def get_filter(chat_id, keyword):
 def get_chat_filters(chat_id):
     return CHAT_FILTERS.get(str(chat_id), {})
 
+# ✅ Get all keywords in a chat, in priority order
+def get_chat_triggers(chat_id):
+    return FILTER_INDEX.triggers(chat_id)
+
+# ✅ Get the highest priority keyword found in the text, in one scan (None if nothing matches)
+def get_matching_trigger(chat_id, text):
+    return FILTER_INDEX.first_match(chat_id, text)
+
 # ✅ Add a button to a filter
 def add_button(chat_id, keyword, name, url, same_line=True):
     with BUTTON_LOCK:
@@ -71,6 +85,10 @@ def __load_chat_filters():
     for filt in all_filters:
         CHAT_FILTERS.setdefault(filt["chat_id"], {})[filt["name"]] = filt["keyword"]
 
+    FILTER_INDEX.clear()
+    for chat_id, chat_filters in CHAT_FILTERS.items():
+        FILTER_INDEX.set(chat_id, chat_filters)
+
     all_btns = buttons_collection.find()
     for btn in all_btns:
         BTN.setdefault(btn["chat_id"], {}).setdefault(btn["keyword"], []).append(
@@ -95,6 +113,7 @@ def migrate_chat(old_chat_id, new_chat_id):
         CHAT_FILTERS[new_id] = CHAT_FILTERS.get(old_id, {})
         if old_id in CHAT_FILTERS:
             del CHAT_FILTERS[old_id]
+        FILTER_INDEX.migrate(old_id, new_id)
 
     with BUTTON_LOCK:
         buttons = buttons_collection.find({"chat_id": old_id})
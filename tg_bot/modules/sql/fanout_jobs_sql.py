@@ -0,0 +1,100 @@
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+from uuid import uuid4
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from sql import db
+
+# MongoDB collection
+jobs_collection = db["fanout_jobs"]
+jobs_collection.create_index([("job_id", ASCENDING)], unique=True)
+jobs_collection.create_index([("status", ASCENDING)])
+counters_collection = db["counters"]
+
+# Thread lock for thread safety
+JOBS_LOCK = threading.RLock()
+
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+
+LEASE = timedelta(seconds=90)  # a running job whose owner hasn't renewed it for this long is up for grabs
+OWNER = "{}:{}:{}".format(socket.gethostname(), os.getpid(), uuid4().hex[:8])  # this process, among every instance
+
+# start the counter above whatever ids were handed out before it existed
+_last = jobs_collection.find_one({}, {"job_id": 1}, sort=[("job_id", DESCENDING)])
+counters_collection.update_one({"_id": "fanout_jobs"}, {"$max": {"seq": _last["job_id"] if _last else 0}},
+                               upsert=True)
+
+
+def __lease_until() -> datetime:
+    return datetime.utcnow() + LEASE
+
+
+# ✅ Next free job id - ids keep counting up across restarts, and never clash between instances
+def next_job_id() -> int:
+    counter = counters_collection.find_one_and_update({"_id": "fanout_jobs"}, {"$inc": {"seq": 1}}, upsert=True,
+                                                      return_document=ReturnDocument.AFTER)
+    return counter["seq"]
+
+
+# ✅ Record a new job, with the full list of chats it has to get through; this instance owns it
+def add_job(job_id: int, kind: str, name: str, params: dict, targets: list, report_to: Optional[list] = None):
+    with JOBS_LOCK:
+        jobs_collection.insert_one({
+            "job_id": job_id,
+            "kind": kind,
+            "name": name,
+            "params": params,
+            "targets": targets,
+            "report_to": report_to,
+            "position": 0,
+            "succeeded": 0,
+            "skipped": 0,
+            "failed": 0,
+            "errors": [],
+            "status": RUNNING,
+            "owner": OWNER,
+            "lease_until": __lease_until(),
+        })
+
+
+# ✅ Checkpoint: every target before `position` has been dealt with
+def save_progress(job_id: int, position: int, succeeded: int, skipped: int, failed: int, errors: list):
+    with JOBS_LOCK:
+        jobs_collection.update_one(
+            {"job_id": job_id, "owner": OWNER},
+            {"$set": {"position": position, "succeeded": succeeded, "skipped": skipped, "failed": failed,
+                      "errors": errors, "lease_until": __lease_until()}}
+        )
+
+
+# ✅ Mark a job as over, one way or another
+def finish_job(job_id: int, status: str):
+    with JOBS_LOCK:
+        jobs_collection.update_one({"job_id": job_id, "owner": OWNER}, {"$set": {"status": status}})
+
+
+# ✅ Heartbeat: keep the jobs this instance is running from being taken over; returns how many it still owns
+def renew_leases(job_ids: List[int]) -> int:
+    if not job_ids:
+        return 0
+    with JOBS_LOCK:
+        result = jobs_collection.update_many({"job_id": {"$in": job_ids}, "owner": OWNER, "status": RUNNING},
+                                             {"$set": {"lease_until": __lease_until()}})
+        return result.matched_count
+
+
+# ✅ Take over the oldest running job nobody is looking after any more - eg its instance stopped part way
+def claim_unfinished_job(kinds: Iterable[str]) -> Optional[dict]:
+    return jobs_collection.find_one_and_update(
+        # jobs from before leases existed have no lease_until, and count as expired
+        {"status": RUNNING, "kind": {"$in": list(kinds)}, "lease_until": {"$not": {"$gte": datetime.utcnow()}}},
+        {"$set": {"owner": OWNER, "lease_until": __lease_until()}},
+        projection={"_id": 0},
+        sort=[("job_id", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
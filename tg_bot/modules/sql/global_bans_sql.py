@@ -1,5 +1,7 @@
 import threading
 from sql import db
+from tg_bot.modules.sql import global_feed_sql
+from tg_bot.modules.helper_funcs.idset import IdSet
 
 # MongoDB collections
 gbans_collection = db["gbans"]
@@ -9,8 +11,10 @@ gban_settings_collection = db["gban_settings"]
 GBANNED_USERS_LOCK = threading.RLock()
 GBAN_SETTING_LOCK = threading.RLock()
 
+RECONCILE_INTERVAL = 60 * 60  # seconds between full rereads of the gbanned ids
+
 # In-memory caches
-GBANNED_LIST = set()
+GBANNED_LIST = IdSet()
 GBANSTAT_LIST = set()
 
 # ✅ Gban a user
@@ -21,7 +25,8 @@ def gban_user(user_id, name, reason=None):
             {"$set": {"name": name, "reason": reason}},
             upsert=True
         )
-        __load_gbanned_userid_list()
+        GBANNED_LIST.add(user_id)
+        global_feed_sql.publish("gban", user_id, True)
 
 # ✅ Update gban reason
 def update_gban_reason(user_id, name, reason=None):
@@ -39,7 +44,8 @@ def update_gban_reason(user_id, name, reason=None):
 def ungban_user(user_id):
     with GBANNED_USERS_LOCK:
         gbans_collection.delete_one({"user_id": user_id})
-        __load_gbanned_userid_list()
+        GBANNED_LIST.discard(user_id)
+        global_feed_sql.publish("gban", user_id, False)
 
 # ✅ Check if user is gbanned
 def is_user_gbanned(user_id):
@@ -53,6 +59,10 @@ def get_gbanned_user(user_id):
 def get_gban_list():
     return list(gbans_collection.find({}, {"_id": 0}))
 
+# ✅ Stream every gban entry, a batch at a time - for exports too big to load at once
+def iter_gban_list(batch_size=1000):
+    return gbans_collection.find({}, {"_id": 0}).batch_size(batch_size)
+
 # ✅ Enable gban enforcement in a chat
 def enable_gbans(chat_id):
     with GBAN_SETTING_LOCK:
@@ -81,6 +91,20 @@ def does_chat_gban(chat_id):
 def num_gbanned_users():
     return len(GBANNED_LIST)
 
+# ✅ Mirror a gban made elsewhere (another shard) in the in-memory cache - the db already has it
+def cache_gban(user_id, gbanned):
+    if gbanned:
+        GBANNED_LIST.add(user_id)
+    else:
+        GBANNED_LIST.discard(user_id)
+
+# ✅ Mirror a chat's gban setting changed elsewhere
+def cache_gban_setting(chat_id, setting):
+    if setting:
+        GBANSTAT_LIST.discard(str(chat_id))
+    else:
+        GBANSTAT_LIST.add(str(chat_id))
+
 # ✅ Migrate settings to a new chat ID
 def migrate_chat(old_chat_id, new_chat_id):
     with GBAN_SETTING_LOCK:
@@ -95,8 +119,12 @@ def migrate_chat(old_chat_id, new_chat_id):
 
 # ✅ Load gbanned user IDs into memory
 def __load_gbanned_userid_list():
-    global GBANNED_LIST
-    GBANNED_LIST = {x["user_id"] for x in gbans_collection.find({}, {"user_id": 1})}
+    GBANNED_LIST.replace(x["user_id"] for x in gbans_collection.find({}, {"user_id": 1}))
+
+# ✅ Reread every gbanned id, in case the cache has drifted from the db; returns how many ids were off
+def reconcile_gbanned_list():
+    with GBANNED_USERS_LOCK:
+        return GBANNED_LIST.replace(x["user_id"] for x in gbans_collection.find({}, {"user_id": 1}))
 
 # ✅ Load chats with gban disabled
 def __load_gban_stat_list():
@@ -107,3 +135,7 @@ def __load_gban_stat_list():
 # ✅ Preload on startup
 __load_gbanned_userid_list()
 __load_gban_stat_list()
+
+# ✅ Mirror gbans made by other instances sharing the db
+global_feed_sql.subscribe("gban", cache_gban)
+global_feed_sql.on_gap(reconcile_gbanned_list)
@@ -0,0 +1,115 @@
+import threading
+import time
+from typing import Callable, Dict, List
+
+from pymongo import ASCENDING, CursorType, DESCENDING, ReturnDocument
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+from sql import db
+from tg_bot import GLOBAL_FEED, LOGGER
+
+FEED_SIZE = 16 * 1024 * 1024  # bytes - hundreds of thousands of events before the oldest get overwritten
+RETRY_DELAY = 5  # seconds
+
+# Capped collection every instance appends its global changes (gbans, gmutes...) to, and tails. Events are
+# numbered from a shared counter: ObjectIds from different processes don't sort in the order they were made
+feed_collection = db["global_feed"]
+counters_collection = db["counters"]
+
+SUBSCRIBERS = {}  # type: Dict[str, List[Callable]]
+GAP_HANDLERS = []  # type: List[Callable[[], int]]
+
+_position = None  # highest seq applied here
+
+
+# ✅ Tell every instance (this one included) about a change it needs to mirror in memory
+def publish(kind: str, *args):
+    if not GLOBAL_FEED:
+        return
+    counter = counters_collection.find_one_and_update({"_id": "global_feed"}, {"$inc": {"seq": 1}}, upsert=True,
+                                                      return_document=ReturnDocument.AFTER)
+    feed_collection.insert_one({"seq": counter["seq"], "kind": kind, "args": list(args)})
+
+
+# ✅ Call func(*args) for every `kind` event published from now on
+def subscribe(kind: str, func: Callable):
+    SUBSCRIBERS.setdefault(kind, []).append(func)
+
+
+# ✅ Call func() when events may have been missed and everything needs rereading
+def on_gap(func: Callable[[], int]):
+    GAP_HANDLERS.append(func)
+
+
+def __apply(event: dict):
+    for func in SUBSCRIBERS.get(event["kind"], []):
+        try:
+            func(*event["args"])
+        except Exception:
+            LOGGER.exception("Couldn't apply %s from the global feed", event["kind"])
+
+
+def __resync():
+    for func in GAP_HANDLERS:
+        try:
+            func()
+        except Exception:
+            LOGGER.exception("Couldn't resync after a gap in the global feed")
+
+
+def __follow():
+    global _position
+    resync = False
+    while True:
+        try:
+            if resync:
+                # events may have gone by while the feed was down - start again from the newest, and reread the rest
+                __load_position()
+                __resync()
+                resync = False
+
+            # a tailable cursor whose query matches nothing dies straight away, so start from the last event applied
+            # rather than after it: that keeps one match around, and the cursor waiting on the server for the next.
+            # Two instances can insert their events out of seq order, so the filter stays fixed at where this cursor
+            # started, and only that one event is skipped - never anything below the highest seq seen since
+            start = _position
+            # (events from before they were numbered have no seq, and are long since applied)
+            query = {"seq": {"$gte": start} if start is not None else {"$exists": True}}
+            cursor = feed_collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+            while cursor.alive:
+                for event in cursor:
+                    if event["seq"] == start:
+                        continue
+                    __apply(event)
+                    _position = event["seq"] if _position is None else max(_position, event["seq"])
+        except PyMongoError:
+            # includes falling so far behind that the capped collection overwrote our place
+            LOGGER.exception("Lost the global feed, retrying in %ss", RETRY_DELAY)
+            resync = True
+        # the cursor died - on an error, or because the feed has never had anything in it
+        time.sleep(RETRY_DELAY)
+
+
+# ✅ Follow the feed in the background, forever
+def follow_feed():
+    threading.Thread(target=__follow, name="global-feed", daemon=True).start()
+
+
+def __load_position():
+    # whatever was published before this is already in the db, and so in the caches
+    global _position
+    newest = feed_collection.find_one({"seq": {"$exists": True}}, {"seq": 1}, sort=[("seq", DESCENDING)])
+    _position = newest["seq"] if newest else None
+
+
+def __setup():
+    try:
+        db.create_collection("global_feed", capped=True, size=FEED_SIZE)
+    except CollectionInvalid:
+        pass  # already there, made by us or another instance
+    feed_collection.create_index([("seq", ASCENDING)])
+    __load_position()
+
+
+if GLOBAL_FEED:
+    __setup()
@@ -1,5 +1,7 @@
 import threading
 from sql import db
+from tg_bot.modules.sql import global_feed_sql
+from tg_bot.modules.helper_funcs.idset import IdSet
 
 # MongoDB collections
 gmutes_collection = db["gmutes"]
@@ -9,8 +11,10 @@ gmute_settings_collection = db["gmute_settings"]
 GMUTED_USERS_LOCK = threading.RLock()
 GMUTE_SETTING_LOCK = threading.RLock()
 
+RECONCILE_INTERVAL = 60 * 60  # seconds between full rereads of the gmuted ids
+
 # In-memory cache
-GMUTED_LIST = set()
+GMUTED_LIST = IdSet()
 GMUTESTAT_LIST = set()
 
 # ✅ Add or update a globally muted user
@@ -21,7 +25,8 @@ def gmute_user(user_id, name, reason=None):
             {"$set": {"name": name, "reason": reason}},
             upsert=True
         )
-        __load_gmuted_userid_list()
+        GMUTED_LIST.add(user_id)
+        global_feed_sql.publish("gmute", user_id, True)
 
 # ✅ Update only the reason
 def update_gmute_reason(user_id, name, reason=None):
@@ -39,7 +44,8 @@ def update_gmute_reason(user_id, name, reason=None):
 def ungmute_user(user_id):
     with GMUTED_USERS_LOCK:
         gmutes_collection.delete_one({"user_id": user_id})
-        __load_gmuted_userid_list()
+        GMUTED_LIST.discard(user_id)
+        global_feed_sql.publish("gmute", user_id, False)
 
 # ✅ Check if a user is globally muted
 def is_user_gmuted(user_id):
@@ -53,6 +59,10 @@ def get_gmuted_user(user_id):
 def get_gmute_list():
     return list(gmutes_collection.find({}, {"_id": 0}))
 
+# ✅ Stream every gmute entry, a batch at a time - for exports too big to load at once
+def iter_gmute_list(batch_size=1000):
+    return gmutes_collection.find({}, {"_id": 0}).batch_size(batch_size)
+
 # ✅ Enable gmutes for a chat
 def enable_gmutes(chat_id):
     with GMUTE_SETTING_LOCK:
@@ -81,6 +91,20 @@ def does_chat_gmute(chat_id):
 def num_gmuted_users():
     return len(GMUTED_LIST)
 
+# ✅ Mirror a gmute made elsewhere (another shard) in the in-memory cache - the db already has it
+def cache_gmute(user_id, gmuted):
+    if gmuted:
+        GMUTED_LIST.add(user_id)
+    else:
+        GMUTED_LIST.discard(user_id)
+
+# ✅ Mirror a chat's gmute setting changed elsewhere
+def cache_gmute_setting(chat_id, setting):
+    if setting:
+        GMUTESTAT_LIST.discard(str(chat_id))
+    else:
+        GMUTESTAT_LIST.add(str(chat_id))
+
 # ✅ Migration of gmute setting to new chat ID
 def migrate_chat(old_chat_id, new_chat_id):
     with GMUTE_SETTING_LOCK:
@@ -95,8 +119,12 @@ def migrate_chat(old_chat_id, new_chat_id):
 
 # ✅ Load gmutes into memory
 def __load_gmuted_userid_list():
-    global GMUTED_LIST
-    GMUTED_LIST = {x["user_id"] for x in gmutes_collection.find({}, {"user_id": 1})}
+    GMUTED_LIST.replace(x["user_id"] for x in gmutes_collection.find({}, {"user_id": 1}))
+
+# ✅ Reread every gmuted id, in case the cache has drifted from the db; returns how many ids were off
+def reconcile_gmuted_list():
+    with GMUTED_USERS_LOCK:
+        return GMUTED_LIST.replace(x["user_id"] for x in gmutes_collection.find({}, {"user_id": 1}))
 
 # ✅ Load chats where gmutes are disabled
 def __load_gmute_stat_list():
@@ -108,3 +136,7 @@ def __load_gmute_stat_list():
 # ✅ Initialize on startup
 __load_gmuted_userid_list()
 __load_gmute_stat_list()
+
+# ✅ Mirror gmutes made by other instances sharing the db
+global_feed_sql.subscribe("gmute", cache_gmute)
+global_feed_sql.on_gap(reconcile_gmuted_list)
@@ -1,4 +1,6 @@
 import threading
+from typing import Optional
+
 from sql import db
 
 # MongoDB collections
@@ -9,6 +11,34 @@ restr_collection = db["restrictions"]
 PERM_LOCK = threading.RLock()
 RESTR_LOCK = threading.RLock()
 
+PERM_TYPES = ("audio", "voice", "contact", "video", "videonote", "document", "photo", "sticker", "gif", "url",
+              "bots", "forward", "game", "location")
+RESTR_TYPES = ("messages", "media", "other", "preview")
+
+# one bit per lock/restriction type, so a chat's whole lock state is a single int
+LOCK_BITS = {lock_type: 1 << i for i, lock_type in enumerate(PERM_TYPES + RESTR_TYPES)}
+PERM_ALL = sum(LOCK_BITS[lock_type] for lock_type in PERM_TYPES)
+RESTR_ALL = LOCK_BITS["messages"] | LOCK_BITS["media"] | LOCK_BITS["other"] | LOCK_BITS["preview"]
+
+# write-through caches of the permissions/restrictions collections: chat_id -> bitmap
+CHAT_LOCKS = {}
+CHAT_RESTR = {}
+
+
+def __to_bitmap(doc, lock_types):
+    bitmap = 0
+    for lock_type in lock_types:
+        if doc.get(lock_type):
+            bitmap |= LOCK_BITS[lock_type]
+    return bitmap
+
+
+def __set_bit(cache, chat_id, bit, locked):
+    if locked:
+        cache[chat_id] = cache.get(chat_id, 0) | bit
+    else:
+        cache[chat_id] = cache.get(chat_id, 0) & ~bit
+
 
 def init_permissions(chat_id, reset=False):
     chat_id = str(chat_id)
@@ -33,7 +63,9 @@ def init_permissions(chat_id, reset=False):
             "location": False
         }
         perm_collection.update_one({"chat_id": chat_id}, {"$setOnInsert": default_perms}, upsert=True)
-        return perm_collection.find_one({"chat_id": chat_id})
+        perms = perm_collection.find_one({"chat_id": chat_id})
+        CHAT_LOCKS[chat_id] = __to_bitmap(perms, PERM_TYPES)
+        return perms
 
 
 def init_restrictions(chat_id, reset=False):
@@ -49,7 +81,9 @@ def init_restrictions(chat_id, reset=False):
             "preview": False
         }
         restr_collection.update_one({"chat_id": chat_id}, {"$setOnInsert": default_restr}, upsert=True)
-        return restr_collection.find_one({"chat_id": chat_id})
+        restr = restr_collection.find_one({"chat_id": chat_id})
+        CHAT_RESTR[chat_id] = __to_bitmap(restr, RESTR_TYPES)
+        return restr
 
 
 def update_lock(chat_id, lock_type, locked):
@@ -60,6 +94,7 @@ def update_lock(chat_id, lock_type, locked):
             {"$set": {lock_type: locked}},
             upsert=True
         )
+        __set_bit(CHAT_LOCKS, chat_id, LOCK_BITS[lock_type], locked)
 
 
 def update_restriction(chat_id, restr_type, locked):
@@ -76,6 +111,7 @@ def update_restriction(chat_id, restr_type, locked):
                 }},
                 upsert=True
             )
+            __set_bit(CHAT_RESTR, chat_id, RESTR_ALL, locked)
         else:
             if restr_type == "previews":
                 restr_type = "preview"
@@ -84,32 +120,36 @@ def update_restriction(chat_id, restr_type, locked):
                 {"$set": {restr_type: locked}},
                 upsert=True
             )
+            __set_bit(CHAT_RESTR, chat_id, LOCK_BITS[restr_type], locked)
 
 
 def is_locked(chat_id, lock_type):
-    data = perm_collection.find_one({"chat_id": str(chat_id)}, {lock_type: 1})
-    return data.get(lock_type, False) if data else False
+    return bool(CHAT_LOCKS.get(str(chat_id), 0) & LOCK_BITS[lock_type])
 
 
 def is_restr_locked(chat_id, lock_type):
-    data = restr_collection.find_one({"chat_id": str(chat_id)})
-    if not data:
-        return False
-
+    restr = CHAT_RESTR.get(str(chat_id), 0)
     if lock_type == "all":
-        return data.get("messages") and data.get("media") and data.get("other") and data.get("preview")
+        return restr & RESTR_ALL == RESTR_ALL
     elif lock_type == "previews":
-        return data.get("preview", False)
+        return bool(restr & LOCK_BITS["preview"])
     else:
-        return data.get(lock_type, False)
+        return bool(restr & LOCK_BITS[lock_type])
+
+
+# all of a chat's locks and restrictions in one go - test with LOCK_BITS
+def get_chat_lock_bitmap(chat_id):
+    chat_id = str(chat_id)
+    return CHAT_LOCKS.get(chat_id, 0) | CHAT_RESTR.get(chat_id, 0)
 
 
-def get_locks(chat_id):
-    return perm_collection.find_one({"chat_id": str(chat_id)})
+# a chat's lock/restriction bitmap, or None if it has never had any set
+def get_locks(chat_id) -> Optional[int]:
+    return CHAT_LOCKS.get(str(chat_id))
 
 
-def get_restr(chat_id):
-    return restr_collection.find_one({"chat_id": str(chat_id)})
+def get_restr(chat_id) -> Optional[int]:
+    return CHAT_RESTR.get(str(chat_id))
 
 
 def migrate_chat(old_chat_id, new_chat_id):
@@ -120,6 +160,8 @@ def migrate_chat(old_chat_id, new_chat_id):
             old_perm["chat_id"] = new_chat_id
             perm_collection.insert_one(old_perm)
             perm_collection.delete_one({"chat_id": old_chat_id})
+        if old_chat_id in CHAT_LOCKS:
+            CHAT_LOCKS[new_chat_id] = CHAT_LOCKS.pop(old_chat_id)
 
     with RESTR_LOCK:
         old_restr = restr_collection.find_one({"chat_id": old_chat_id})
@@ -127,3 +169,14 @@ def migrate_chat(old_chat_id, new_chat_id):
             old_restr["chat_id"] = new_chat_id
             restr_collection.insert_one(old_restr)
             restr_collection.delete_one({"chat_id": old_chat_id})
+        if old_chat_id in CHAT_RESTR:
+            CHAT_RESTR[new_chat_id] = CHAT_RESTR.pop(old_chat_id)
+
+
+def __load_chat_locks():
+    global CHAT_LOCKS, CHAT_RESTR
+    CHAT_LOCKS = {perms["chat_id"]: __to_bitmap(perms, PERM_TYPES) for perms in perm_collection.find()}
+    CHAT_RESTR = {restr["chat_id"]: __to_bitmap(restr, RESTR_TYPES) for restr in restr_collection.find()}
+
+
+__load_chat_locks()
@@ -1,10 +1,12 @@
 import threading
 from pymongo import ASCENDING
 from tg_bot.modules.helper_funcs.msg_types import Types
-from sql import db
+from sql import db, read_db
 
 notes_collection = db["notes"]
 buttons_collection = db["note_buttons"]
+# same collection, for reads which can go to a secondary - only ones that nobody expects to see a write they just made
+notes_reads = read_db["notes"]
 
 NOTES_LOCK = threading.RLock()
 BUTTONS_LOCK = threading.RLock()
@@ -69,11 +71,11 @@ def get_buttons(chat_id, note_name):
 
 
 def num_notes():
-    return notes_collection.count_documents({})
+    return notes_reads.count_documents({})
 
 
 def num_chats():
-    return len(notes_collection.distinct("chat_id"))
+    return len(notes_reads.distinct("chat_id"))
 
 
 def migrate_chat(old_chat_id, new_chat_id):
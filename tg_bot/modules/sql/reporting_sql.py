@@ -2,16 +2,18 @@ import threading
 from typing import Union
 
 from sql import db
+from tg_bot.modules.sql.settings_cache import ChatSettingsCache
 
 chat_settings = db["chat_report_settings"]
 user_settings = db["user_report_settings"]
 
 CHAT_LOCK = threading.RLock()
 USER_LOCK = threading.RLock()
+CHAT_REPORT_SETTINGS = ChatSettingsCache(chat_settings)
 
 
 def chat_should_report(chat_id: Union[int, str]) -> bool:
-    result = chat_settings.find_one({"chat_id": str(chat_id)})
+    result = CHAT_REPORT_SETTINGS.get(chat_id)
     return result.get("should_report", False) if result else False
 
 
@@ -22,11 +24,7 @@ def user_should_report(user_id: int) -> bool:
 
 def set_chat_setting(chat_id: Union[int, str], setting: bool):
     with CHAT_LOCK:
-        chat_settings.update_one(
-            {"chat_id": str(chat_id)},
-            {"$set": {"should_report": setting}},
-            upsert=True
-        )
+        CHAT_REPORT_SETTINGS.update(chat_id, {"should_report": setting})
 
 
 def set_user_setting(user_id: int, setting: bool):
@@ -50,3 +48,5 @@ def migrate_chat(old_chat_id: Union[int, str], new_chat_id: Union[int, str]):
                 {"chat_id": old_id},
                 {"$set": {"chat_id": new_id}}
             )
+        CHAT_REPORT_SETTINGS.invalidate(old_id)
+        CHAT_REPORT_SETTINGS.invalidate(new_id)
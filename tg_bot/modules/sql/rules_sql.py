@@ -2,9 +2,10 @@ import threading
 from typing import Optional, Union
 
 from pymongo import ASCENDING
-from sql import db
+from sql import db, read_db
 
 rules_collection = db["rules"]
+rules_reads = read_db["rules"]  # for stats, which can go to a secondary
 INSERTION_LOCK = threading.RLock()
 
 
@@ -25,7 +26,7 @@ def get_rules(chat_id: Union[int, str]) -> Optional[str]:
 
 
 def num_chats() -> int:
-    return rules_collection.count_documents({})
+    return rules_reads.count_documents({})
 
 
 def migrate_chat(old_chat_id: Union[int, str], new_chat_id: Union[int, str]):
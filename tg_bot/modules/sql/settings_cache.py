@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple, Union
+
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+
+from tg_bot import LOGGER
+
+MAX_CACHED_CHATS = 20000  # per collection
+WATCH_RETRY_DELAY = 30  # seconds
+
+# every cache, so they can all be watched and reported on together
+SETTINGS_CACHES = []
+
+_MISSING = object()
+
+
+class ChatSettingsCache(object):
+    """Write-through LRU cache of one per-chat settings collection, keyed on chat_id.
+
+    A chat's document is read once and then served from memory, including the fact that a chat has no document at
+    all. Writes made through the cache update it in place. With watch() running, changes made by other bot
+    instances invalidate it too.
+
+    `key` turns a chat id into whatever type the collection stores it as - most store str, but not all.
+    """
+
+    def __init__(self, collection: Collection, maxsize: int = MAX_CACHED_CHATS, key: Callable = str):
+        self.collection = collection
+        self.maxsize = maxsize
+        self.key = key
+        self.hits = 0
+        self.misses = 0
+        self._docs = OrderedDict()  # chat_id -> document, or None if the chat has none
+        self._ids = {}  # document _id -> chat_id, for change stream deletes which only carry the _id
+        self._loading = {}  # chat_id -> marker of the read in flight for it
+        self._lock = threading.RLock()
+        SETTINGS_CACHES.append(self)
+
+    def get(self, chat_id: Union[int, str]) -> Optional[dict]:
+        chat_id = self.key(chat_id)
+        loading = object()
+        with self._lock:
+            doc = self._docs.get(chat_id, _MISSING)
+            if doc is not _MISSING:
+                self._docs.move_to_end(chat_id)
+                self.hits += 1
+                return doc
+            self.misses += 1
+            self._loading[chat_id] = loading
+
+        # read without holding the lock, so one slow round trip doesn't hold up every other chat
+        try:
+            doc = self.collection.find_one({"chat_id": chat_id})
+        finally:
+            with self._lock:
+                # a write, invalidation or later read since we started replaces the marker - don't cache over it
+                if self._loading.get(chat_id) is loading:
+                    del self._loading[chat_id]
+                    if doc is not _MISSING:
+                        self._store(chat_id, doc)
+        return doc
+
+    def update(self, chat_id: Union[int, str], fields: dict):
+        chat_id = self.key(chat_id)
+        self.collection.update_one({"chat_id": chat_id}, {"$set": fields}, upsert=True)
+        self.patch(chat_id, fields)
+
+    def lookup(self, chat_id: Union[int, str]) -> Tuple[bool, Optional[dict]]:
+        """The chat's document if it's cached, without ever going to the db - (False, None) if it isn't."""
+        chat_id = self.key(chat_id)
+        with self._lock:
+            doc = self._docs.get(chat_id, _MISSING)
+            if doc is _MISSING:
+                self.misses += 1
+                return False, None
+            self._docs.move_to_end(chat_id)
+            self.hits += 1
+            return True, doc
+
+    def fill(self, chat_id: Union[int, str], doc: Optional[dict]):
+        """Cache a document read from the db by someone else, eg the async data layer."""
+        with self._lock:
+            self._store(self.key(chat_id), doc)
+
+    def patch(self, chat_id: Union[int, str], fields: dict):
+        """Apply a $set which has already been written to the db."""
+        chat_id = self.key(chat_id)
+        with self._lock:
+            self._loading.pop(chat_id, None)
+            doc = self._docs.get(chat_id)
+            if doc is not None:
+                doc = dict(doc, **fields)
+                self._store(chat_id, doc)
+            else:
+                # no document cached to patch - let the next read fetch it, _id and all
+                self.invalidate(chat_id)
+
+    def invalidate(self, chat_id: Union[int, str]):
+        chat_id = self.key(chat_id)
+        with self._lock:
+            self._loading.pop(chat_id, None)
+            doc = self._docs.pop(chat_id, None)
+            if doc:
+                self._ids.pop(doc["_id"], None)
+
+    def clear(self):
+        with self._lock:
+            self._docs.clear()
+            self._ids.clear()
+            self._loading.clear()
+
+    def _store(self, chat_id, doc: Optional[dict]):
+        self._docs[chat_id] = doc
+        self._docs.move_to_end(chat_id)
+        if doc:
+            self._ids[doc["_id"]] = chat_id
+        while len(self._docs) > self.maxsize:
+            _, evicted = self._docs.popitem(last=False)
+            if evicted:
+                self._ids.pop(evicted["_id"], None)
+
+    def _changed(self, change: dict):
+        with self._lock:
+            doc = change.get("fullDocument")
+            chat_id = doc.get("chat_id") if doc else self._ids.get(change.get("documentKey", {}).get("_id"))
+            if chat_id is not None:
+                self.invalidate(chat_id)
+            elif change.get("operationType") in ("drop", "rename", "dropDatabase", "invalidate"):
+                self.clear()
+
+    def watch(self):
+        """Follow the collection's change stream, forever. Needs mongo to run as a replica set."""
+        while True:
+            try:
+                with self.collection.watch(full_document="updateLookup") as stream:
+                    for change in stream:
+                        self._changed(change)
+            except PyMongoError:
+                LOGGER.exception("Lost the change stream for %s, retrying in %ss", self.collection.name,
+                                 WATCH_RETRY_DELAY)
+            # whatever changed while we weren't watching could be stale
+            self.clear()
+            time.sleep(WATCH_RETRY_DELAY)
+
+    def __len__(self):
+        return len(self._docs)
+
+
+def watch_settings():
+    for cache in SETTINGS_CACHES:
+        threading.Thread(target=cache.watch, name="watch-" + cache.collection.name, daemon=True).start()
+
+
+def __stats__() -> str:
+    hits = sum(cache.hits for cache in SETTINGS_CACHES)
+    misses = sum(cache.misses for cache in SETTINGS_CACHES)
+    return "Chat settings cache: {} chats across {} collections, {:.1%} hit rate.".format(
+        sum(len(cache) for cache in SETTINGS_CACHES), len(SETTINGS_CACHES), hits / ((hits + misses) or 1))
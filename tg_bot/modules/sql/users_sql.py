@@ -1,9 +1,12 @@
+import atexit
 import threading
-from typing import Optional, List
-from pymongo import ASCENDING, ReturnDocument
-from pymongo.errors import DuplicateKeyError
+from collections import OrderedDict
+from typing import Iterable, Optional, List, Tuple
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError, PyMongoError
 
-from tg_bot import dispatcher
+from tg_bot import dispatcher, LOGGER
 from sql import db
 
 users_collection = db["users"]
@@ -15,6 +18,32 @@ chat_members_collection.create_index(
 )
 
 INSERTION_LOCK = threading.RLock()
+BUFFER_LOCK = threading.Lock()
+
+FLUSH_INTERVAL = 5  # seconds
+MAX_FLUSHED_SEEN = 200000  # per cache - enough to cover the active users/chats of a large deployment
+MAX_SEEN_MEMBERS = 500000
+
+# sightings waiting to be written; repeated sightings of the same user/chat between flushes coalesce here
+PENDING_USERS = {}  # user_id -> username
+PENDING_CHATS = {}  # chat_id -> chat_name
+PENDING_MEMBERS = set()  # (chat_id, user_id)
+
+# what was last written for each user/chat, so unchanged names never get written again
+FLUSHED_USERS = OrderedDict()
+FLUSHED_CHATS = OrderedDict()
+# (chat_id, user_id) pairs known to be in chat_members, least recently seen first; only unseen pairs get written
+SEEN_MEMBERS = OrderedDict()
+
+_MISSING = object()
+DUPLICATE_KEY = 11000
+
+
+def __remember(flushed: OrderedDict, key, value, limit: int = MAX_FLUSHED_SEEN):
+    flushed[key] = value
+    flushed.move_to_end(key)
+    while len(flushed) > limit:
+        flushed.popitem(last=False)
 
 
 def ensure_bot_in_db():
@@ -26,49 +55,175 @@ def ensure_bot_in_db():
         )
 
 
+# ✅ Buffer a user (and chat) sighting, to be written on the next flush
 def update_user(user_id: int, username: Optional[str], chat_id: Optional[str] = None, chat_name: Optional[str] = None):
-    with INSERTION_LOCK:
-        users_collection.update_one(
-            {"user_id": user_id},
-            {"$set": {"username": username}},
-            upsert=True,
-        )
+    with BUFFER_LOCK:
+        if FLUSHED_USERS.get(user_id, _MISSING) != username or user_id in PENDING_USERS:
+            PENDING_USERS[user_id] = username
 
         if chat_id and chat_name:
-            chats_collection.update_one(
-                {"chat_id": str(chat_id)},
-                {"$set": {"chat_name": chat_name}},
-                upsert=True,
-            )
-            try:
-                chat_members_collection.insert_one({
-                    "chat": str(chat_id),
-                    "user": user_id
-                })
-            except DuplicateKeyError:
-                pass  # already exists
+            chat_id = str(chat_id)
+            if FLUSHED_CHATS.get(chat_id, _MISSING) != chat_name or chat_id in PENDING_CHATS:
+                PENDING_CHATS[chat_id] = chat_name
+            member = (chat_id, user_id)
+            if member in SEEN_MEMBERS:
+                SEEN_MEMBERS.move_to_end(member)
+            else:
+                PENDING_MEMBERS.add(member)
+
+
+# ✅ Whether anything is waiting to be written
+def has_pending() -> bool:
+    return bool(PENDING_USERS or PENDING_CHATS or PENDING_MEMBERS)
+
+
+# ✅ Hand over everything buffered so far, leaving the buffers empty
+def take_pending() -> Tuple[dict, dict, set]:
+    with BUFFER_LOCK:
+        users, chats, members = dict(PENDING_USERS), dict(PENDING_CHATS), set(PENDING_MEMBERS)
+        PENDING_USERS.clear()
+        PENDING_CHATS.clear()
+        PENDING_MEMBERS.clear()
+    return users, chats, members
+
+
+# ✅ Put back whatever a flush couldn't write, for the next one to retry
+def return_pending(users: dict, chats: dict, members: set):
+    with BUFFER_LOCK:
+        # anything seen again since was seen later, so it wins
+        for user_id, username in users.items():
+            PENDING_USERS.setdefault(user_id, username)
+        for chat_id, chat_name in chats.items():
+            PENDING_CHATS.setdefault(chat_id, chat_name)
+        PENDING_MEMBERS.update(members)
+
+
+# ✅ Remember what a flush wrote, so the same sightings aren't written again
+def mark_flushed(users: dict, chats: dict, members: set):
+    with BUFFER_LOCK:
+        for user_id, username in users.items():
+            __remember(FLUSHED_USERS, user_id, username)
+        for chat_id, chat_name in chats.items():
+            __remember(FLUSHED_CHATS, chat_id, chat_name)
+        for member in members:
+            __remember(SEEN_MEMBERS, member, None, MAX_SEEN_MEMBERS)
+
+
+# ✅ Whether a failed batch of upserts only lost races to concurrent upserts of the same documents
+def only_duplicates(excp: BulkWriteError) -> bool:
+    details = excp.details or {}
+    return not details.get("writeConcernErrors") and \
+        all(error.get("code") == DUPLICATE_KEY for error in details.get("writeErrors", []))
+
+
+def __bulk_upsert(collection: Collection, requests: List[UpdateOne]) -> bool:
+    if not requests:
+        return True
+    try:
+        collection.bulk_write(requests, ordered=False)
+    except BulkWriteError as excp:
+        if only_duplicates(excp):
+            return True
+        LOGGER.warning("Couldn't flush %s, will retry: %s", collection.name, excp.details)
+        return False
+    except PyMongoError:
+        LOGGER.exception("Couldn't flush %s, will retry", collection.name)
+        return False
+    return True
+
+
+# ✅ Write everything buffered so far, as one unordered batch per collection; whatever fails is kept for next time
+def flush_pending():
+    with INSERTION_LOCK:
+        users, chats, members = take_pending()
+
+        # the upserts are idempotent, so a batch which fails part way can safely be sent again whole
+        users_written = __bulk_upsert(users_collection, [
+            UpdateOne({"user_id": user_id}, {"$set": {"username": username}}, upsert=True)
+            for user_id, username in users.items()
+        ])
+        chats_written = __bulk_upsert(chats_collection, [
+            UpdateOne({"chat_id": chat_id}, {"$set": {"chat_name": chat_name}}, upsert=True)
+            for chat_id, chat_name in chats.items()
+        ])
+        members_written = __bulk_upsert(chat_members_collection, [
+            UpdateOne({"chat": chat_id, "user": user_id}, {"$setOnInsert": {"chat": chat_id, "user": user_id}},
+                      upsert=True)
+            for chat_id, user_id in members
+        ])
+
+        mark_flushed(users if users_written else {}, chats if chats_written else {},
+                     members if members_written else set())
+        return_pending({} if users_written else users, {} if chats_written else chats,
+                       set() if members_written else members)
+
+
+# reads see the buffered sightings by laying them over what's in the db, rather than flushing them first - the
+# flush job writes them soon enough, and a read shouldn't have to wait on (or fail with) a write
+def __pending_chats() -> dict:
+    with BUFFER_LOCK:
+        return dict(PENDING_CHATS)
+
+
+def __pending_members(chat_id: str = None, user_id: int = None) -> list:
+    with BUFFER_LOCK:
+        return [(chat, user) for chat, user in PENDING_MEMBERS
+                if (chat_id is None or chat == chat_id) and (user_id is None or user == user_id)]
 
 
 def get_userid_by_name(username: str) -> List[dict]:
-    return list(users_collection.find({"username": {"$regex": f"^{username}$", "$options": "i"}}))
+    with BUFFER_LOCK:
+        pending = dict(PENDING_USERS)
+    users = {user["user_id"]: user for user in users_collection.find(
+        {"username": {"$regex": f"^{username}$", "$options": "i"}})}
+    for user_id, pending_name in pending.items():
+        if pending_name and pending_name.lower() == username.lower():
+            users[user_id] = dict(users.get(user_id, {}), user_id=user_id, username=pending_name)
+        else:
+            users.pop(user_id, None)  # renamed since
+    return list(users.values())
 
 
 def get_name_by_userid(user_id: int) -> Optional[dict]:
-    return users_collection.find_one({"user_id": user_id})
+    with BUFFER_LOCK:
+        pending = PENDING_USERS.get(user_id, _MISSING)
+    user = users_collection.find_one({"user_id": user_id})
+    if pending is _MISSING:
+        return user
+    return dict(user or {}, user_id=user_id, username=pending)
 
 
 def get_chat_members(chat_id: str) -> List[dict]:
-    return list(chat_members_collection.find({"chat": str(chat_id)}))
+    chat_id = str(chat_id)
+    pending = __pending_members(chat_id=chat_id)
+    members = list(chat_members_collection.find({"chat": chat_id}))
+    known = {member["user"] for member in members}
+    return members + [{"chat": chat, "user": user} for chat, user in pending if user not in known]
 
 
 def get_all_chats() -> List[dict]:
-    return list(chats_collection.find())
+    return list(iter_all_chats())
+
+
+def iter_all_chats(batch_size: int = 1000) -> Iterable[dict]:
+    pending = __pending_chats()
+    for chat_id, chat_name in pending.items():
+        yield {"chat_id": chat_id, "chat_name": chat_name}
+    for chat in chats_collection.find({}, {"_id": 0, "chat_id": 1, "chat_name": 1}).batch_size(batch_size):
+        if chat["chat_id"] not in pending:
+            yield chat
 
 
 def get_user_num_chats(user_id: int) -> int:
-    return chat_members_collection.count_documents({"user": user_id})
+    pending = [chat for chat, user in __pending_members(user_id=user_id)]
+    num = chat_members_collection.count_documents({"user": user_id})
+    if pending:
+        # a pending membership may already be in the db, from before the buffer forgot it had written it
+        num += len(pending) - chat_members_collection.count_documents({"user": user_id, "chat": {"$in": pending}})
+    return num
 
 
+# estimates - they leave out whatever's still buffered
 def num_chats() -> int:
     return chats_collection.estimated_document_count()
 
@@ -79,6 +234,12 @@ def num_users() -> int:
 
 def migrate_chat(old_chat_id: str, new_chat_id: str):
     with INSERTION_LOCK:
+        flush_pending()
+        with BUFFER_LOCK:
+            FLUSHED_CHATS.pop(str(old_chat_id), None)
+            for member in [member for member in SEEN_MEMBERS if member[0] == str(old_chat_id)]:
+                del SEEN_MEMBERS[member]
+
         chat = chats_collection.find_one_and_update(
             {"chat_id": str(old_chat_id)},
             {"$set": {"chat_id": str(new_chat_id)}},
@@ -96,6 +257,27 @@ def migrate_chat(old_chat_id: str, new_chat_id: str):
 
 def del_user(user_id: int) -> bool:
     with INSERTION_LOCK:
+        flush_pending()
+        with BUFFER_LOCK:
+            FLUSHED_USERS.pop(user_id, None)
+            for member in [member for member in SEEN_MEMBERS if member[1] == user_id]:
+                del SEEN_MEMBERS[member]
+
         chat_members_collection.delete_many({"user": user_id})
         result = users_collection.delete_one({"user_id": user_id})
         return result.deleted_count > 0
+
+
+def __load_seen_members():
+    # newest memberships are the likeliest to be seen again, so they go in last (most recently used)
+    members = chat_members_collection.find({}, {"_id": 0, "chat": 1, "user": 1}) \
+        .sort("_id", -1).limit(MAX_SEEN_MEMBERS)
+    with BUFFER_LOCK:
+        for member in reversed(list(members)):
+            SEEN_MEMBERS[(str(member["chat"]), member["user"])] = None
+
+
+__load_seen_members()
+
+# don't lose the last few seconds of sightings on shutdown
+atexit.register(flush_pending)
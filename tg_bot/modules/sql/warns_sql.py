@@ -3,6 +3,8 @@ from typing import Optional, Tuple, List
 from pymongo import ReturnDocument
 
 from sql import db
+from tg_bot.modules.helper_funcs.triggers import TriggerIndex
+from tg_bot.modules.sql.settings_cache import ChatSettingsCache
 
 warns_col = db["warns"]
 warn_filters_col = db["warn_filters"]
@@ -13,8 +15,9 @@ WARN_INSERTION_LOCK = threading.RLock()
 WARN_FILTER_INSERTION_LOCK = threading.RLock()
 WARN_SETTINGS_LOCK = threading.RLock()
 
-# Cache
-WARN_FILTERS: dict[str, List[str]] = {}
+# Cache - per-chat keywords, longest first, matched in a single pass
+WARN_FILTERS = TriggerIndex()
+WARN_SETTINGS = ChatSettingsCache(warn_settings_col, key=int)  # warn_settings has always stored raw ids
 
 
 # Warn Management
@@ -66,23 +69,24 @@ def add_warn_filter(chat_id: str, keyword: str, reply: str):
             {"$set": {"reply": reply}},
             upsert=True
         )
-        WARN_FILTERS.setdefault(chat_id, [])
-        if keyword not in WARN_FILTERS[chat_id]:
-            WARN_FILTERS[chat_id].append(keyword)
-            WARN_FILTERS[chat_id] = sorted(set(WARN_FILTERS[chat_id]), key=lambda x: (-len(x), x))
+        WARN_FILTERS.add(chat_id, keyword)
 
 
 def remove_warn_filter(chat_id: str, keyword: str) -> bool:
     with WARN_FILTER_INSERTION_LOCK:
         result = warn_filters_col.delete_one({"chat_id": chat_id, "keyword": keyword})
         if result.deleted_count:
-            WARN_FILTERS.get(chat_id, []).remove(keyword)
+            WARN_FILTERS.remove(chat_id, keyword)
             return True
         return False
 
 
 def get_chat_warn_triggers(chat_id: str) -> List[str]:
-    return WARN_FILTERS.get(chat_id, [])
+    return WARN_FILTERS.triggers(chat_id)
+
+
+def get_warn_filter_match(chat_id: str, text: str) -> Optional[str]:
+    return WARN_FILTERS.first_match(chat_id, text)
 
 
 def get_chat_warn_filters(chat_id: str) -> List[dict]:
@@ -96,24 +100,16 @@ def get_warn_filter(chat_id: str, keyword: str) -> Optional[dict]:
 # Settings
 def set_warn_limit(chat_id: str, warn_limit: int):
     with WARN_SETTINGS_LOCK:
-        warn_settings_col.update_one(
-            {"chat_id": chat_id},
-            {"$set": {"warn_limit": warn_limit}},
-            upsert=True
-        )
+        WARN_SETTINGS.update(chat_id, {"warn_limit": warn_limit})
 
 
 def set_warn_strength(chat_id: str, soft_warn: bool):
     with WARN_SETTINGS_LOCK:
-        warn_settings_col.update_one(
-            {"chat_id": chat_id},
-            {"$set": {"soft_warn": soft_warn}},
-            upsert=True
-        )
+        WARN_SETTINGS.update(chat_id, {"soft_warn": soft_warn})
 
 
 def get_warn_setting(chat_id: str) -> Tuple[int, bool]:
-    setting = warn_settings_col.find_one({"chat_id": chat_id})
+    setting = WARN_SETTINGS.get(chat_id)
     return (setting.get("warn_limit", 3), setting.get("soft_warn", False)) if setting else (3, False)
 
 
@@ -145,19 +141,21 @@ def migrate_chat(old_chat_id: str, new_chat_id: str):
         warns_col.update_many({"chat_id": old_chat_id}, {"$set": {"chat_id": new_chat_id}})
     with WARN_FILTER_INSERTION_LOCK:
         warn_filters_col.update_many({"chat_id": old_chat_id}, {"$set": {"chat_id": new_chat_id}})
-        if old_chat_id in WARN_FILTERS:
-            WARN_FILTERS[new_chat_id] = WARN_FILTERS.pop(old_chat_id)
+        WARN_FILTERS.migrate(old_chat_id, new_chat_id)
     with WARN_SETTINGS_LOCK:
         warn_settings_col.update_many({"chat_id": old_chat_id}, {"$set": {"chat_id": new_chat_id}})
+        WARN_SETTINGS.invalidate(old_chat_id)
+        WARN_SETTINGS.invalidate(new_chat_id)
 
 
 # Initial Load
 def __load_chat_warn_filters():
-    global WARN_FILTERS
+    temp = {}
     for filt in warn_filters_col.find():
-        WARN_FILTERS.setdefault(filt["chat_id"], []).append(filt["keyword"])
-    for cid in WARN_FILTERS:
-        WARN_FILTERS[cid] = sorted(set(WARN_FILTERS[cid]), key=lambda i: (-len(i), i))
+        temp.setdefault(filt["chat_id"], []).append(filt["keyword"])
+    WARN_FILTERS.clear()
+    for cid, keywords in temp.items():
+        WARN_FILTERS.set(cid, keywords)
 
 
 __load_chat_warn_filters()
@@ -1,15 +1,15 @@
-from io import BytesIO
-from time import sleep
 from typing import Optional
 
-from telegram import TelegramError, Chat, Message
+from telegram import Chat, Message
 from telegram import Update, Bot
 from telegram.error import BadRequest
 from telegram.ext import MessageHandler, Filters, CommandHandler
 from telegram.ext.dispatcher import run_async
 
 import tg_bot.modules.sql.users_sql as sql
-from tg_bot import dispatcher, OWNER_ID, LOGGER
+from tg_bot import dispatcher, updater, OWNER_ID, LOGGER
+from tg_bot.modules.helper_funcs.export import send_list
+from tg_bot.modules.helper_funcs.fanout import FANOUT
 from tg_bot.modules.helper_funcs.filters import CustomFilters
 
 USERS_GROUP = 4
@@ -47,22 +47,25 @@ def get_user_id(username):
     return None
 
 
+def broadcast_to_chat(bot: Bot, params: dict, chat_id) -> bool:
+    bot.send_message(chat_id, params["text"], bulk=True)
+    return True
+
+
+def broadcast_done(bot: Bot, params: dict, job):
+    if job.failed:
+        LOGGER.warning("Broadcast failed in %s chats: %s", job.failed, dict(job.errors))
+
+
 @run_async
 def broadcast(bot: Bot, update: Update):
     to_send = update.effective_message.text.split(None, 1)
     if len(to_send) >= 2:
-        chats = sql.get_all_chats() or []
-        failed = 0
-        for chat in chats:
-            try:
-                bot.sendMessage(int(chat.chat_id), to_send[1])
-                sleep(0.1)
-            except TelegramError:
-                failed += 1
-                LOGGER.warning("Couldn't send broadcast to %s, group name %s", str(chat.chat_id), str(chat.chat_name))
+        chats = [int(chat["chat_id"]) for chat in sql.get_all_chats() or []]
 
-        update.effective_message.reply_text("Broadcast complete. {} groups failed to receive the message, probably "
-                                            "due to being kicked.".format(failed))
+        status = update.effective_message.reply_text("Broadcasting to {} chats...".format(len(chats)))
+        FANOUT.submit("broadcast", "broadcast", {"text": to_send[1]}, chats,
+                      report_to=[status.chat_id, status.message_id])
 
 
 @run_async
@@ -88,15 +91,13 @@ def log_user(bot: Bot, update: Update):
 
 @run_async
 def chats(bot: Bot, update: Update):
-    all_chats = sql.get_all_chats() or []
-    chatfile = 'List of chats.\n'
-    for chat in all_chats:
-        chatfile += "{} - ({})\n".format(chat.chat_name, chat.chat_id)
+    chat_lines = ("{} - ({})\n".format(chat.get("chat_name"), chat["chat_id"]) for chat in sql.iter_all_chats())
+    send_list(update.effective_message, "chatlist.txt", "List of chats.\n", chat_lines,
+              caption="Here is the list of chats in my database.")
+
 
-    with BytesIO(str.encode(chatfile)) as output:
-        output.name = "chatlist.txt"
-        update.effective_message.reply_document(document=output, filename="chatlist.txt",
-                                                caption="Here is the list of chats in my database.")
+def flush_users(bot: Bot, job):
+    sql.flush_pending()
 
 
 def __user_info__(user_id):
@@ -126,6 +127,10 @@ BROADCAST_HANDLER = CommandHandler("broadcast", broadcast, filters=Filters.user(
 USER_HANDLER = MessageHandler(Filters.all & Filters.group, log_user)
 CHATLIST_HANDLER = CommandHandler("chatlist", chats, filters=CustomFilters.sudo_filter)
 
+FANOUT.register("broadcast", broadcast_to_chat, broadcast_done)
+
 dispatcher.add_handler(USER_HANDLER, USERS_GROUP)
 dispatcher.add_handler(BROADCAST_HANDLER)
 dispatcher.add_handler(CHATLIST_HANDLER)
+
+updater.job_queue.run_repeating(flush_users, interval=sql.FLUSH_INTERVAL, first=sql.FLUSH_INTERVAL)
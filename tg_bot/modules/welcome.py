@@ -83,7 +83,8 @@ def new_member(bot: Bot, update: Update):
     new_members = update.effective_message.new_chat_members
 
     for mems in new_members:
-        if is_user_ban_protected(chat, mems.id, chat.get_member(mems.id)):
+        # answered from the chat's admin list, rather than a getChatMember per new member
+        if is_user_ban_protected(chat, mems.id):
             continue
         val = is_safemoded(chat.id)
         if val and val.safemode_status:
@@ -37,6 +37,14 @@ class Config(object):
     WORKERS = 8  # Number of subthreads to use. This is the recommended amount - see for yourself what works best!
     BAN_STICKER = 'CAADAgADOwADPPEcAXkko5EB3YGYAg'  # banhammer marie sticker
     ALLOW_EXCL = False  # Allow ! commands as well as /
+    CHANGE_STREAMS = False  # Keep settings caches in sync with other instances on the db - needs a replica set
+    GLOBAL_FEED = False  # Keep gban/gmute caches in sync with other instances on the db - works on any mongo
+    SHARDS = 1  # Worker processes to split chats over; more than 1 makes this process a router in front of them
+    MONGO_POOL_SIZE = 100  # Max connections to mongo, per client
+    MONGO_COMPRESSORS = ""  # Wire compression, eg "zstd,snappy" - needs the zstandard/python-snappy packages
+    MONGO_TIMEOUT = 30  # Seconds to wait for a usable mongo server before giving up
+    MONGO_SOCKET_TIMEOUT = 0  # Seconds to wait on a single db call; 0 waits forever
+    MONGO_READ_PREFERENCE = None  # eg "secondaryPreferred": cacheable reads (notes, rules...) get a client of their own
 
 
 class Production(Config):